@@ -0,0 +1,167 @@
+# agent/control.py
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # channel is optional; the agent still runs without it
+    ws_connect = None
+
+
+class TaskCancelled(Exception):
+    """Raised in the agent when the backend cancels the task or its deadline passes."""
+
+
+class ControlChannel:
+    """
+    Persistent WebSocket connection to the backend (/agents/ws/{task_id}).
+
+    A background thread keeps the socket open, sends heartbeats and listens for
+    `cancel` / `deadline` frames. On cancel (or when the deadline passes) it
+    kills the subprocess currently tracked via `track()`, so a stuck `pytest`
+    or `npm install` stops at once instead of holding a slot.
+    """
+
+    def __init__(self, backend_url: str, task_id: str, heartbeat_interval: float = 10.0, token: str | None = None):
+        ws_base = backend_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        self.url = f"{ws_base}/agents/ws/{task_id}"
+        self.heartbeat_interval = heartbeat_interval
+        # The backend refuses the channel without the worker token
+        self.token = token if token is not None else os.getenv("WORKER_TOKEN", "")
+
+        self.cancelled = threading.Event()
+        self.cancel_reason = ""
+        self.deadline: float | None = None  # unix timestamp
+
+        self._ws = None
+        self._send_lock = threading.Lock()
+        self._proc_lock = threading.Lock()
+        self._procs: set[subprocess.Popen] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="jules-control", daemon=True)
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    def start(self):
+        if ws_connect is None:
+            print("[control] websockets not installed; running without control channel")
+            return
+        self._thread.start()
+
+    def close(self):
+        self.send({"type": "done"})
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    # ----------------------------
+    # Agent -> backend
+    # ----------------------------
+    def send(self, frame: dict) -> bool:
+        ws = self._ws
+        if ws is None:
+            return False
+        try:
+            with self._send_lock:
+                ws.send(json.dumps(frame))
+            return True
+        except Exception:
+            return False
+
+    def phase(self, name: str):
+        self.send({"type": "phase", "phase": name})
+
+    # ----------------------------
+    # Cancellation
+    # ----------------------------
+    def check(self):
+        """Raise TaskCancelled if the task was cancelled or ran out of time."""
+        if self.deadline is not None and time.time() > self.deadline and not self.cancelled.is_set():
+            self._cancel("deadline exceeded")
+        if self.cancelled.is_set():
+            raise TaskCancelled(self.cancel_reason or "cancelled")
+
+    def track(self, proc: subprocess.Popen):
+        with self._proc_lock:
+            self._procs.add(proc)
+        if self.cancelled.is_set():
+            self._kill(proc)
+
+    def untrack(self, proc: subprocess.Popen):
+        with self._proc_lock:
+            self._procs.discard(proc)
+
+    def _cancel(self, reason: str):
+        self.cancel_reason = reason
+        self.cancelled.set()
+        with self._proc_lock:
+            procs = list(self._procs)
+        for proc in procs:
+            self._kill(proc)
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen):
+        # Processes are started in their own session, so kill the whole group
+        # (shell + npm/pytest children), not just the shell.
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except Exception:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+    # ----------------------------
+    # Background thread
+    # ----------------------------
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with ws_connect(self.url, open_timeout=5, additional_headers={"X-Worker-Token": self.token}) as ws:
+                    self._ws = ws
+                    backoff = 1.0
+                    self.send({"type": "hello"})
+                    self._listen(ws)
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"[control] channel error: {e}")
+            finally:
+                self._ws = None
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, 30.0)
+
+    def _listen(self, ws):
+        last_beat = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                raw = ws.recv(timeout=1.0)
+            except TimeoutError:
+                raw = None
+
+            if raw is not None:
+                frame = json.loads(raw)
+                kind = frame.get("type")
+                if kind == "cancel":
+                    self._cancel(frame.get("reason") or "cancelled by backend")
+                elif kind == "deadline":
+                    self.deadline = frame.get("deadline")
+
+            # Enforce the deadline locally too, in case the backend goes away
+            if self.deadline is not None and time.time() > self.deadline and not self.cancelled.is_set():
+                self._cancel("deadline exceeded")
+
+            if time.monotonic() - last_beat >= self.heartbeat_interval:
+                self.send({"type": "heartbeat"})
+                last_beat = time.monotonic()
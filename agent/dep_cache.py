@@ -0,0 +1,181 @@
+# agent/dep_cache.py
+import hashlib
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+from git_cache import parse_size, _dir_size
+from impact_select import TEST_RESULT_SUBDIR
+
+# Lockfiles that pin a Node install, most specific first
+NODE_LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml")
+
+
+def _evict_files(root: Path, budget_bytes: int) -> tuple[int, int]:
+    """
+    Delete the least recently used files under `root` until it fits the budget.
+    File by file, so an install reading the cache at the same time only loses
+    (and re-downloads) the entries removed, never the whole directory.
+    Returns (bytes left, bytes freed).
+    """
+    files = []
+    for dirpath, _dirs, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            files.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    freed = 0
+    for _, size, path in sorted(files):
+        if total <= budget_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        freed += size
+    return total, freed
+
+
+def _tool_version(cmd: list[str]) -> str:
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        return (out.stdout or out.stderr).strip()
+    except Exception:
+        return ""
+
+
+def env_key(kind: str, repo_dir: Path, scope: str = "") -> str | None:
+    """
+    Snapshot key: the dependency manifests (lockfile when there is one) plus the
+    runtime version, so a Python or Node upgrade in the image never reuses an
+    incompatible environment. None if there is nothing to key on.
+
+    `scope` (the repo's owner/name) keeps snapshots per repo: a repo's tests run
+    with the volume writable, so a snapshot one repo built is never handed to another.
+    """
+    h = hashlib.sha256(kind.encode("utf-8") + b"\0" + scope.lower().encode("utf-8") + b"\0")
+    if kind == "python":
+        names = ["requirements.txt"]
+        h.update(_tool_version(["python3", "--version"]).encode("utf-8") + b"\0")
+    else:
+        lock = next((n for n in NODE_LOCKFILES if (repo_dir / n).exists()), None)
+        names = ["package.json"] + ([lock] if lock else [])
+        h.update(_tool_version(["node", "--version"]).encode("utf-8") + b"\0")
+    found = False
+    for name in names:
+        path = repo_dir / name
+        if path.exists():
+            found = True
+            data = path.read_bytes()
+            h.update(f"{name}:{len(data)}:".encode("utf-8") + data)
+    return h.hexdigest()[:32] if found else None
+
+
+class DepCache:
+    """
+    Installed-environment snapshots on a volume shared by all agent containers.
+
+    A snapshot is a tar of an installed environment (a venv for Python, the
+    repo's node_modules for Node), keyed by env_key(). On a hit it's unpacked
+    at the same absolute path it was built at, so venv scripts keep working;
+    on a miss the caller installs as usual (with the pip/npm download caches
+    on the same volume) and then stores a snapshot.
+
+    Snapshots are written to a temp name and renamed into place, so readers
+    never see a partial one; the least recently used are deleted when the
+    total goes over the disk budget.
+    """
+
+    def __init__(self, root: str | Path, budget_bytes: int, log=print):
+        self.root = Path(root)
+        self.snapshots = self.root / "snapshots"
+        self.budget_bytes = budget_bytes
+        self.log = log
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, log=print) -> "DepCache | None":
+        root = os.getenv("DEP_CACHE_DIR", "").strip()
+        if not root:
+            return None
+        return cls(root, parse_size(os.getenv("DEP_CACHE_BUDGET", "10g")), log=log)
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.snapshots / f"{kind}-{key}.tar"
+
+    def restore(self, kind: str, key: str, dest: Path) -> bool:
+        """Unpack the snapshot into `dest` (replacing it). True on a hit."""
+        snap = self._path(kind, key)
+        if not snap.exists():
+            self.log(f"Dependency cache miss ({kind} {key[:12]})")
+            return False
+        started = time.monotonic()
+        shutil.rmtree(dest, ignore_errors=True)
+        dest.mkdir(parents=True)
+        try:
+            subprocess.run(["tar", "-xf", str(snap), "-C", str(dest)], check=True, capture_output=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            # Evicted mid-way or corrupt: treat as a miss
+            shutil.rmtree(dest, ignore_errors=True)
+            self.log(f"Dependency cache miss ({kind} {key[:12]}): snapshot unreadable ({e})")
+            return False
+        os.utime(snap, None)  # LRU timestamp
+        self.log(f"Dependency cache hit ({kind} {key[:12]}): restored in {time.monotonic() - started:.1f}s")
+        return True
+
+    def store(self, kind: str, key: str, src: Path):
+        """Snapshot `src` after a successful install."""
+        snap = self._path(kind, key)
+        if snap.exists() or not src.is_dir():
+            return
+        tmp = snap.with_name(f"{snap.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            subprocess.run(["tar", "-cf", str(tmp), "-C", str(src), "."], check=True, capture_output=True)
+            os.replace(tmp, snap)
+        except (OSError, subprocess.CalledProcessError) as e:
+            tmp.unlink(missing_ok=True)
+            self.log(f"Dependency cache: could not store snapshot ({e})")
+            return
+        self.log(f"Dependency cache: stored {kind} snapshot {key[:12]} ({snap.stat().st_size // (1024 * 1024)} MiB)")
+        self._evict(keep=snap)
+
+    def _evict(self, keep: Path):
+        for tmp in self.snapshots.glob("*.tmp"):
+            # Left behind by a container that died while writing
+            try:
+                if time.time() - tmp.stat().st_mtime > 3600:
+                    tmp.unlink()
+            except OSError:
+                pass
+        # The pip/npm download caches get half the budget; neither tool prunes
+        # itself, so their least recently used files go once over it (refilled on demand).
+        # Other containers may be installing from them, hence no rmtree.
+        # The test-result cache shares the volume but caps its own entry count
+        downloads = 0
+        skip = (self.snapshots, self.root / TEST_RESULT_SUBDIR)
+        for d in (p for p in self.root.iterdir() if p.is_dir() and p not in skip):
+            size = _dir_size(d)
+            if size > self.budget_bytes // 2:
+                size, freed = _evict_files(d, self.budget_bytes // 2)
+                self.log(f"Dependency cache: trimmed {d.name} download cache by {freed // (1024 * 1024)} MiB")
+            downloads += size
+        snaps = [p for p in self.snapshots.glob("*.tar") if p.is_file()]
+        total = downloads + sum(p.stat().st_size for p in snaps)
+        for snap in sorted(snaps, key=lambda p: p.stat().st_mtime):
+            if total <= self.budget_bytes:
+                break
+            if snap == keep:
+                continue
+            size = snap.stat().st_size
+            # Unlinking is safe even while another task is unpacking it
+            snap.unlink(missing_ok=True)
+            total -= size
+            self.log(f"Dependency cache: evicted {snap.name} ({size // (1024 * 1024)} MiB)")
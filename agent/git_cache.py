@@ -0,0 +1,155 @@
+# agent/git_cache.py
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+
+def parse_size(value: str) -> int:
+    """'500m' / '20g' / '1073741824' -> bytes."""
+    value = value.strip().lower()
+    units = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class MirrorCache:
+    """
+    Bare mirrors of repos on a volume shared by all agent containers.
+
+    - one `git clone --mirror` per repo, refreshed with an incremental fetch
+    - a per-repo flock: exclusive only while creating the mirror, shared
+      while a task's clone borrows objects from it (`git clone --reference`),
+      so eviction never pulls objects out from under a running task while
+      tasks on the same repo still run side by side
+    - fetches take a second, per-repo fetch lock so two of them don't race
+      each other; fetching only adds objects, so it's fine under readers
+    - least recently used mirrors are deleted when the total size goes over
+      the disk budget
+    """
+
+    def __init__(self, root: str | Path, budget_bytes: int, log=print):
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self.log = log
+        self._held: list = []  # shared locks kept until release()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, log=print) -> "MirrorCache | None":
+        root = os.getenv("GIT_MIRROR_DIR", "").strip()
+        if not root:
+            return None
+        return cls(root, parse_size(os.getenv("GIT_MIRROR_BUDGET", "20g")), log=log)
+
+    # ----------------------------
+    # Paths / locks
+    # ----------------------------
+    def mirror_path(self, repo_url: str) -> Path:
+        # Strip credentials so the same repo maps to one mirror whoever asks
+        clean = re.sub(r"//[^/@]+@", "//", repo_url.strip()).rstrip("/")
+        if clean.endswith(".git"):
+            clean = clean[:-4]
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", "/".join(clean.split("/")[-2:]))
+        digest = hashlib.sha1(clean.lower().encode("utf-8")).hexdigest()[:12]
+        return self.root / f"{name}-{digest}.git"
+
+    def _lock_file(self, mirror: Path):
+        return open(str(mirror) + ".lock", "a+")
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def clone(self, repo_url: str, dest: Path, run) -> Path:
+        """
+        Clone `repo_url` into `dest` borrowing objects from the repo's mirror.
+
+        `run(cmd, cwd=None)` runs a shell command (the agent's tracked runner).
+        The mirror stays share-locked until release().
+        """
+        mirror = self.mirror_path(repo_url)
+        lock = self._lock_file(mirror)
+        try:
+            started = time.monotonic()
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not (mirror / "HEAD").exists():
+                # Drop the shared lock first so two tasks creating at once can't deadlock upgrading
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another task may have created it while we waited
+                if not (mirror / "HEAD").exists():
+                    self.log(f"Git cache miss: creating mirror {mirror.name}")
+                    tmp = mirror.with_name(mirror.name + ".tmp")
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    run(f"git clone --mirror {repo_url} {tmp}")
+                    tmp.rename(mirror)
+                # Downgrade to shared: other tasks may use it, eviction may not delete it
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            else:
+                self.log(f"Git cache hit: updating mirror {mirror.name}")
+                with open(str(mirror) + ".fetch.lock", "a+") as fetch_lock:
+                    fcntl.flock(fetch_lock, fcntl.LOCK_EX)
+                    run(f"git -C {mirror} fetch --prune origin")
+            self.log(f"Mirror ready in {time.monotonic() - started:.1f}s")
+        except BaseException:
+            lock.close()
+            raise
+        self._held.append(lock)
+        os.utime(mirror, None)  # LRU timestamp
+
+        run(f"git clone --reference {mirror} {repo_url} {dest}")
+        self._evict(keep=mirror)
+        return mirror
+
+    def release(self):
+        """Drop the shared locks taken by clone() (end of task)."""
+        for lock in self._held:
+            try:
+                lock.close()
+            except Exception:
+                pass
+        self._held = []
+
+    # ----------------------------
+    # Eviction
+    # ----------------------------
+    def _evict(self, keep: Path):
+        mirrors = [p for p in self.root.glob("*.git") if p.is_dir()]
+        sizes = {p: _dir_size(p) for p in mirrors}
+        total = sum(sizes.values())
+        if total <= self.budget_bytes:
+            return
+        # Oldest first
+        for mirror in sorted(mirrors, key=lambda p: p.stat().st_mtime):
+            if total <= self.budget_bytes:
+                break
+            if mirror == keep:
+                continue
+            lock = self._lock_file(mirror)
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                continue  # in use by another task
+            try:
+                shutil.rmtree(mirror, ignore_errors=True)
+                total -= sizes[mirror]
+                self.log(f"Git cache: evicted {mirror.name} ({sizes[mirror] // (1024 * 1024)} MiB)")
+            finally:
+                # The .lock file stays: unlinking it could let two writers lock different inodes
+                lock.close()
@@ -0,0 +1,246 @@
+# agent/impact_select.py
+import ast
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+# Directories never scanned for sources or tests
+SKIP_DIRS = {".git", ".venv", "venv", "env", "node_modules", "__pycache__", "build", "dist", ".tox", ".nox", "site-packages"}
+# A change to one of these can affect any test: run everything
+PY_GLOBAL_FILES = {"conftest.py", "setup.py", "setup.cfg", "pyproject.toml", "pytest.ini", "tox.ini", "requirements.txt"}
+
+
+def is_python_test(rel: str) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _python_files(repo_dir: Path) -> list[str]:
+    out = []
+    for root, dirs, files in os.walk(repo_dir):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in files:
+            if name.endswith(".py"):
+                out.append(os.path.relpath(os.path.join(root, name), repo_dir).replace(os.sep, "/"))
+    return sorted(out)
+
+
+def python_test_files(repo_dir: Path) -> list[str]:
+    return [rel for rel in _python_files(repo_dir) if is_python_test(rel)]
+
+
+def _module_names(rel: str) -> list[str]:
+    """Dotted names a file can be imported as (repo root, and src/ layout)."""
+    parts = rel[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = [".".join(parts)] if parts else []
+    if len(parts) > 1 and parts[0] == "src":
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def _imports(rel: str, source: str) -> set[str]:
+    """Absolute module names imported by a file (relative imports resolved)."""
+    try:
+        tree = ast.parse(source, filename=rel)
+    except (SyntaxError, ValueError):
+        return set()
+    parts = rel[:-3].split("/")
+    package = parts[:-1]  # for __init__.py this is the package itself
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[: len(package) - (node.level - 1)] if node.level > 1 else package
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            if prefix:
+                found.add(prefix)
+            # `from pkg import mod` may name a submodule
+            for alias in node.names:
+                found.add(f"{prefix}.{alias.name}" if prefix else alias.name)
+    return found
+
+
+def affected_python_tests(repo_dir: Path, changed: list[str]) -> list[str] | None:
+    """
+    Test files that (transitively) import any of the `changed` files, from a
+    static import graph of the repo. None means "can't tell, run everything"
+    (non-Python or repo-wide files like conftest.py).
+    """
+    for rel in changed:
+        if rel.rsplit("/", 1)[-1] in PY_GLOBAL_FILES or not rel.endswith(".py"):
+            return None
+
+    files = _python_files(repo_dir)
+    by_module: dict[str, set[str]] = defaultdict(set)
+    for rel in files:
+        for mod in _module_names(rel):
+            by_module[mod].add(rel)
+
+    importers: dict[str, set[str]] = defaultdict(set)  # file -> files importing it
+    for rel in files:
+        try:
+            source = (repo_dir / rel).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        for mod in _imports(rel, source):
+            # Importing a.b.c also runs a/__init__ and a/b/__init__
+            pieces = mod.split(".")
+            for i in range(len(pieces), 0, -1):
+                for target in by_module.get(".".join(pieces[:i]), ()):
+                    if target != rel:
+                        importers[target].add(rel)
+
+    seen = set(changed)
+    queue = deque(changed)
+    while queue:
+        for dependent in importers.get(queue.popleft(), ()):
+            if dependent not in seen:
+                seen.add(dependent)
+                queue.append(dependent)
+
+    # Nothing imports a conftest.py, pytest loads it for every test below it
+    selected = {rel for rel in seen if is_python_test(rel)}
+    for rel in seen:
+        if rel.rsplit("/", 1)[-1] != "conftest.py":
+            continue
+        if "/" not in rel:
+            return None  # root conftest: every test
+        prefix = rel.rsplit("/", 1)[0] + "/"
+        selected.update(t for t in files if t.startswith(prefix) and is_python_test(t))
+    return sorted(selected)
+
+
+def js_related_command(repo_dir: Path, changed: list[str]) -> str | None:
+    """The test runner's related-tests mode for the `changed` files (jest / vitest), if the repo uses one."""
+    try:
+        pkg = json.loads((repo_dir / "package.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    deps = {**(pkg.get("dependencies") or {}), **(pkg.get("devDependencies") or {})}
+    test_script = (pkg.get("scripts") or {}).get("test", "")
+    files = " ".join(shlex.quote(rel) for rel in changed)
+    if "vitest" in deps or "vitest" in test_script:
+        return f"npx vitest related --run --passWithNoTests {files}"
+    if "jest" in deps or "jest" in test_script:
+        # jest spreads test files over (cores - 1) workers by default
+        return f"npx jest --passWithNoTests --findRelatedTests {files}"
+    return None
+
+
+def shard(items: list[str], n: int) -> list[list[str]]:
+    """Split into at most n round-robin groups (no empty ones)."""
+    groups = [items[i::n] for i in range(max(1, n))]
+    return [g for g in groups if g]
+
+
+def _cgroup_cpu_limit() -> int | None:
+    """CPUs allowed by the container's cgroup quota (`docker run --cpus`), if any."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()[:2]
+        if quota == "max":
+            return None
+        return max(1, -(-int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        return max(1, -(-quota // period)) if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def pytest_workers(cap: int) -> int:
+    """
+    How many pytest processes to run side by side: the CPUs this container may
+    actually use (affinity, then the cgroup quota), never more than `cap`.
+    os.cpu_count() is the host's count and ignores the container limits.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, limit)
+    return max(1, min(cpus, cap))
+
+
+# ----------------------------
+# Results cached by tree hash
+# ----------------------------
+def worktree_hash(repo_dir: Path) -> str | None:
+    """
+    Tree id of the working tree as it is now (tracked + untracked, minus
+    ignored files), built in a throwaway index so the real one is untouched.
+    """
+    index = repo_dir / ".git" / "index"
+    tmp = repo_dir / ".git" / "jules-test-index"
+    try:
+        if index.exists():
+            tmp.write_bytes(index.read_bytes())  # keeps git's stat cache: only changed files are rehashed
+        env = {**os.environ, "GIT_INDEX_FILE": str(tmp)}
+        subprocess.run(["git", "add", "-A"], cwd=repo_dir, env=env, check=True, capture_output=True)
+        out = subprocess.run(["git", "write-tree"], cwd=repo_dir, env=env, check=True, capture_output=True, text=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# Default home of TestResultCache on the dep-cache volume (dep_cache eviction leaves it alone)
+TEST_RESULT_SUBDIR = "test-results"
+
+
+class TestResultCache:
+    """Test outcomes keyed by (tree hash, command); a shared volume lets reruns skip tests."""
+
+    def __init__(self, root: str | Path, max_entries: int = 5000):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "TestResultCache | None":
+        root = os.getenv("TEST_RESULT_DIR", "").strip()
+        if not root and os.getenv("DEP_CACHE_DIR", "").strip():
+            root = os.path.join(os.getenv("DEP_CACHE_DIR").strip(), TEST_RESULT_SUBDIR)
+        return cls(root) if root else None
+
+    @staticmethod
+    def key(tree: str, command: str) -> str:
+        return hashlib.sha256(f"{tree}\0{command}".encode("utf-8")).hexdigest()[:32]
+
+    def get(self, key: str) -> dict | None:
+        path = self.root / f"{key}.json"
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        os.utime(path, None)
+        return data
+
+    def put(self, key: str, returncode: int, summary: str):
+        path = self.root / f"{key}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"returncode": returncode, "summary": summary, "at": time.time()}), encoding="utf-8")
+        os.replace(tmp, path)
+        entries = list(self.root.glob("*.json"))
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda p: p.stat().st_mtime)
+            for old in entries[: len(entries) - self.max_entries]:
+                old.unlink(missing_ok=True)
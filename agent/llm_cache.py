@@ -0,0 +1,58 @@
+# agent/llm_cache.py
+import hashlib
+import os
+
+import httpx
+
+
+def git_blob_sha(text: str | None) -> str:
+    """SHA-1 of `text` as a git blob (same as `git hash-object`)."""
+    data = (text or "").encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def llm_cache_key(model: str, instructions: str, prompt: str, blob_sha: str) -> str:
+    """Must match backend/services/llm_cache.py:llm_cache_key."""
+    h = hashlib.sha256()
+    for part in (model, instructions, prompt, blob_sha):
+        data = part.encode("utf-8")
+        h.update(b"%d:" % len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Client for the backend's /llm-cache endpoints.
+
+    Lookups use a short timeout and any error counts as a miss: the cache
+    must never be the reason a task fails or gets slower than the LLM call.
+    """
+
+    def __init__(self, backend_url: str, timeout: float = 3.0):
+        self.backend_url = backend_url.rstrip("/")
+        self.timeout = timeout
+        self.last_hit = False
+
+    def get(self, key: str) -> str | None:
+        self.last_hit = False
+        try:
+            r = httpx.get(f"{self.backend_url}/llm-cache/{key}", timeout=self.timeout)
+            if r.status_code == 200:
+                output = r.json().get("output")
+                self.last_hit = bool(output)
+                return output
+        except Exception:
+            pass
+        return None
+
+    def put(self, key: str, model: str, output: str):
+        try:
+            httpx.put(
+                f"{self.backend_url}/llm-cache/{key}",
+                json={"model": model, "output": output},
+                headers={"X-Worker-Token": os.getenv("WORKER_TOKEN", "")},
+                timeout=self.timeout,
+            )
+        except Exception:
+            pass
@@ -0,0 +1,118 @@
+# agent/llm_stream.py
+import re
+import time
+
+
+class RewriteAborted(Exception):
+    """The streamed LLM output broke the rewrite contract; the stream was closed early."""
+
+
+# Chatty openers the model sometimes puts before the file despite the rules.
+# Interjections only count in a prose shape ("Sure!", "Okay.", "Sure, here...",
+# alone on the line): `ok = check()` or `ok, err = f()` is code.
+_PROSE_RE = re.compile(
+    r"^(here('s| is| are)\b|below (is|are)\b|i('ve| have| will|'ll)\b|"
+    r"the (updated|following|revised|modified)\b|this (is|file)\b|"
+    r"(sure|certainly|of course|okay|ok)(\s*[!.](\s|$)|:\s*$|,(?![^=(]*[=(])|$))",
+    re.IGNORECASE,
+)
+
+
+class OutputGuard:
+    """
+    Checks the output-so-far against the rewrite contract:
+      - no markdown fence around the file
+      - no prose before the code
+      - not growing far past the original file size
+    """
+
+    def __init__(self, original: str, max_growth: float = 3.0, min_slack: int = 4000):
+        self.max_chars = int(len(original) * max_growth) + min_slack
+        self.chars = 0
+        self._head = ""
+        self._head_checked = False
+        # A file that itself opens with a fence or a sentence (README etc.) may keep doing so
+        orig_head = original.lstrip()
+        self._allow_fence = orig_head.startswith("```") or orig_head.startswith("~~~")
+        self._allow_prose = bool(_PROSE_RE.match(orig_head.split("\n", 1)[0].strip()))
+
+    def feed(self, delta: str):
+        self.chars += len(delta)
+        if not self._head_checked:
+            self._head += delta
+            self._check_head(self._head.lstrip())
+        if self.chars > self.max_chars:
+            raise RewriteAborted(f"output grew past {self.max_chars} chars (original is much smaller)")
+
+    def _check_head(self, head: str):
+        if not self._allow_fence and (head.startswith("```") or head.startswith("~~~")):
+            raise RewriteAborted("output starts with a markdown fence")
+        # Judge the opening once we have a full first line (or plenty of text)
+        if "\n" in head or len(head) >= 200:
+            first_line = head.split("\n", 1)[0].strip()
+            if not self._allow_prose and _PROSE_RE.match(first_line):
+                raise RewriteAborted(f"prose before the code: {first_line[:80]!r}")
+            self._head_checked = True
+            self._head = ""
+
+
+def stream_rewrite(
+    client,
+    model: str,
+    instructions: str,
+    user_input: str,
+    original: str,
+    on_progress=None,
+    should_stop=None,
+    progress_interval: float = 2.0,
+) -> str:
+    """
+    Stream a Responses API call, checking the output as it arrives.
+
+    `on_progress(tokens, chars, elapsed)` is called at most every
+    `progress_interval` seconds and once at the end. `should_stop()` returning
+    True (e.g. the task was cancelled) closes the stream. Raises RewriteAborted
+    as soon as OutputGuard rejects the text, so we stop paying for a bad answer.
+    """
+    guard = OutputGuard(original)
+    started = time.monotonic()
+    last_report = started
+    parts: list[str] = []
+    tokens = 0
+
+    stream = client.responses.create(
+        model=model,
+        instructions=instructions,
+        input=user_input,
+        stream=True,
+    )
+    try:
+        for event in stream:
+            kind = getattr(event, "type", "")
+            if kind == "response.output_text.delta":
+                parts.append(event.delta)
+                tokens += 1  # one delta is roughly one token
+                guard.feed(event.delta)
+            elif kind == "response.completed":
+                usage = getattr(getattr(event, "response", None), "usage", None)
+                tokens = getattr(usage, "output_tokens", None) or tokens
+            elif kind in ("response.failed", "error"):
+                raise RuntimeError(f"LLM stream failed: {getattr(event, 'error', None) or getattr(event, 'message', kind)}")
+
+            if should_stop and should_stop():
+                raise RewriteAborted("stopped")
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(tokens, guard.chars, now - started)
+    finally:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    if on_progress:
+        on_progress(tokens, guard.chars, time.monotonic() - started)
+    return "".join(parts)
+
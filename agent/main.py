@@ -1,73 +1,172 @@
 # agent/main.py
+import json
 import os
+import shlex
+import shutil
+import signal
 import subprocess
 import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import base64
 
 import httpx
 from openai import OpenAI
 
+from reporter import Reporter
+from control import ControlChannel, TaskCancelled
+from llm_cache import LLMCache, git_blob_sha, llm_cache_key
+from llm_stream import RewriteAborted, stream_rewrite
+from git_cache import MirrorCache
+from steps import StepGraph, current_step, interruptible
+from dep_cache import DepCache, env_key
+from impact_select import (
+    TestResultCache,
+    affected_python_tests,
+    js_related_command,
+    python_test_files,
+    shard,
+    pytest_workers,
+    worktree_hash,
+)
+
 
 # ----------------------------
 # Backend reporting helpers
 # ----------------------------
-def post_log(backend_url: str | None, task_id: str, msg: str):
-    """Append a log line to backend. Never crash agent if backend not reachable."""
+# All reporting goes through one background Reporter per task: the helpers below
+# only queue events, so a slow or unreachable backend never stalls the agent.
+_reporter: Reporter | None = None
+
+
+def get_reporter(backend_url: str | None, task_id: str) -> Reporter | None:
+    global _reporter
     if not backend_url:
-        return
-    try:
-        httpx.post(
-            f"{backend_url}/tasks/{task_id}/logs",
-            json={"message": msg},
-            timeout=5.0,
-        )
-    except Exception:
-        pass
+        return None
+    if _reporter is None or _reporter.backend_url != backend_url or _reporter.task_id != task_id:
+        if _reporter is not None:
+            _reporter.close()
+        _reporter = Reporter(backend_url, task_id)
+    return _reporter
 
 
-def mark_complete(backend_url: str | None, task_id: str):
+def close_reporter():
+    """Final flush of everything still queued."""
+    global _reporter
+    if _reporter is not None:
+        _reporter.close()
+        _reporter = None
+
+
+# ----------------------------
+# Control channel (cancel / deadline / heartbeats)
+# ----------------------------
+_control: ControlChannel | None = None
+
+
+def start_control(backend_url: str | None, task_id: str):
+    global _control
     if not backend_url:
         return
-    try:
-        httpx.post(f"{backend_url}/tasks/{task_id}/complete", timeout=5.0)
-    except Exception:
-        pass
+    _control = ControlChannel(backend_url, task_id)
+    _control.start()
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        # Log batches ride on the WebSocket while it is up
+        reporter.channel = _control
+
+
+def close_control():
+    global _control
+    if _control is not None:
+        _control.close()
+        _control = None
+
+
+def set_phase(name: str):
+    if _control:
+        _control.phase(name)
+
+
+def check_cancel():
+    if _control:
+        _control.check()
+    step = current_step()
+    if step:
+        step.check()
+
+
+def cancellable(fn, *args, **kwargs):
+    """Run a blocking call that a cancel from the backend (or an aborted step graph) can interrupt."""
+    if _control or current_step():
+        return interruptible(check_cancel, fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def post_log(backend_url: str | None, task_id: str, msg: str):
+    """Append a log line to backend. Never crash agent if backend not reachable."""
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.log(msg, level="ERROR" if msg.startswith("[ERROR]") else "INFO")
+
+
+def mark_complete(backend_url: str | None, task_id: str):
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.call("/complete")
 
 
 def mark_fail(backend_url: str | None, task_id: str, reason: str):
-    if not backend_url:
-        return
-    try:
-        httpx.post(
-            f"{backend_url}/tasks/{task_id}/fail",
-            json={"reason": reason},
-            timeout=5.0,
-        )
-    except Exception:
-        pass
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.call("/fail", {"reason": reason})
 
 
 def post_diff(backend_url: str | None, task_id: str, diff_text: str):
     """Save git diff to backend."""
-    if not backend_url:
-        return
-    try:
-        httpx.post(
-            f"{backend_url}/tasks/{task_id}/diff",
-            json={"diff": diff_text},
-            timeout=10.0,
-        )
-    except Exception:
-        pass
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.call("/diff", {"diff": diff_text})
 
 
 # ----------------------------
 # Shell helpers
 # ----------------------------
+def _run_tracked(cmd: str, cwd: str | None = None) -> subprocess.CompletedProcess:
+    """Like subprocess.run, but the control channel can kill it on cancel."""
+    check_cancel()
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        cwd=cwd,
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,  # own process group, so cancel kills children too
+    )
+    step = current_step()
+    if _control:
+        _control.track(proc)
+    if step:
+        step.track(proc)
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        if _control:
+            _control.untrack(proc)
+        if step:
+            step.untrack(proc)
+    check_cancel()
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
 def run(cmd: str, cwd: str | None = None, allow_fail: bool = False):
     print(f"\n$ {cmd}")
-    result = subprocess.run(cmd, shell=True, cwd=cwd, text=True, capture_output=True)
+    result = _run_tracked(cmd, cwd=cwd)
     if result.stdout:
         print(result.stdout)
     if result.stderr:
@@ -77,26 +176,92 @@ def run(cmd: str, cwd: str | None = None, allow_fail: bool = False):
         msg = f"Command failed ({result.returncode}): {cmd}\nSTDERR: {result.stderr.strip()}"
         if allow_fail:
             print("[WARN]", msg)
-            return
+            return result.returncode
         raise RuntimeError(msg)
+    return 0
 
 
 def run_capture(cmd: str, cwd: str | None = None) -> str:
     """Run a shell command and capture stdout as text."""
     print(f"\n$ {cmd}")
-    return subprocess.check_output(cmd, shell=True, cwd=cwd, text=True)
+    result = _run_tracked(cmd, cwd=cwd)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+    return result.stdout
 
 
 # ----------------------------
 # LLM edit helper
 # ----------------------------
-def llm_rewrite_file(prompt: str, file_path: str, original: str) -> str:
+REWRITE_MODEL = "gpt-4o-mini"
+# Attempts when the streamed output breaks the contract (fences, prose, runaway size)
+REWRITE_ATTEMPTS = max(1, int(os.getenv("REWRITE_ATTEMPTS", "2")))  # at least one try
+# Multi-file tasks: how much of each other target file goes into a rewrite's prompt
+REWRITE_CONTEXT_CHARS = int(os.getenv("REWRITE_CONTEXT_CHARS", "20000"))
+
+
+def report_llm_progress(
+    backend_url: str | None,
+    task_id: str,
+    tokens: int,
+    chars: int,
+    elapsed: float,
+    file: str | None = None,
+    channel: ControlChannel | None = None,
+):
+    """
+    Forward streaming progress; over the task's control `channel` when it is up,
+    else as a log line. The channel is passed in, not read from `_control`: a
+    stream left running after its task ended must not report into the next task.
+    """
+    frame = {"type": "progress", "step": "llm", "tokens": tokens, "chars": chars, "elapsed": round(elapsed, 1)}
+    if file:
+        frame["file"] = file
+    if channel and channel.send(frame):
+        return
+    post_log(backend_url, task_id, f"LLM{' ' + file if file else ''}: {tokens} tokens, {chars} chars, {elapsed:.1f}s")
+
+
+# Multi-file tasks rewrite files concurrently; this bounds the LLM calls in flight
+_llm_slots = threading.BoundedSemaphore(max(1, int(os.getenv("LLM_CONCURRENCY", "4"))))
+
+
+@contextmanager
+def llm_slot():
+    while not _llm_slots.acquire(timeout=0.2):
+        check_cancel()
+    try:
+        yield
+    finally:
+        _llm_slots.release()
+
+
+def llm_rewrite_file(
+    prompt: str,
+    file_path: str,
+    original: str,
+    cache: LLMCache | None = None,
+    on_progress=None,
+    on_abort=None,
+    should_stop=None,
+) -> str:
     """
     Ask model to output the full updated file content ONLY.
     The agent will overwrite the file with this output.
-    """
-    client = OpenAI()
 
+    With a `cache`, identical (model, instructions, prompt, file blob) requests
+    are answered by the backend's LLM cache instead of the model.
+
+    The response is streamed and checked as it arrives; a response that starts
+    with a fence or prose, or grows far past the original, is dropped at once
+    and retried (up to REWRITE_ATTEMPTS). `on_abort(attempt, reason)` is called
+    for each dropped attempt.
+
+    `should_stop()` returning True closes the stream. This usually runs in a
+    background thread (see cancellable()) that outlives its caller on a cancel, so
+    it must cover both the task cancel and the step abort, or the completion keeps
+    streaming (and billing) after nobody is waiting for it.
+    """
     instructions = f"""
 You are an expert software engineer.
 
@@ -117,24 +282,312 @@ CURRENT FILE CONTENT:
 {original}
 """
 
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=instructions,
-        input=user_input,
+    key = llm_cache_key(REWRITE_MODEL, instructions, prompt, git_blob_sha(original))
+    if cache:
+        cached = cache.get(key)
+        if cached:
+            return cached
+
+    client = OpenAI()
+    for attempt in range(1, REWRITE_ATTEMPTS + 1):
+        try:
+            updated = stream_rewrite(
+                client,
+                REWRITE_MODEL,
+                instructions,
+                user_input,
+                original,
+                on_progress=on_progress,
+                should_stop=should_stop,
+            ).strip()
+            break
+        except RewriteAborted as e:
+            if should_stop and should_stop():
+                raise
+            if on_abort:
+                on_abort(attempt, str(e))
+            if attempt == REWRITE_ATTEMPTS:
+                raise RuntimeError(f"LLM output rejected: {e}") from e
+
+    if cache and updated:
+        cache.put(key, REWRITE_MODEL, updated)
+    return updated
+
+# ----------------------------
+# Git clone through the shared mirror cache
+# ----------------------------
+_git_cache: MirrorCache | None = None
+
+
+def clone_repo(backend_url: str | None, task_id: str, repo_url: str, repo_dir: Path):
+    """
+    Clone via the bare-mirror cache when GIT_MIRROR_DIR is mounted, else a plain clone.
+    A cache problem never fails the task; it falls back to the plain clone.
+    """
+    global _git_cache
+    if _git_cache is None:
+        _git_cache = MirrorCache.from_env()
+    if _git_cache is not None:
+        _git_cache.log = lambda msg: post_log(backend_url, task_id, msg)
+        try:
+            _git_cache.clone(repo_url, repo_dir, run)
+            return
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            post_log(backend_url, task_id, f"[WARN] Git cache clone failed ({e}); falling back to a plain clone")
+            _git_cache.release()
+            shutil.rmtree(repo_dir, ignore_errors=True)
+    run(f"git clone {repo_url} {repo_dir}")
+
+
+# Files the validation / test phase looks at in the repo root
+SPARSE_MANIFESTS = (
+    "requirements.txt",
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "package.json",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+)
+
+
+def sparse_clone(repo_url: str, branch: str, repo_dir: Path, target_files: list[str]):
+    """
+    `--depth 1 --filter=blob:none` clone of `branch`, checking out only the
+    target files and the root manifests. Other blobs are fetched on demand
+    (e.g. when the test phase disables the sparse checkout).
+    """
+    run(
+        f"git clone --depth 1 --filter=blob:none --no-checkout --single-branch "
+        f"--branch {shlex.quote(branch)} {repo_url} {repo_dir}"
     )
-    return resp.output_text.strip()
+    paths = []
+    for target_file in target_files:
+        normalized = target_file.replace("\\", "/").lstrip("/")
+        paths.append(normalized)
+        if normalized.startswith("main/"):
+            # resolve_target_file() also tries the path without a leading "main/"
+            paths.append(normalized[len("main/"):])
+    paths += list(SPARSE_MANIFESTS)
+    patterns = " ".join(shlex.quote("/" + p) for p in paths)
+    run("git sparse-checkout init --no-cone", cwd=str(repo_dir))
+    run(f"git sparse-checkout set --no-cone {patterns}", cwd=str(repo_dir))
 
-def post_work_branch(backend_url: str | None, task_id: str, work_branch: str):
-    if not backend_url:
+
+# ----------------------------
+# Dependency install through the shared snapshot cache
+# ----------------------------
+_dep_cache: DepCache | None = None
+
+
+def _get_dep_cache(backend_url: str | None, task_id: str) -> DepCache | None:
+    global _dep_cache
+    if _dep_cache is None:
+        _dep_cache = DepCache.from_env()
+    if _dep_cache is not None:
+        _dep_cache.log = lambda msg: post_log(backend_url, task_id, msg)
+    return _dep_cache
+
+
+def install_node_deps(backend_url: str | None, task_id: str, repo_dir: Path, repo_full_name: str):
+    """npm install, or restore node_modules from this repo's snapshot keyed by the lockfile."""
+    cache = _get_dep_cache(backend_url, task_id)
+    key = env_key("node", repo_dir, repo_full_name) if cache else None
+    if key and cache.restore("node", key, repo_dir / "node_modules"):
         return
-    try:
-        httpx.post(
-            f"{backend_url}/tasks/{task_id}/work-branch",
-            json={"work_branch": work_branch},
-            timeout=10.0
-        )
-    except Exception:
-        pass
+    rc = run("npm install", cwd=str(repo_dir), allow_fail=True)
+    if key and rc == 0:
+        cache.store("node", key, repo_dir / "node_modules")
+
+
+def install_python_deps(backend_url: str | None, task_id: str, repo_dir: Path, repo_full_name: str) -> str:
+    """
+    Install requirements.txt into a venv (restored from this repo's snapshot when
+    the requirements match one) and return the python to run tests with. Falls
+    back to the old system-wide pip3 install if a venv can't be made.
+    """
+    venv = WORKSPACE / ".venv"
+    cache = _get_dep_cache(backend_url, task_id)
+    key = env_key("python", repo_dir, repo_full_name) if cache else None
+    if key and cache.restore("python", key, venv):
+        return str(venv / "bin" / "python")
+
+    shutil.rmtree(venv, ignore_errors=True)
+    # --system-site-packages: the image's pytest stays importable
+    if run(f"python3 -m venv --system-site-packages {venv}", allow_fail=True) != 0:
+        run("pip3 install -r requirements.txt", cwd=str(repo_dir), allow_fail=True)
+        return "python3"
+    rc = run(f"{venv}/bin/pip install -r requirements.txt", cwd=str(repo_dir), allow_fail=True)
+    if key and rc == 0:
+        cache.store("python", key, venv)
+    return str(venv / "bin" / "python")
+
+
+def validate_file(backend_url: str | None, task_id: str, repo_dir: Path, rel_path: str):
+    """File-type specific checks for an edited file (raises on a hard failure)."""
+    file_path = repo_dir / rel_path
+    content = file_path.read_text(encoding="utf-8", errors="replace")
+    suffix = Path(rel_path).suffix.lower()
+
+    # Python files: run py_compile and fail on errors
+    if suffix == ".py":
+        post_log(backend_url, task_id, "Running python syntax check (py_compile)...")
+        run(f"python3 -m py_compile {rel_path}", cwd=str(repo_dir))
+        post_log(backend_url, task_id, "py_compile passed.")
+
+    # JSON files: validate JSON syntax
+    elif suffix == ".json":
+        post_log(backend_url, task_id, "Validating JSON syntax...")
+        import json
+        try:
+            json.loads(content)
+            post_log(backend_url, task_id, "JSON syntax OK.")
+        except Exception as e:
+            raise RuntimeError(f"JSON parse error: {e}")
+
+    # YAML files: try to validate if PyYAML is available (best-effort)
+    elif suffix in (".yml", ".yaml"):
+        post_log(backend_url, task_id, "Validating YAML syntax (PyYAML optional)...")
+        try:
+            import yaml
+            yaml.safe_load(content)
+            post_log(backend_url, task_id, "YAML syntax OK.")
+        except ImportError:
+            post_log(backend_url, task_id, "PyYAML not installed; skipping YAML validation.")
+        except Exception as e:
+            raise RuntimeError(f"YAML parse error: {e}")
+
+    # HTML files: basic heuristics + optional 'tidy' if present (best-effort)
+    elif suffix in (".html", ".htm"):
+        post_log(backend_url, task_id, "Running basic HTML sanity checks...")
+        if not content.strip():
+            raise RuntimeError("HTML file is empty")
+        if "<" not in content or ">" not in content:
+            post_log(backend_url, task_id, "[WARN] HTML appears malformed (no angle brackets found).")
+        # Try to run tidy if available (allow_fail to avoid crashing when not installed)
+        try:
+            run(f"tidy -e {rel_path}", cwd=str(repo_dir), allow_fail=True)
+            post_log(backend_url, task_id, "Finished optional tidy check (if installed).")
+        except Exception:
+            post_log(backend_url, task_id, "Optional tidy check could not be run; skipping.")
+
+    else:
+        post_log(backend_url, task_id, f"No file-specific checks for suffix '{suffix}'. Skipping checks.")
+
+
+# ----------------------------
+# Test phase: affected tests only, in parallel, cached by tree hash
+# ----------------------------
+def _print_result(result: subprocess.CompletedProcess):
+    if result.stdout:
+        print(result.stdout)
+    if result.stderr:
+        print(result.stderr)
+
+
+def _last_line(text: str) -> str:
+    lines = [l for l in (text or "").strip().splitlines() if l.strip()]
+    return lines[-1].strip() if lines else ""
+
+
+def cached_tests(backend_url: str | None, task_id: str, repo_dir: Path, command: str, execute) -> int:
+    """
+    Run `execute()` -> (returncode, summary) unless this exact command already
+    ran on an identical tree; the outcome is then replayed from the cache.
+    """
+    cache = TestResultCache.from_env()
+    tree = worktree_hash(repo_dir) if cache else None
+    key = TestResultCache.key(tree, command) if tree else None
+    hit = cache.get(key) if key else None
+    if hit is not None:
+        post_log(backend_url, task_id, f"Test cache hit (tree {tree[:12]}): exit {hit['returncode']} {hit['summary']}".rstrip())
+        return hit["returncode"]
+    started = time.monotonic()
+    returncode, summary = execute()
+    post_log(backend_url, task_id, f"Tests exit {returncode} in {time.monotonic() - started:.1f}s {summary}".rstrip())
+    if key:
+        cache.put(key, returncode, summary)
+    return returncode
+
+
+# Cap on pytest processes in one container; each imports the whole project, and the
+# container has a memory limit
+TEST_WORKERS = max(1, int(os.getenv("TEST_WORKERS", "4")))
+
+
+def run_python_tests(backend_url: str | None, task_id: str, repo_dir: Path, python: str, rel_paths: list[str], scope: str):
+    changed = ", ".join(rel_paths)
+    if scope == "full":
+        selected = None
+    else:
+        selected = affected_python_tests(repo_dir, rel_paths)
+        if selected is None:
+            post_log(backend_url, task_id, f"{changed} can affect any test; running the full suite")
+        elif not selected:
+            post_log(backend_url, task_id, f"No tests import {changed}; skipping pytest")
+            return
+        else:
+            post_log(backend_url, task_id, f"Impact analysis: {len(selected)} test file(s) depend on {changed}")
+    files = selected if selected is not None else python_test_files(repo_dir)
+
+    workers = pytest_workers(TEST_WORKERS)
+    xdist = _run_tracked(f"{python} -c 'import xdist'").returncode == 0
+    if xdist or len(files) < 2 or workers == 1:
+        # An explicit -n: "auto" would count the host's cores, not the container's
+        par = f" -n {workers}" if xdist and len(files) != 1 and workers > 1 else ""
+        command = f"{python} -m pytest -q{par} " + " ".join(shlex.quote(f) for f in files)
+        shards = None
+    else:
+        # No pytest-xdist in the env: one pytest process per usable core, files dealt round-robin
+        shards = shard(files, workers)
+        command = f"{python} -m pytest -q [{len(shards)} shards] " + " ".join(shlex.quote(f) for f in files)
+
+    def execute():
+        if shards is None:
+            print(f"\n$ {command}")
+            result = _run_tracked(command.strip(), cwd=str(repo_dir))
+            _print_result(result)
+            return result.returncode, _last_line(result.stdout)
+        cmds = [f"{python} -m pytest -q " + " ".join(shlex.quote(f) for f in group) for group in shards]
+        with ThreadPoolExecutor(max_workers=len(cmds)) as pool:
+            results = list(pool.map(lambda c: _run_tracked(c, cwd=str(repo_dir)), cmds))
+        for cmd, result in zip(cmds, results):
+            print(f"\n$ {cmd}")
+            _print_result(result)
+        return max(r.returncode for r in results), " | ".join(_last_line(r.stdout) for r in results)
+
+    cached_tests(backend_url, task_id, repo_dir, command, execute)
+
+
+def run_node_tests(backend_url: str | None, task_id: str, repo_dir: Path, rel_paths: list[str], scope: str):
+    command = js_related_command(repo_dir, rel_paths) if scope != "full" else None
+    if command:
+        post_log(backend_url, task_id, f"Running only tests related to {', '.join(rel_paths)}")
+    else:
+        command = "npm test"
+
+    def execute():
+        print(f"\n$ {command}")
+        result = _run_tracked(command, cwd=str(repo_dir))
+        _print_result(result)
+        return result.returncode, _last_line(result.stdout)
+
+    cached_tests(backend_url, task_id, repo_dir, command, execute)
+
+
+def release_git_cache():
+    if _git_cache is not None:
+        _git_cache.release()
+
+
+def post_work_branch(backend_url: str | None, task_id: str, work_branch: str):
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.call("/work-branch", {"work_branch": work_branch})
 
 def getenv_b64(name: str) -> str:
     val = os.getenv(name, "")
@@ -169,75 +622,113 @@ def resolve_target_file(repo_dir: Path, target_file: str) -> Path | None:
     return None
 
 def set_status(backend_url: str | None, task_id: str, status: str):
-    if not backend_url:
-        return
-    try:
-        httpx.post(
-            f"{backend_url}/tasks/{task_id}/status",
-            json={"status": status},
-            timeout=10.0,
-        )
-    except Exception:
-        pass
+    reporter = get_reporter(backend_url, task_id)
+    if reporter:
+        reporter.call("/status", {"status": status})
 
 
 # ----------------------------
 # Main agent workflow
 # ----------------------------
-def main():
-    backend_url = os.getenv("BACKEND_URL", "http://host.docker.internal:8000")
-    repo_url = os.getenv("REPO_URL")
-    branch = os.getenv("BRANCH", "main")
-    task_id = os.getenv("TASK_ID", "unknown")
+WORKSPACE = Path("/workspace")
+
+
+def task_config_from_env() -> dict:
+    """Task settings for a one-shot container (same keys as a worker assignment)."""
+    return {
+        "backend_url": os.getenv("BACKEND_URL", "http://host.docker.internal:8000"),
+        "task_id": os.getenv("TASK_ID", "unknown"),
+        "mode": os.getenv("MODE", "execute"),
+        "repo_url": os.getenv("REPO_URL"),
+        "repo_full_name": os.getenv("REPO_FULL_NAME", ""),
+        "branch": os.getenv("BRANCH", "main"),
+        "prompt": getenv_b64("TASK_PROMPT_B64"),
+        "target_file": getenv_b64("TARGET_FILE_B64"),
+        "target_files": json.loads(getenv_b64("TARGET_FILES_B64") or "[]"),
+        "work_branch": os.getenv("WORK_BRANCH", ""),
+        "github_token": os.getenv("GITHUB_TOKEN", ""),
+        "checkout_mode": os.getenv("CHECKOUT_MODE", "full"),
+        "test_scope": os.getenv("TEST_SCOPE", "affected"),
+    }
+
+
+def reset_workspace(workspace: Path = WORKSPACE):
+    """Empty /workspace so the next task starts from a clean slate."""
+    workspace.mkdir(parents=True, exist_ok=True)
+    for child in workspace.iterdir():
+        if child.is_dir() and not child.is_symlink():
+            shutil.rmtree(child, ignore_errors=True)
+        else:
+            child.unlink(missing_ok=True)
+
+
+def main(cfg: dict | None = None):
+    cfg = cfg or task_config_from_env()
+    backend_url = cfg["backend_url"]
+    repo_url = cfg.get("repo_url")
+    branch = cfg.get("branch") or "main"
+    task_id = str(cfg.get("task_id") or "unknown")
 
-    task_prompt = getenv_b64("TASK_PROMPT_B64").strip()
-    target_file = getenv_b64("TARGET_FILE_B64").strip()
+    task_prompt = (cfg.get("prompt") or "").strip()
+    target_file = (cfg.get("target_file") or "").strip()
+    # Multi-file tasks; older assignments only carry target_file
+    target_files = [p.strip() for p in (cfg.get("target_files") or [target_file]) if p and p.strip()]
 
-    github_token = os.getenv("GITHUB_TOKEN", "").strip()
-    repo_full_name = os.getenv("REPO_FULL_NAME", "").strip()
+    github_token = (cfg.get("github_token") or "").strip()
+    repo_full_name = (cfg.get("repo_full_name") or "").strip()
 
     if not github_token:
         raise RuntimeError("GITHUB_TOKEN not set (needed to push branch)")
     if not repo_full_name or "/" not in repo_full_name:
         raise RuntimeError("REPO_FULL_NAME not set or invalid")
 
-    post_log(backend_url, task_id, f"DEBUG: TARGET_FILE='{target_file}'")
+    post_log(backend_url, task_id, f"DEBUG: TARGET_FILES={target_files}")
     post_log(backend_url, task_id, f"DEBUG: TASK_PROMPT length={len(task_prompt)}")
     post_log(backend_url, task_id, f"DEBUG: OPENAI_API_KEY set={bool(os.getenv('OPENAI_API_KEY'))}")
 
     # support push mode (only push when MODE=push)
-    mode = os.getenv("MODE", "execute").lower()
+    mode = (cfg.get("mode") or "execute").lower()
+    # "sparse" opts into a shallow, blobless, sparse clone of just the branch (execute mode)
+    checkout_mode = (cfg.get("checkout_mode") or "full").lower()
+    # "affected" runs only the tests that depend on the edited file; "full" the whole suite
+    test_scope = (cfg.get("test_scope") or "affected").lower()
     post_log(backend_url, task_id, f"DEBUG: MODE={mode}")
 
-    print("=== Jules Agent v2 (LLM single-file edit) ===")
+    print("=== Jules Agent v2 (LLM file edit) ===")
     print(f"TASK_ID: {task_id}")
     print(f"REPO_URL: {repo_url}")
     print(f"BRANCH: {branch}")
     print(f"BACKEND_URL: {backend_url}")
-    print(f"TARGET_FILE: {target_file}")
+    print(f"TARGET_FILES: {', '.join(target_files)}")
 
     if not repo_url:
         raise RuntimeError("REPO_URL not set")
 
-    if not target_file:
+    if not target_files:
         raise RuntimeError("TARGET_FILE not set (backend must set it before starting)")
 
     if not task_prompt:
         raise RuntimeError("TASK_PROMPT not set (backend must pass task.prompt into container)")
 
-    workspace = Path("/workspace")
+    workspace = WORKSPACE
     repo_dir = workspace / "repo"
+    if repo_dir.exists():
+        # Left over from an earlier task in this (warm) container
+        reset_workspace(workspace)
     workspace.mkdir(parents=True, exist_ok=True)
 
+    start_control(backend_url, task_id)
+
     try:
         # If we're running in push mode, only execute the push steps
         if mode == "push":
-            work_branch = os.getenv("WORK_BRANCH", "").strip()
+            work_branch = (cfg.get("work_branch") or "").strip()
             if not work_branch:
                 raise RuntimeError("WORK_BRANCH not provided to push mode")
 
+            set_phase("clone")
             post_log(backend_url, task_id, f"Cloning repo for push: {repo_url}")
-            run(f"git clone {repo_url} {repo_dir}")
+            clone_repo(backend_url, task_id, repo_url, repo_dir)
             post_log(backend_url, task_id, "Clone completed for push.")
 
             post_log(backend_url, task_id, f"Checking out branch: {work_branch}")
@@ -264,10 +755,10 @@ def main():
             post_log(backend_url, task_id, "Fetching saved diff from backend (if any)...")
             diff_text = ""
             try:
-                resp = httpx.get(f"{backend_url}/tasks/{task_id}/diff", timeout=30.0)
+                # Raw patch; httpx transparently un-gzips the response
+                resp = httpx.get(f"{backend_url}/tasks/{task_id}/diff.patch", timeout=30.0)
                 if resp.status_code == 200:
-                    # backend returns {"task_id": id, "diff": "..."}
-                    diff_text = resp.json().get("diff", "") or ""
+                    diff_text = resp.text
             except Exception as e:
                 post_log(backend_url, task_id, f"[WARN] Failed to fetch diff: {e}")
 
@@ -301,6 +792,7 @@ def main():
                     except Exception:
                         raise
 
+            set_phase("push")
             post_log(backend_url, task_id, f"Pushing branch: {work_branch}")
             run(f"git push -u origin {work_branch}", cwd=str(repo_dir))
             post_log(backend_url, task_id, "Push completed.")
@@ -311,14 +803,23 @@ def main():
             return
 
         # 1) Clone
-        post_log(backend_url, task_id, f"Cloning repo: {repo_url}")
-        run(f"git clone {repo_url} {repo_dir}")
+        set_phase("clone")
+        sparse = checkout_mode == "sparse"
+        if sparse:
+            # Shallow + blobless + sparse: size stays flat however big the repo is
+            post_log(backend_url, task_id, f"Cloning repo (sparse, branch {branch} only): {repo_url}")
+            sparse_clone(repo_url, branch, repo_dir, target_files)
+        else:
+            post_log(backend_url, task_id, f"Cloning repo: {repo_url}")
+            clone_repo(backend_url, task_id, repo_url, repo_dir)
         post_log(backend_url, task_id, "Clone completed.")
 
         # 2) Checkout branch
+        set_phase("checkout")
         post_log(backend_url, task_id, f"Checking out branch: {branch}")
-        # Ensure remote branches are available after clone
-        run("git fetch --all --tags", cwd=str(repo_dir))
+        if not sparse:
+            # Ensure remote branches are available after clone
+            run("git fetch --all --tags", cwd=str(repo_dir))
         try:
             run(f"git checkout {branch}", cwd=str(repo_dir))
         except RuntimeError:
@@ -326,108 +827,160 @@ def main():
             run(f"git checkout -b {branch} origin/{branch}", cwd=str(repo_dir))
         post_log(backend_url, task_id, "Checkout completed.")
 
-        # 3) Resolve target file and read it
-        file_path = resolve_target_file(repo_dir, target_file)
-        if not file_path:
-            raise RuntimeError(f"Target file not found in repo: {target_file}")
-
-        rel_path = str(file_path.relative_to(repo_dir)).replace("\\", "/")
-        post_log(backend_url, task_id, f"Target file resolved: {rel_path}")
-
-        post_log(backend_url, task_id, f"Reading file: {rel_path}")
-        original = file_path.read_text(encoding="utf-8", errors="replace")
-
-        # 4) LLM rewrite
-        post_log(backend_url, task_id, "Calling LLM to rewrite file...")
-        updated = llm_rewrite_file(task_prompt, rel_path, original)
-
-        if not updated.strip():
-            raise RuntimeError("LLM returned empty content")
-
-        # Optional guard: if model output is identical, still ok
-        if updated.strip() == original.strip():
-            post_log(backend_url, task_id, "LLM output identical to original (no changes). Continuing.")
-
-        # 5) Write file
-        post_log(backend_url, task_id, f"Writing updated file: {rel_path}")
-        file_path.write_text(updated, encoding="utf-8")
-
-        # 6) File-type specific validation (run appropriate checks depending on the file)
-        content = file_path.read_text(encoding="utf-8", errors="replace")
-        suffix = Path(rel_path).suffix.lower()
-
-        # Python files: run py_compile and fail on errors
-        if suffix == ".py":
-            post_log(backend_url, task_id, "Running python syntax check (py_compile)...")
-            run(f"python3 -m py_compile {rel_path}", cwd=str(repo_dir))
-            post_log(backend_url, task_id, "py_compile passed.")
-
-        # JSON files: validate JSON syntax
-        elif suffix == ".json":
-            post_log(backend_url, task_id, "Validating JSON syntax...")
-            import json
-            try:
-                json.loads(content)
-                post_log(backend_url, task_id, "JSON syntax OK.")
-            except Exception as e:
-                raise RuntimeError(f"JSON parse error: {e}")
-
-        # YAML files: try to validate if PyYAML is available (best-effort)
-        elif suffix in (".yml", ".yaml"):
-            post_log(backend_url, task_id, "Validating YAML syntax (PyYAML optional)...")
-            try:
-                import yaml
-                yaml.safe_load(content)
-                post_log(backend_url, task_id, "YAML syntax OK.")
-            except ImportError:
-                post_log(backend_url, task_id, "PyYAML not installed; skipping YAML validation.")
-            except Exception as e:
-                raise RuntimeError(f"YAML parse error: {e}")
-
-        # HTML files: basic heuristics + optional 'tidy' if present (best-effort)
-        elif suffix in (".html", ".htm"):
-            post_log(backend_url, task_id, "Running basic HTML sanity checks...")
-            if not content.strip():
-                raise RuntimeError("HTML file is empty")
-            if "<" not in content or ">" not in content:
-                post_log(backend_url, task_id, "[WARN] HTML appears malformed (no angle brackets found).")
-            # Try to run tidy if available (allow_fail to avoid crashing when not installed)
-            try:
-                run(f"tidy -e {rel_path}", cwd=str(repo_dir), allow_fail=True)
-                post_log(backend_url, task_id, "Finished optional tidy check (if installed).")
-            except Exception:
-                post_log(backend_url, task_id, "Optional tidy check could not be run; skipping.")
-
-        else:
-            post_log(backend_url, task_id, f"No file-specific checks for suffix '{suffix}'. Skipping checks.")
-
-        # 7) Optional: keep your dependency/test detection (best effort)
-        #    This is safe to keep minimal Jules-like behavior.
+        # 3) Resolve the target files (cheap; everything after this runs as a DAG)
+        targets = []
+        for target_file in target_files:
+            file_path = resolve_target_file(repo_dir, target_file)
+            if not file_path:
+                raise RuntimeError(f"Target file not found in repo: {target_file}")
+            rel_path = str(file_path.relative_to(repo_dir)).replace("\\", "/")
+            if rel_path in (t["rel_path"] for t in targets):
+                continue  # two spellings of the same file
+            post_log(backend_url, task_id, f"Target file resolved: {rel_path}")
+            targets.append({"path": file_path, "rel_path": rel_path})
+        rel_paths = [t["rel_path"] for t in targets]
+
+        # 4-7) Dependency install (and expanding a sparse checkout) overlaps the
+        # LLM calls; the files are rewritten concurrently (at most LLM_CONCURRENCY
+        # calls at once), then validated side by side with one test run
         package_json = repo_dir / "package.json"
         requirements_txt = repo_dir / "requirements.txt"
 
-        if package_json.exists():
-            post_log(backend_url, task_id, "Detected Node.js project. Running npm install...")
-            run("npm install", cwd=str(repo_dir), allow_fail=True)
-            post_log(backend_url, task_id, "npm install finished (may have warnings).")
-
-            post_log(backend_url, task_id, "Running npm test (best effort)...")
-            run("npm test", cwd=str(repo_dir), allow_fail=True)
-            post_log(backend_url, task_id, "npm test finished (best effort).")
-
-        elif requirements_txt.exists():
-            post_log(backend_url, task_id, "Detected Python project. Installing requirements (best effort)...")
-            run("pip3 install -r requirements.txt", cwd=str(repo_dir), allow_fail=True)
-            post_log(backend_url, task_id, "pip install finished (best effort).")
-
-            post_log(backend_url, task_id, "Running pytest (best effort)...")
-            run("pytest", cwd=str(repo_dir), allow_fail=True)
-            post_log(backend_url, task_id, "pytest finished (best effort).")
-
-        else:
-            post_log(backend_url, task_id, "No package.json/requirements.txt detected. Skipping deps/tests.")
+        def read_target(target):
+            post_log(backend_url, task_id, f"Reading file: {target['rel_path']}")
+            return target["path"].read_text(encoding="utf-8", errors="replace")
+
+        def expand_checkout():
+            if sparse and (package_json.exists() or requirements_txt.exists()):
+                # Installs and tests need the whole tree; blobs are fetched in one batch here
+                post_log(backend_url, task_id, "Expanding sparse checkout to the full tree for tests...")
+                run("git sparse-checkout disable", cwd=str(repo_dir))
+
+        def install_deps(expand):
+            # Only needs the manifests, not the LLM output
+            if package_json.exists():
+                post_log(backend_url, task_id, "Detected Node.js project. Running npm install...")
+                install_node_deps(backend_url, task_id, repo_dir, repo_full_name)
+                post_log(backend_url, task_id, "npm install finished (may have warnings).")
+                return {"kind": "node"}
+            if requirements_txt.exists():
+                post_log(backend_url, task_id, "Detected Python project. Installing requirements (best effort)...")
+                python = install_python_deps(backend_url, task_id, repo_dir, repo_full_name)
+                post_log(backend_url, task_id, "pip install finished (best effort).")
+                return {"kind": "python", "python": python}
+            return None
+
+        def rewrite(rel_path, original, others):
+            # `others`: rel_path -> current content of the other targets. It goes in the
+            # prompt (not just the model input) so the LLM cache key covers it too.
+            prompt = task_prompt
+            if others:
+                prompt += (
+                    f"\n\n(This change also edits {', '.join(others)}; keep {rel_path} consistent with them."
+                    " Their current content follows; each is rewritten separately with the same prompt.)"
+                )
+                for other, content in others.items():
+                    if len(content) > REWRITE_CONTEXT_CHARS:
+                        content = content[:REWRITE_CONTEXT_CHARS] + "\n... (truncated)"
+                    prompt += f"\n\n--- {other} ---\n{content}"
+            # Bound here, in the step's thread: the stream runs on in a thread of its own
+            control, step = _control, current_step()
+
+            def stopped():
+                return bool((control and control.cancelled.is_set()) or (step and step.aborted.is_set()))
+
+            with llm_slot():
+                post_log(backend_url, task_id, f"Calling LLM to rewrite {rel_path}...")
+                cache = LLMCache(backend_url) if backend_url else None
+                updated = cancellable(
+                    llm_rewrite_file,
+                    prompt,
+                    rel_path,
+                    original,
+                    cache,
+                    on_progress=lambda tokens, chars, elapsed: report_llm_progress(
+                        backend_url, task_id, tokens, chars, elapsed, rel_path, channel=control,
+                    ),
+                    on_abort=lambda attempt, reason: post_log(backend_url, task_id, f"LLM output for {rel_path} rejected (attempt {attempt}): {reason}"),
+                    should_stop=stopped,
+                )
+            if cache and cache.last_hit:
+                post_log(backend_url, task_id, f"LLM cache hit: reusing previous output for {rel_path}")
+
+            if not updated.strip():
+                raise RuntimeError(f"LLM returned empty content for {rel_path}")
+
+            # Optional guard: if model output is identical, still ok
+            if updated.strip() == original.strip():
+                post_log(backend_url, task_id, f"LLM output identical to original for {rel_path} (no changes). Continuing.")
+            return updated
+
+        def write_file(target, updated):
+            post_log(backend_url, task_id, f"Writing updated file: {target['rel_path']}")
+            target["path"].write_text(updated, encoding="utf-8")
+
+        def test(install):
+            # Best effort, like before: failures are logged, not fatal
+            if install is None:
+                post_log(backend_url, task_id, "No package.json/requirements.txt detected. Skipping deps/tests.")
+            elif install["kind"] == "node":
+                post_log(backend_url, task_id, "Running npm test (best effort)...")
+                run_node_tests(backend_url, task_id, repo_dir, rel_paths, test_scope)
+                post_log(backend_url, task_id, "npm test finished (best effort).")
+            else:
+                post_log(backend_url, task_id, "Running pytest (best effort)...")
+                run_python_tests(backend_url, task_id, repo_dir, install["python"], rel_paths, test_scope)
+                post_log(backend_url, task_id, "pytest finished (best effort).")
+
+        graph = StepGraph(
+            max_workers=len(targets) + 4,
+            poll=check_cancel,
+            on_start=lambda step: set_phase(step.phase or step.name),
+            on_finish=lambda name, seconds, error: post_log(
+                backend_url, task_id,
+                f"Step {name} {'failed' if error else 'done'} in {seconds:.1f}s",
+            ),
+        )
+        graph.add("expand", expand_checkout, phase="checkout")
+        # An edited manifest / lockfile has to be written before deps are installed from it
+        manifest_writes = tuple(f"write_{i}" for i, t in enumerate(targets) if t["rel_path"] in SPARSE_MANIFESTS)
+        graph.add("install", lambda expand, **writes: install_deps(expand), needs=("expand", *manifest_writes))
+        # Per-file steps are suffixed with the file's index; step inputs arrive by name
+        reads = tuple(f"read_{i}" for i in range(len(targets)))
+        for i, target in enumerate(targets):
+            read, llm, write = f"read_{i}", f"rewrite_{i}", f"write_{i}"
+            graph.add(read, lambda target=target: read_target(target))
+            # Every rewrite sees all the targets' originals, so it waits for all the reads
+            graph.add(
+                llm,
+                lambda target=target, read=read, **inputs: rewrite(
+                    target["rel_path"],
+                    inputs[read],
+                    {t["rel_path"]: inputs[f"read_{j}"] for j, t in enumerate(targets) if f"read_{j}" != read},
+                ),
+                needs=reads,
+                phase="llm",
+            )
+            graph.add(write, lambda target=target, llm=llm, **inputs: write_file(target, inputs[llm]), needs=(llm, "expand"))
+            graph.add(
+                f"validate_{i}",
+                lambda target=target, **inputs: validate_file(backend_url, task_id, repo_dir, target["rel_path"]),
+                needs=(write,),
+                phase="validate",
+            )
+        graph.add(
+            "test",
+            lambda install, **writes: test(install),
+            needs=("install", *(f"write_{i}" for i in range(len(targets)))),
+        )
+        graph.run()
+        post_log(
+            backend_url, task_id,
+            "Step timings: " + ", ".join(f"{n}={t:.1f}s" for n, t in graph.timings.items()),
+        )
 
         # 8) Capture git diff and send to backend
+        set_phase("diff")
         post_log(backend_url, task_id, "Capturing git diff...")
         diff_text = run_capture("git diff", cwd=str(repo_dir))
 
@@ -443,12 +996,13 @@ def main():
         run('git config user.name "Jules Agent"', cwd=str(repo_dir))
 
         # 9) Create branch + commit
+        set_phase("commit")
         work_branch = f"jules/task-{task_id}"
         post_log(backend_url, task_id, f"Creating work branch: {work_branch}")
         run(f"git checkout -b {work_branch}", cwd=str(repo_dir))
 
-        post_log(backend_url, task_id, f"Staging file: {rel_path}")
-        run(f"git add {rel_path}", cwd=str(repo_dir))
+        post_log(backend_url, task_id, f"Staging files: {', '.join(rel_paths)}")
+        run("git add -- " + " ".join(shlex.quote(p) for p in rel_paths), cwd=str(repo_dir))
         
         status = run_capture("git status --porcelain", cwd=str(repo_dir))
         if not status.strip():
@@ -496,6 +1050,10 @@ def main():
 
         print("\n=== Agent done (v2) ===")
 
+    except TaskCancelled as e:
+        # Backend already marked the task CANCELLED (or will fail it on deadline)
+        post_log(backend_url, task_id, f"[CANCEL] Agent stopped: {e}")
+        raise
     except Exception as e:
         err = str(e)
         post_log(backend_url, task_id, f"[ERROR] {err}")
@@ -503,5 +1061,94 @@ def main():
         raise
 
 
+# ----------------------------
+# Worker mode (resident container from the backend's warm pool)
+# ----------------------------
+def worker_main():
+    """
+    Stay resident and run tasks handed out by the backend.
+
+    Long-polls POST /workers/{id}/claim; each assignment runs through main()
+    in this already-warm interpreter, then /workspace is reset. Exits when
+    the backend answers with {"type": "exit"} (pool scale-down) or on SIGTERM.
+    """
+    backend_url = os.getenv("BACKEND_URL", "http://host.docker.internal:8000")
+    worker_id = os.getenv("WORKER_ID") or uuid.uuid4().hex[:12]
+    wait = float(os.getenv("CLAIM_WAIT_SECONDS", "25"))
+
+    client = httpx.Client(
+        base_url=backend_url,
+        headers={"X-Worker-Token": os.getenv("WORKER_TOKEN", "")},
+        timeout=httpx.Timeout(wait + 10.0, connect=5.0),
+    )
+
+    def on_sigterm(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    print(f"=== Jules Agent worker {worker_id} ===")
+
+    backoff = 1.0
+    last = None  # assignment_id of the last task we received (tells the backend none got lost)
+    try:
+        while True:
+            params = {"wait": wait, **({"last": last} if last else {})}
+            try:
+                r = client.post(f"/workers/{worker_id}/claim", params=params)
+            except httpx.HTTPError as e:
+                print(f"[worker] claim failed: {e}; retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+
+            if r.status_code == 204:
+                continue
+            if r.status_code == 401:
+                print("[worker] backend rejected WORKER_TOKEN; exiting")
+                return
+            if r.status_code != 200:
+                print(f"[worker] unexpected claim response {r.status_code}: {r.text[:200]}")
+                time.sleep(1.0)
+                continue
+
+            msg = r.json()
+            if msg.get("type") == "exit":
+                print("[worker] retired by backend; exiting")
+                return
+            if msg.get("type") != "task":
+                continue
+            last = msg.get("assignment_id")
+
+            started = time.monotonic()
+            try:
+                main({**msg, "backend_url": backend_url})
+            except BaseException as e:
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+                # main() already reported the failure / cancel to the backend
+                print(f"[worker] task {msg.get('task_id')} ended: {e}")
+            finally:
+                close_reporter()
+                close_control()
+                release_git_cache()
+                reset_workspace()
+            print(f"[worker] task {msg.get('task_id')} took {time.monotonic() - started:.1f}s")
+    finally:
+        try:
+            client.post(f"/workers/{worker_id}/leave", timeout=5.0)
+        except Exception:
+            pass
+        client.close()
+
+
 if __name__ == "__main__":
-    main()
+    if os.getenv("AGENT_MODE", "").lower() == "worker" or "--worker" in sys.argv[1:]:
+        worker_main()
+        sys.exit(0)
+    try:
+        main()
+    finally:
+        close_reporter()
+        close_control()
+        release_git_cache()
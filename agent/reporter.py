@@ -0,0 +1,215 @@
+# agent/reporter.py
+import atexit
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import httpx
+
+
+class Reporter:
+    """
+    Background reporter that sends logs/status/diff calls to the backend.
+
+    Callers only enqueue events, so a slow or dead backend never blocks the
+    pipeline. A single worker thread drains the queue over one pooled
+    keep-alive connection:
+      - consecutive log lines are sent together to POST /tasks/{id}/logs:batch
+      - other calls (status, diff, work-branch, complete, fail) are sent one by
+        one, in the order they were queued relative to the logs
+    Failed sends are retried with backoff. After too many consecutive failures
+    the circuit opens and the worker waits for a cooldown before trying again.
+    """
+
+    def __init__(
+        self,
+        backend_url: str,
+        task_id: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 10.0,
+    ):
+        self.backend_url = backend_url
+        self.task_id = task_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        # Optional ControlChannel; when connected, log batches go over the WebSocket
+        self.channel = None
+
+        # Lines are numbered per stream so the backend can drop retried duplicates
+        self.stream = uuid.uuid4().hex
+        self._seq = 0
+
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._flushing = 0
+        self._pending_calls = 0
+        self._busy = False
+        self._failures = 0
+        self._open_until = 0.0
+        self.dropped = 0
+
+        self._client = httpx.Client(
+            base_url=backend_url,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        )
+        self._thread = threading.Thread(target=self._run, name="jules-reporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ----------------------------
+    # Public API (never blocks on the network)
+    # ----------------------------
+    def log(self, message: str, level: str = "INFO"):
+        with self._cond:
+            self._seq += 1
+            self._put(("log", {"seq": self._seq, "message": message, "level": level}))
+
+    def call(self, path: str, json: dict | None = None):
+        """Queue a POST to `/tasks/{task_id}{path}`."""
+        with self._cond:
+            self._put(("call", (path, json)))
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything queued so far was sent (or given up on)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._busy:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout: float = 30.0):
+        """Final flush at exit. Safe to call more than once."""
+        if self._closing:
+            return
+        deadline = time.monotonic() + timeout
+        self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        # The worker may still be posting or retrying: closing the client under it
+        # would lose that call, so wait out the rest of the timeout first
+        self._thread.join(timeout=max(deadline - time.monotonic(), 1.0))
+        if self._thread.is_alive():
+            print("[reporter] still sending at exit; leaving the connection open")
+        else:
+            self._client.close()
+        if self.dropped:
+            print(f"[reporter] dropped {self.dropped} event(s) that could not be delivered")
+
+    # ----------------------------
+    # Worker
+    # ----------------------------
+    def _put(self, event):
+        # Caller holds self._cond
+        if len(self._queue) >= self.max_queue:
+            # Drop the oldest log line to make room; never drop control calls
+            for i, (kind, _) in enumerate(self._queue):
+                if kind == "log":
+                    del self._queue[i]
+                    self.dropped += 1
+                    break
+        self._queue.append(event)
+        if event[0] == "call":
+            self._pending_calls += 1
+        if self._urgent():
+            self._cond.notify_all()
+
+    def _urgent(self) -> bool:
+        """True when the worker should send now instead of waiting to fill a batch."""
+        return (
+            self._closing
+            or self._flushing > 0
+            or self._pending_calls > 0
+            or len(self._queue) >= self.batch_size
+        )
+
+    def _take(self):
+        """Pop the next unit of work: a list of log lines or one call."""
+        # Caller holds self._cond
+        kind, data = self._queue[0]
+        if kind == "call":
+            self._queue.popleft()
+            self._pending_calls -= 1
+            return "call", data
+        lines = []
+        while self._queue and self._queue[0][0] == "log" and len(lines) < self.batch_size:
+            lines.append(self._queue.popleft()[1])
+        return "logs", lines
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._urgent():
+                    # Give log lines a moment to pile up into one batch
+                    self._cond.wait(self.flush_interval)
+                if not self._queue:
+                    if self._closing:
+                        return
+                    continue
+                work = self._take()
+                self._busy = True
+
+            try:
+                self._send(*work)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _send(self, kind, data):
+        if kind == "logs":
+            path = f"/tasks/{self.task_id}/logs:batch"
+            body = {"stream": self.stream, "lines": data}
+            if self.channel is not None and self.channel.send({"type": "log", **body}):
+                return
+        else:
+            sub, body = data
+            path = f"/tasks/{self.task_id}{sub}"
+
+        for attempt in range(self.max_retries + 1):
+            wait = self._open_until - time.monotonic()
+            if wait > 0:
+                # Circuit open: don't hammer a backend that is down
+                if self._closing:
+                    break
+                time.sleep(min(wait, self.breaker_cooldown))
+
+            try:
+                resp = self._client.post(path, json=body)
+                if resp.status_code < 500 and resp.status_code != 429:
+                    # 2xx, or a 4xx that retrying won't fix
+                    self._failures = 0
+                    if resp.status_code >= 400:
+                        print(f"[reporter] {path} rejected: {resp.status_code} {resp.text[:200]}")
+                    return
+            except httpx.HTTPError:
+                pass
+
+            self._failures += 1
+            if self._failures >= self.breaker_threshold:
+                self._open_until = time.monotonic() + self.breaker_cooldown
+            if attempt < self.max_retries:
+                time.sleep(min(0.5 * (2 ** attempt), 5.0) * (0.5 + random.random()))
+
+        self.dropped += len(data) if kind == "logs" else 1
@@ -0,0 +1,209 @@
+# agent/steps.py
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+_local = threading.local()
+
+
+class StepCancelled(Exception):
+    """Raised inside a step when its graph is aborted (another step failed or the task was cancelled)."""
+
+
+class StepContext:
+    """Per-step state: the abort flag and the subprocesses the step has running."""
+
+    def __init__(self, name: str, aborted: threading.Event):
+        self.name = name
+        self.aborted = aborted
+        self._procs: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def check(self):
+        if self.aborted.is_set():
+            raise StepCancelled(self.name)
+
+    def track(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs.add(proc)
+        if self.aborted.is_set():
+            _kill(proc)
+
+    def untrack(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def kill(self):
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            _kill(proc)
+
+
+def _kill(proc: subprocess.Popen):
+    # Same as the control channel: the process runs in its own group
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+
+def current_step() -> StepContext | None:
+    """The step running on this thread, if any."""
+    return getattr(_local, "step", None)
+
+
+def interruptible(check, fn, *args, **kwargs):
+    """
+    Run a blocking call (e.g. an LLM request) in a daemon thread, calling
+    `check()` every 0.2s so a cancel stops the wait at once. The call itself
+    keeps running in the background until it returns, so long calls should
+    watch the same cancel themselves (llm_rewrite_file's `should_stop`).
+    """
+    result = {}
+
+    def target():
+        try:
+            result["value"] = fn(*args, **kwargs)
+        except BaseException as e:  # re-raised in the caller's thread
+            result["error"] = e
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    while t.is_alive():
+        t.join(0.2)
+        check()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+class Step:
+    def __init__(self, name: str, fn, needs: tuple[str, ...], phase: str | None):
+        self.name = name
+        self.fn = fn
+        self.needs = needs
+        self.phase = phase
+
+
+class StepGraph:
+    """
+    A small DAG of named steps run on a thread pool.
+
+    Each step is `fn(**inputs)`, where inputs are the results of the steps it
+    `needs` (by name); it starts as soon as those are done, so independent
+    steps (e.g. dependency install and the LLM call) overlap.
+
+    The first failure aborts the graph: steps not started yet are skipped,
+    running ones see StepCancelled at their next check and have their
+    subprocesses killed. `poll()` (the task-level cancel check) is called
+    while waiting. Per-step wall times end up in `timings`.
+    """
+
+    def __init__(self, max_workers: int = 4, poll=None, on_start=None, on_finish=None):
+        self.max_workers = max_workers
+        self.poll = poll
+        self.on_start = on_start      # on_start(step)
+        self.on_finish = on_finish    # on_finish(name, seconds, error)
+        self.steps: dict[str, Step] = {}
+        self.timings: dict[str, float] = {}
+        self._aborted = threading.Event()
+        self._running: dict[str, StepContext] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn, needs: tuple[str, ...] = (), phase: str | None = None):
+        if name in self.steps:
+            raise ValueError(f"duplicate step {name}")
+        self.steps[name] = Step(name, fn, tuple(needs), phase)
+
+    def _check_graph(self):
+        for step in self.steps.values():
+            for need in step.needs:
+                if need not in self.steps:
+                    raise ValueError(f"step {step.name} needs unknown step {need}")
+        # Kahn's algorithm: anything left over is on a cycle
+        remaining = {n: set(s.needs) for n, s in self.steps.items()}
+        while remaining:
+            ready = [n for n, needs in remaining.items() if not needs]
+            if not ready:
+                raise ValueError(f"dependency cycle among steps: {sorted(remaining)}")
+            for n in ready:
+                del remaining[n]
+            for needs in remaining.values():
+                needs.difference_update(ready)
+
+    def _execute(self, step: Step, inputs: dict):
+        ctx = StepContext(step.name, self._aborted)
+        with self._lock:
+            self._running[step.name] = ctx
+        _local.step = ctx
+        started = time.monotonic()
+        error = None
+        try:
+            ctx.check()
+            if self.on_start:
+                self.on_start(step)
+            return step.fn(**inputs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _local.step = None
+            self.timings[step.name] = time.monotonic() - started
+            with self._lock:
+                self._running.pop(step.name, None)
+            if self.on_finish:
+                self.on_finish(step.name, self.timings[step.name], error)
+
+    def _abort(self):
+        self._aborted.set()
+        with self._lock:
+            running = list(self._running.values())
+        for ctx in running:
+            ctx.kill()
+
+    def run(self) -> dict:
+        """Run every step; returns {name: result}. Re-raises the first failure."""
+        self._check_graph()
+        results: dict = {}
+        started: set[str] = set()
+        futures = {}
+        first_error: BaseException | None = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="jules-step") as pool:
+            while True:
+                if first_error is None:
+                    for step in self.steps.values():
+                        if step.name not in started and all(n in results for n in step.needs):
+                            started.add(step.name)
+                            inputs = {n: results[n] for n in step.needs}
+                            futures[pool.submit(self._execute, step, inputs)] = step.name
+                if not futures:
+                    break
+
+                done, _ = wait(list(futures), timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = futures.pop(fut)
+                    err = fut.exception()
+                    if err is None:
+                        results[name] = fut.result()
+                    elif first_error is None or isinstance(first_error, StepCancelled):
+                        first_error = err
+                        self._abort()
+
+                if first_error is None and self.poll:
+                    try:
+                        self.poll()
+                    except BaseException as e:
+                        first_error = e
+                        self._abort()
+
+        if first_error is not None:
+            raise first_error
+        return results
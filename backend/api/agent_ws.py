@@ -0,0 +1,218 @@
+# backend/api/agent_ws.py
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from backend.core.blocking import run_blocking
+from backend.core.config import settings
+from backend.core.db import SessionLocal
+from backend.api.workers import worker_token_ok
+from backend.models import Task
+from backend.services.task_log_service import append_log_line, append_log_batch
+from backend.services.task_queue import kick as kick_queue
+from backend.services.docker_supervisor import docker_supervisor
+
+router = APIRouter(prefix="/agents", tags=["agents"])
+
+# Statuses after which an agent has nothing left to do
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED")
+
+
+class AgentConnection:
+    """One connected agent (one per running task)."""
+
+    def __init__(self, task_id: int, websocket: WebSocket):
+        self.task_id = task_id
+        self.websocket = websocket
+        self.connected_at = time.time()
+        self.last_heartbeat = time.monotonic()
+        # Keep the original deadline if the agent reconnects mid-run
+        self.deadline = DEADLINES.setdefault(task_id, time.time() + settings.AGENT_TASK_TIMEOUT_SECONDS)
+        self.phase: str | None = None
+        # Latest progress frame for the current step (e.g. LLM tokens streamed so far)
+        self.progress: dict | None = None
+        self.send_lock = asyncio.Lock()
+
+    async def send(self, frame: dict):
+        async with self.send_lock:
+            await self.websocket.send_json(frame)
+
+
+# task_id -> live connection (in memory, single backend process for now)
+CONNECTIONS: dict[int, AgentConnection] = {}
+# task_id -> unix timestamp after which the agent is cancelled
+DEADLINES: dict[int, float] = {}
+
+
+# ----------------------------
+# Sync DB helpers (run via run_blocking so the event loop never blocks)
+# ----------------------------
+def _task_status(task_id: int) -> str | None:
+    db = SessionLocal()
+    try:
+        row = db.query(Task.status).filter(Task.id == task_id).first()
+        return row[0] if row else None
+    finally:
+        db.close()
+
+
+def _fail_task(task_id: int, reason: str):
+    db = SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task or task.status in TERMINAL_STATUSES:
+            return
+        task.status = "FAILED"
+        db.commit()
+        kick_queue()
+        append_log_line(db, task_id, f"[FAIL] {reason}", level="ERROR")
+    finally:
+        db.close()
+
+
+def _store_log(task_id: int, frame: dict):
+    db = SessionLocal()
+    try:
+        if frame.get("stream") and frame.get("lines"):
+            append_log_batch(db, task_id, frame["stream"], frame["lines"])
+        elif frame.get("message"):
+            append_log_line(db, task_id, frame["message"], frame.get("level") or "INFO")
+    finally:
+        db.close()
+
+
+# ----------------------------
+# Backend -> agent
+# ----------------------------
+async def send_cancel(task_id: int, reason: str = "cancelled by user") -> bool:
+    """Tell the agent for `task_id` to stop now. Returns False if it isn't connected."""
+    conn = CONNECTIONS.get(task_id)
+    if not conn:
+        return False
+    try:
+        await conn.send({"type": "cancel", "reason": reason})
+        return True
+    except Exception:
+        return False
+
+
+def connection_info(task_id: int) -> dict | None:
+    conn = CONNECTIONS.get(task_id)
+    if not conn:
+        return None
+    return {
+        "phase": conn.phase,
+        "progress": conn.progress,
+        "connected_at": conn.connected_at,
+        "deadline": conn.deadline,
+        "seconds_since_heartbeat": round(time.monotonic() - conn.last_heartbeat, 1),
+    }
+
+
+async def _watchdog(conn: AgentConnection):
+    """Fail the task if the agent goes quiet or runs past its deadline."""
+    while True:
+        await asyncio.sleep(5)
+        if time.time() > conn.deadline:
+            reason = f"deadline exceeded ({settings.AGENT_TASK_TIMEOUT_SECONDS}s)"
+            try:
+                await conn.send({"type": "cancel", "reason": reason})
+            except Exception:
+                pass
+            await run_blocking(_fail_task, conn.task_id, f"Agent timed out: {reason}")
+            DEADLINES.pop(conn.task_id, None)
+            await conn.websocket.close()
+            return
+        if time.monotonic() - conn.last_heartbeat > settings.AGENT_HEARTBEAT_TIMEOUT_SECONDS:
+            await run_blocking(_fail_task, conn.task_id, "Agent heartbeat lost")
+            await conn.websocket.close()
+            return
+
+
+@router.get("/containers")
+def supervised_containers():
+    """Agent containers the Docker supervisor is watching, with their latest CPU / memory samples."""
+    return docker_supervisor.stats()
+
+
+# ----------------------------
+# WebSocket endpoint
+# ----------------------------
+@router.websocket("/ws/{task_id}")
+async def agent_channel(websocket: WebSocket, task_id: int):
+    """
+    Persistent control channel for one agent run.
+
+    Agent -> backend frames:
+      {"type": "hello"} / {"type": "heartbeat"} / {"type": "done"}
+      {"type": "phase", "phase": "clone"}
+      {"type": "progress", "step": "llm", "tokens": 120, "chars": 480, "elapsed": 3.2}
+      {"type": "log", "message": "...", "level": "INFO"}
+      {"type": "log", "stream": "...", "lines": [{"seq": 1, "message": "..."}]}
+    Backend -> agent frames:
+      {"type": "deadline", "deadline": <unix ts>}
+      {"type": "cancel", "reason": "..."}
+
+    The agent authenticates with AGENT_WORKER_TOKEN in X-Worker-Token; anything
+    else is closed before it can replace (or even see) the task's live connection.
+    """
+    if not worker_token_ok(websocket.headers.get("x-worker-token")):
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+
+    status = await run_blocking(_task_status, task_id)
+    if status is None:
+        await websocket.close(code=4404)
+        return
+
+    conn = AgentConnection(task_id, websocket)
+    old = CONNECTIONS.get(task_id)
+    CONNECTIONS[task_id] = conn
+    if old:
+        # A reconnecting agent replaces its previous (dead) socket
+        try:
+            await old.websocket.close()
+        except Exception:
+            pass
+
+    watchdog = asyncio.create_task(_watchdog(conn))
+    try:
+        await conn.send({"type": "deadline", "deadline": conn.deadline})
+        if status == "CANCELLED":
+            # Cancel arrived before the agent connected
+            await conn.send({"type": "cancel", "reason": "task was cancelled"})
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            text = message.get("text") or (message.get("bytes") or b"").decode("utf-8", "replace")
+            conn.last_heartbeat = time.monotonic()
+            # One bad frame (or a DB hiccup storing it) must not end the channel:
+            # it's also how cancels reach the agent
+            try:
+                frame = json.loads(text)
+                kind = frame.get("type")
+
+                if kind == "phase":
+                    conn.phase = frame.get("phase")
+                    conn.progress = None
+                elif kind == "progress":
+                    conn.progress = {k: frame.get(k) for k in ("step", "tokens", "chars", "elapsed")}
+                elif kind == "done":
+                    # Run finished normally; the next run (e.g. push) gets a fresh deadline
+                    DEADLINES.pop(task_id, None)
+                elif kind == "log":
+                    await run_blocking(_store_log, task_id, frame)
+                # hello / heartbeat only refresh last_heartbeat
+            except Exception as e:
+                print(f"[agent-ws] task {task_id}: dropped frame ({e!r}): {text[:200]}")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watchdog.cancel()
+        if CONNECTIONS.get(task_id) is conn:
+            del CONNECTIONS[task_id]
@@ -6,9 +6,13 @@ import urllib.parse
 from fastapi import APIRouter, Request, HTTPException, Response
 from fastapi.responses import RedirectResponse
 
+from backend.core.blocking import run_blocking
 from backend.core.config import settings
 from backend.core.db import SessionLocal
 from backend.models import User, GitHubToken
+from backend.github_client import get_http_client
+from backend.services.github_list_index import invalidate_user
+from backend.services.github_token_service import cache_token, invalidate_token
 
 router = APIRouter(prefix="/auth/github", tags=["auth"])
 
@@ -40,6 +44,8 @@ def get_or_create_user_from_github(db, github_user_data: dict) -> User:
 
 def store_github_token(db, user: User, access_token: str, token_type: str | None, scope: str | None):
     # For simplicity, we keep only one token per user.
+    # Drop the cached one first, so a failed store can't leave the old token cached
+    invalidate_token(user.id)
     existing = db.query(GitHubToken).filter(GitHubToken.user_id == user.id).first()
     if existing:
         existing.access_token = access_token
@@ -55,6 +61,8 @@ def store_github_token(db, user: User, access_token: str, token_type: str | None
         db.add(token)
 
     db.commit()
+    # Write-through so the next request sees the new token without a DB read
+    cache_token(user.id, access_token)
 
 
 @router.get("/login")
@@ -97,10 +105,10 @@ async def github_callback(request: Request, code: str = None, state: str = None)
         "state": state,
     }
 
-    async with httpx.AsyncClient(headers={"Accept": "application/json"}) as client:
-        token_resp = await client.post(token_url, data=data)
-        token_resp.raise_for_status()
-        token_data = token_resp.json()
+    client = get_http_client()
+    token_resp = await client.post(token_url, data=data, headers={"Accept": "application/json"})
+    token_resp.raise_for_status()
+    token_data = token_resp.json()
 
     access_token = token_data.get("access_token")
     token_type = token_data.get("token_type")
@@ -110,23 +118,30 @@ async def github_callback(request: Request, code: str = None, state: str = None)
         raise HTTPException(status_code=400, detail="Failed to get access token")
 
     # 3. Use access_token to fetch user info from GitHub API
-    async with httpx.AsyncClient(
+    user_resp = await client.get(
+        "https://api.github.com/user",
         headers={
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/vnd.github+json",
-        }
-    ) as client:
-        user_resp = await client.get("https://api.github.com/user")
-        user_resp.raise_for_status()
-        github_user_data = user_resp.json()
-
-    # 4. Store user + token in DB
-    db = SessionLocal()
-    try:
-        user = get_or_create_user_from_github(db, github_user_data)
-        store_github_token(db, user, access_token, token_type, scope)
-    finally:
-        db.close()
+        },
+    )
+    user_resp.raise_for_status()
+    github_user_data = user_resp.json()
+
+    # 4. Store user + token in DB (sync session, so off the event loop)
+    def save_user_and_token():
+        db = SessionLocal()
+        try:
+            user = get_or_create_user_from_github(db, github_user_data)
+            store_github_token(db, user, access_token, token_type, scope)
+            return user
+        finally:
+            db.close()
+
+    user = await run_blocking(save_user_and_token)
+
+    # A new token may see different repos; rebuild the listing indexes on next use
+    invalidate_user(user.id)
 
     # 5. Return simple message (no token in response now)
     response = RedirectResponse(url="/", status_code=302)
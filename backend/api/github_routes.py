@@ -1,43 +1,86 @@
 # backend/api/github_routes.py
-from fastapi import APIRouter, HTTPException
-from backend.github_client import GitHubClient
-from backend.services.github_token_service import get_token_for_user
+from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.core.db import get_async_db
+from backend.github_client import GitHubClient, github_cache
+from backend.github_ratelimit import github_scheduler
+from backend.services.github_token_service import get_token_for_user, get_token_for_user_async
+from backend.services.github_list_index import get_index
 
 router = APIRouter(prefix="/github", tags=["github"])
 
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the GitHub conditional-request cache."""
+    return github_cache.stats()
+
+
+@router.get("/rate-limit")
+def rate_limit():
+    """Quota state the scheduler knows for the user's token (from GitHub response headers)."""
+    user_id = 1  # TODO: real session user later
+
+    token = get_token_for_user(user_id)
+    if not token:
+        raise HTTPException(status_code=400, detail="No GitHub token found for user")
+
+    return github_scheduler.state(GitHubClient(token).token_key)
+
+
 @router.get("/repos")
-async def list_repos():
+async def list_repos(
+    q: str | None = Query(default=None, description="Prefix/substring filter on owner/repo or repo"),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
     user_id = 1  # TODO: replace with real session user later
 
-    token = get_token_for_user(user_id)
+    token = await get_token_for_user_async(user_id, db)
     if not token:
         raise HTTPException(status_code=400, detail="No GitHub token found for user")
 
-    client = GitHubClient(token)
-    repos = await client.get_repos()
+    # Picker/refresh reads: first to be slowed down when the quota runs low
+    client = GitHubClient(token, priority="low")
 
-    # Simplify response
-    simplified = [
-        {
-            "full_name": r["full_name"],
-            "private": r["private"],
-            "default_branch": r["default_branch"],
-        }
-        for r in repos
-    ]
+    async def load():
+        repos = await client.get_repos()
+        # Simplify response
+        return [
+            {
+                "full_name": r["full_name"],
+                "private": r["private"],
+                "default_branch": r["default_branch"],
+            }
+            for r in repos
+        ]
 
-    return simplified
+    index = await get_index(
+        (user_id, "repos", None),
+        load,
+        lambda r: (r["full_name"], r["full_name"].split("/", 1)[-1]),
+    )
+    return index.search(q, limit)
 
 
 @router.get("/repos/{owner}/{repo}/branches")
-async def list_branches(owner: str, repo: str):
+async def list_branches(
+    owner: str,
+    repo: str,
+    q: str | None = Query(default=None, description="Prefix/substring filter on branch name"),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
     user_id = 1  # TODO: real session user later
 
-    token = get_token_for_user(user_id)
+    token = await get_token_for_user_async(user_id, db)
     if not token:
         raise HTTPException(status_code=400, detail="No GitHub token found for user")
 
-    client = GitHubClient(token)
-    branches = await client.get_branches(owner, repo)
+    client = GitHubClient(token, priority="low")
+
+    async def load():
+        branches = await client.get_branches(owner, repo)
+        return [b["name"] for b in branches]
 
-    return [b["name"] for b in branches]
+    index = await get_index((user_id, "branches", f"{owner}/{repo}"), load, lambda name: (name,))
+    return index.search(q, limit)
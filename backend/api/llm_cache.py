@@ -0,0 +1,37 @@
+# backend/api/llm_cache.py
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+
+from backend.api.workers import check_worker_token
+from backend.services.llm_cache import llm_cache
+
+router = APIRouter(prefix="/llm-cache", tags=["llm-cache"])
+
+
+class LLMCacheEntryIn(BaseModel):
+    model: str
+    output: str
+
+
+@router.get("/stats")
+def llm_cache_stats():
+    return llm_cache.stats()
+
+
+@router.get("/{key}")
+def get_llm_cache_entry(key: str):
+    """Cached output for a key computed with llm_cache_key(); 404 on a miss."""
+    output = llm_cache.get(key)
+    if output is None:
+        raise HTTPException(status_code=404, detail="Not cached")
+    return {"key": key, "output": output}
+
+
+@router.put("/{key}")
+def put_llm_cache_entry(key: str, payload: LLMCacheEntryIn, x_worker_token: str | None = Header(default=None)):
+    # Agents write cached output straight into repos, so only agents may fill it
+    check_worker_token(x_worker_token)
+    if len(key) != 64:
+        raise HTTPException(status_code=400, detail="Key must be a sha256 hex digest")
+    llm_cache.put(key, payload.model, payload.output)
+    return {"ok": True, "key": key}
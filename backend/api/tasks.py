@@ -1,13 +1,41 @@
 # backend/api/tasks.py
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
 from backend.models.user import User
-from backend.services.orchestrator import start_task_container
-from backend.core.db import get_db
-from backend.models import Task
-from backend.services.github_token_service import get_token_for_user
+from backend.services.task_queue import enqueue, kick as kick_queue, queue_position
+from backend.api.agent_ws import send_cancel, connection_info, TERMINAL_STATUSES
+from backend.core.config import settings
+from backend.core.db import get_db, get_async_db
+from backend.models import Task, AgentRun
+from backend.services.docker_supervisor import docker_supervisor
+from backend.services.github_token_service import get_token_for_user, get_token_for_user_async
+from backend.services.task_log_service import (
+    append_log_line,
+    append_log_line_async,
+    append_log_batch,
+    read_log_lines,
+    last_log_seq,
+    full_log_text,
+    full_log_text_with_seq,
+)
+from backend.services.diff_store import store_diff, get_diff_blob, load_diff_text, load_diff_text_async
+from backend.services.git_data_push import push_diff
+from backend.services.plan_jobs import start_plan_job, inflight_job, get_job as get_plan_job
 from backend.github_client import GitHubClient
+from backend.github_ratelimit import GitHubRateLimited
 from pydantic import BaseModel
 import httpx
 from backend.models.github_token import GitHubToken
@@ -29,6 +57,16 @@ class PlanOut(BaseModel):
 
 class TaskLogAppend(BaseModel):
     message: str
+    level: str = "INFO"
+
+class TaskLogBatchLine(BaseModel):
+    seq: int              # writer-assigned, used to drop duplicates on retry
+    message: str
+    level: str = "INFO"
+
+class TaskLogBatch(BaseModel):
+    stream: str           # writer id (e.g. one per agent run)
+    lines: list[TaskLogBatchLine]
 
 class TaskResponse(BaseModel):
     id: int
@@ -39,6 +77,7 @@ class TaskResponse(BaseModel):
     status: str
 
     target_file: str | None = None
+    target_files: list[str] | None = None
     work_branch: str | None = None
     pr_url: str | None = None
     pr_number: int | None = None
@@ -50,8 +89,28 @@ class TaskResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TaskSummary(BaseModel):
+    """Lean row for task listings (no plan/diff/log blobs)."""
+    id: int
+    repo_full_name: str
+    branch: str
+    status: str
+    target_file: str | None = None
+    target_files: list[str] | None = None
+    work_branch: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class TaskPage(BaseModel):
+    items: list[TaskSummary]
+    next_cursor: str | None = None
+
 class TaskSetTarget(BaseModel):
-    target_file: str      # e.g. "package.json"
+    target_file: str | None = None        # e.g. "package.json"
+    target_files: list[str] | None = None  # several files edited in one run
 
 class TaskDiffIn(BaseModel):
     diff: str
@@ -66,12 +125,30 @@ class WorkBranchIn(BaseModel):
 class StatusIn(BaseModel):
     status: str
 
-class PlanOut(BaseModel):
-    plan: str
+class PlanJobOut(BaseModel):
+    job_id: str
+    task_id: int
+    status: str               # PENDING / RUNNING / SUCCEEDED / FAILED / CANCELLED
+    error: str | None = None
+    cached: bool = False      # plan served from the LLM response cache
+    created_at: float
+    finished_at: float | None = None
+    coalesced: bool | None = None
 
 class PlanIn(BaseModel):
     force: bool = False
 
+class StartIn(BaseModel):
+    priority: int = 0     # higher is dispatched first within the execute queue
+
+class CancelIn(BaseModel):
+    reason: str | None = None
+
+def _ensure_not_terminal(task: Task):
+    # An agent finishing right after a cancel must not overwrite CANCELLED (or any other end state)
+    if task.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task already {task.status}")
+
 # ----- Routes -----
 
 # Note: LLM-powered plan generation implemented further down (single /plan endpoint).
@@ -82,8 +159,11 @@ def set_status(task_id: int, payload: StatusIn, db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_not_terminal(task)
     task.status = payload.status
     db.commit()
+    # The agent reporting READY_FOR_REVIEW / PUSHED frees its queue slot
+    kick_queue()
     return {"ok": True, "status": task.status}
 
 
@@ -116,13 +196,63 @@ def approve_task(task_id: int, db: Session = Depends(get_db)):
     return {"ok": True, "status": task.status}
 
 
+def _encode_cursor(created_at: datetime, task_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{task_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, task_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("", response_model=TaskPage)
+def list_tasks(
+    status: str | None = None,
+    repo: str | None = Query(default=None, description="owner/repo"),
+    before: str | None = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """List the user's tasks, newest first.
+
+    Uses keyset pagination on (created_at, id): each page seeks straight to the
+    cursor through the (user_id, created_at, id) index, so page 1000 costs the
+    same as page 1.
+    """
+    user_id = 1
+
+    cols = [getattr(Task, f) for f in TaskSummary.model_fields]
+    q = db.query(Task).options(load_only(*cols)).filter(Task.user_id == user_id)
+    if status:
+        q = q.filter(Task.status == status)
+    if repo:
+        q = q.filter(Task.repo_full_name == repo)
+    if before:
+        created_at, task_id = _decode_cursor(before)
+        q = q.filter(tuple_(Task.created_at, Task.id) < tuple_(created_at, task_id))
+
+    # Fetch one extra row to know whether there is a next page
+    rows = q.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = _encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+
+    # target_files from Task.targets, so old single-file rows list their target_file too
+    items = [TaskSummary.model_validate(t).model_copy(update={"target_files": t.targets}) for t in items]
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.post("", response_model=TaskResponse)
-async def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
+async def create_task(payload: TaskCreate, db: AsyncSession = Depends(get_async_db)):
     # TODO: replace hard-coded user with real auth later
     user_id = 1
 
     # 1. Get user's GitHub token
-    token = get_token_for_user(user_id)
+    token = await get_token_for_user_async(user_id, db)
     if not token:
         raise HTTPException(status_code=400, detail="No GitHub token found for user")
 
@@ -135,7 +265,10 @@ async def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
     # 3. Validate branch & get base commit SHA from GitHub
     client = GitHubClient(token)
     try:
-        branch_data = await client.get_branch(owner, repo, payload.branch)
+        # Fresh: this becomes base_commit_sha, which API pushes apply diffs on top of
+        branch_data = await client.get_branch(owner, repo, payload.branch, fresh=True)
+    except GitHubRateLimited:
+        raise
     except Exception as e:
         # You can log e here
         raise HTTPException(status_code=400, detail="Invalid repo or branch") from e
@@ -153,22 +286,87 @@ async def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
     )
 
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
+
+    # Built explicitly: the deferred blob columns can't lazy-load on an AsyncSession,
+    # and a new task has none yet anyway
+    return TaskResponse(
+        id=task.id,
+        repo_full_name=task.repo_full_name,
+        branch=task.branch,
+        base_commit_sha=task.base_commit_sha,
+        prompt=task.prompt,
+        status=task.status,
+    )
 
-    return task
+
+def _task_etag(task_id: int, updated_at, fields: list[str], log_seq: int) -> str:
+    raw = f"{task_id}:{updated_at.isoformat()}:{','.join(fields)}:{log_seq}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
-def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
+def get_task(
+    task_id: int,
+    request: Request,
+    fields: str | None = Query(default=None, description="Comma-separated TaskResponse fields, e.g. status,work_branch"),
+    db: Session = Depends(get_db),
+):
+    """Return a task. `?fields=` limits the response (and the columns read) to those fields.
+
+    Responses carry an ETag built from `updated_at`; send it back as
+    If-None-Match to get a 304 when nothing changed.
+    """
+    all_fields = list(TaskResponse.model_fields)
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in all_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        if "id" not in wanted:
+            wanted.insert(0, "id")
+    else:
+        wanted = all_fields
+
+    # Cheap header read first: an unchanged task never touches the big columns
+    head = db.query(Task.id, Task.updated_at).filter(Task.id == task_id).first()
+    if not head:
         raise HTTPException(status_code=404, detail="Task not found")
-    return task
+
+    # Log lines live in their own table, so they don't bump updated_at
+    log_seq = last_log_seq(db, task_id) if "log_text" in wanted else 0
+    etag = _task_etag(task_id, head.updated_at, wanted, log_seq)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    # log_text is assembled from task_log_lines and diff_text from diff_blobs
+    # (plus any legacy text left in the columns)
+    columns = [getattr(Task, f) for f in dict.fromkeys(wanted)]
+    if "diff_text" in wanted:
+        columns.append(Task.diff_sha)
+    if "target_files" in wanted:
+        columns.append(Task.target_file)  # Task.targets falls back to it
+    task = db.query(Task).options(load_only(*columns)).filter(Task.id == task_id).first()
+
+    data = {f: getattr(task, f) for f in wanted if f not in ("log_text", "diff_text")}
+    if "target_files" in wanted:
+        data["target_files"] = task.targets
+    if "log_text" in wanted:
+        data["log_text"] = full_log_text(db, task)
+    if "diff_text" in wanted:
+        data["diff_text"] = load_diff_text(db, task)
+    if not fields:
+        data = TaskResponse(**data).model_dump()
+
+    return JSONResponse(content=jsonable_encoder(data), headers=headers)
 
 
 @router.post("/{task_id}/start")
-def start_task(task_id: int, db: Session = Depends(get_db)):
+def start_task(task_id: int, payload: StartIn | None = None, db: Session = Depends(get_db)):
     user_id = 1  # dev for now
 
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
@@ -186,11 +384,8 @@ def start_task(task_id: int, db: Session = Depends(get_db)):
     if not user.github_login:
         raise HTTPException(status_code=400, detail="GitHub token not found for user")
 
-    task.status = "RUNNING"
-    db.commit()
-
-    # ✅ pass user now
-    start_task_container(task, user)
+    # Waits in QUEUED_FOR_EXECUTION until the dispatcher has a free slot (pushes: QUEUED_FOR_PUSH)
+    enqueue(db, task, "execute", priority=payload.priority if payload else 0)
 
     return task
 
@@ -199,26 +394,57 @@ def start_task(task_id: int, db: Session = Depends(get_db)):
 def append_log(task_id: int, payload: TaskLogAppend, db: Session = Depends(get_db)):
     user_id = 1  # TODO real auth later
 
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-    if not task:
+    # Only check the task exists; don't load (or rewrite) any big columns
+    exists = db.query(Task.id).filter(Task.id == task_id, Task.user_id == user_id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    if task.log_text is None:
-        task.log_text = ""
+    seq = append_log_line(db, task_id, payload.message, payload.level)
+    return {"ok": True, "seq": seq}
 
-    task.log_text += payload.message + "\n"
-    db.commit()
-    return {"ok": True}
+@router.post("/{task_id}/logs:batch")
+def append_log_batch_route(task_id: int, payload: TaskLogBatch, db: Session = Depends(get_db)):
+    """Bulk log ingestion for the agent's background reporter."""
+    user_id = 1  # TODO real auth later
+
+    exists = db.query(Task.id).filter(Task.id == task_id, Task.user_id == user_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    result = append_log_batch(db, task_id, payload.stream, [l.model_dump() for l in payload.lines])
+    return {"ok": True, **result}
 
 @router.get("/{task_id}/logs")
-def get_logs(task_id: int, db: Session = Depends(get_db)):
+def get_logs(
+    task_id: int,
+    after_seq: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """Without `after_seq`, return the whole log as text (old behaviour).
+
+    With `after_seq`, return only the lines after that cursor so clients can tail
+    the log cheaply. Pass the returned `next_seq` as `after_seq` on the next call.
+    """
     user_id = 1
 
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return {"task_id": task.id, "logs": task.log_text or ""}
+    if after_seq is None:
+        logs, next_seq = full_log_text_with_seq(db, task)
+        return {"task_id": task.id, "logs": logs, "next_seq": next_seq}
+
+    lines = read_log_lines(db, task.id, after_seq=after_seq, limit=limit)
+    return {
+        "task_id": task.id,
+        "lines": [
+            {"seq": l.seq, "ts": l.ts.isoformat(), "level": l.level, "message": l.message}
+            for l in lines
+        ],
+        "next_seq": lines[-1].seq if lines else after_seq,
+    }
 
 
 @router.post("/{task_id}/complete")
@@ -227,12 +453,64 @@ def complete_task(task_id: int, db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_not_terminal(task)
 
     task.status = "COMPLETED"
     db.commit()
+    kick_queue()
     return {"ok": True, "status": task.status}
 
 
+@router.post("/{task_id}/cancel")
+async def cancel_task(task_id: int, payload: CancelIn | None = None, db: AsyncSession = Depends(get_async_db)):
+    """Stop a task now. A connected agent kills its running subprocess immediately."""
+    user_id = 1
+    task = (await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user_id))).scalar_one_or_none()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if task.status in ("COMPLETED", "FAILED", "CANCELLED"):
+        raise HTTPException(status_code=400, detail=f"Cannot cancel task in status {task.status}")
+
+    reason = (payload.reason if payload else None) or "cancelled by user"
+    task.status = "CANCELLED"
+    await db.commit()
+    kick_queue()
+    await append_log_line_async(db, task.id, f"[CANCEL] {reason}", level="WARN")
+
+    # If the agent hasn't connected yet it gets the cancel when it does
+    notified = await send_cancel(task.id, reason)
+    return {"ok": True, "status": task.status, "agent_notified": notified}
+
+
+@router.get("/{task_id}/queue")
+def get_queue_state(task_id: int, db: Session = Depends(get_db)):
+    """Queue entry for the task's latest agent job (state, class, priority, position while queued)."""
+    state = queue_position(db, task_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Task has no queued jobs")
+    return state
+
+
+@router.get("/{task_id}/runs")
+def get_agent_runs(task_id: int, db: Session = Depends(get_db)):
+    """Agent container runs for the task: exit codes, limits and sampled CPU / memory usage."""
+    runs = db.query(AgentRun).filter(AgentRun.task_id == task_id).order_by(AgentRun.id).all()
+    return {
+        "runs": [
+            {c.name: getattr(r, c.name) for c in AgentRun.__table__.columns}
+            for r in runs
+        ],
+        "live": docker_supervisor.live_usage(task_id),
+    }
+
+
+@router.get("/{task_id}/agent")
+def get_agent_state(task_id: int):
+    """Live control-channel info (phase, heartbeat age, deadline) for a running task."""
+    return {"task_id": task_id, "agent": connection_info(task_id)}
+
+
 class TaskFail(BaseModel):
     reason: str | None = None
 
@@ -242,13 +520,13 @@ def fail_task(task_id: int, payload: TaskFail, db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_not_terminal(task)
 
     task.status = "FAILED"
-    if payload.reason:
-        if task.log_text is None:
-            task.log_text = ""
-        task.log_text += f"[FAIL] {payload.reason}\n"
     db.commit()
+    kick_queue()
+    if payload.reason:
+        append_log_line(db, task.id, f"[FAIL] {payload.reason}", level="ERROR")
     return {"ok": True, "status": task.status}
 
 @router.post("/{task_id}/target")
@@ -258,9 +536,18 @@ def set_target_file(task_id: int, payload: TaskSetTarget, db: Session = Depends(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task.target_file = payload.target_file
+    paths = payload.target_files if payload.target_files is not None else [payload.target_file or ""]
+    # Same file twice would be rewritten twice
+    paths = list(dict.fromkeys(p.strip().replace("\\", "/") for p in paths if p and p.strip()))
+    if not paths:
+        raise HTTPException(status_code=400, detail="target_file or target_files is required")
+    if len(paths) > settings.TASK_MAX_TARGET_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.TASK_MAX_TARGET_FILES} target files per task")
+
+    task.target_file = paths[0]
+    task.target_files = paths
     db.commit()
-    return {"ok": True, "task_id": task.id, "target_file": task.target_file}
+    return {"ok": True, "task_id": task.id, "target_file": task.target_file, "target_files": task.target_files}
 
 
 @router.post("/{task_id}/diff")
@@ -270,17 +557,122 @@ def save_diff(task_id: int, payload: TaskDiffIn, db: Session = Depends(get_db)):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task.diff_text = payload.diff
+    # Stored compressed and once per distinct content; the task only keeps the hash
+    task.diff_sha = store_diff(db, payload.diff)
+    task.diff_text = ""
     db.commit()
-    return {"ok": True}
+    return {"ok": True, "sha256": task.diff_sha}
 
 @router.get("/{task_id}/diff")
 def get_diff(task_id: int, db: Session = Depends(get_db)):
+    """JSON-wrapped diff (kept for older clients; prefer /diff.patch)."""
+    user_id = 1
+    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"task_id": task.id, "diff": load_diff_text(db, task)}
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_PATCH_CHUNK = 64 * 1024
+
+
+def _iter_chunks(data: bytes):
+    for i in range(0, len(data), _PATCH_CHUNK):
+        yield data[i:i + _PATCH_CHUNK]
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Accept-Encoding allows gzip: listed (or matched by `*`) with a q-value above 0."""
+    qvalues = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    # An explicit gzip (or its x-gzip alias) wins over the wildcard
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+
+@router.get("/{task_id}/diff.patch")
+def download_diff(task_id: int, request: Request, db: Session = Depends(get_db)):
+    """Stream the raw patch as text/x-diff.
+
+    - Clients that accept gzip get the stored gzip bytes as-is (no recompression).
+    - `Range: bytes=a-b` is served against the uncompressed patch (206).
+    - The ETag is the content hash, so If-None-Match gives a 304.
+    """
     user_id = 1
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"task_id": task.id, "diff": task.diff_text or ""}
+
+    blob = get_diff_blob(db, task)
+    if blob:
+        etag = f'"{blob.sha256}"'
+        gz_data = blob.gzip_data
+        raw_size = blob.size
+    else:
+        # Legacy inline diff (or no diff at all)
+        raw = (task.diff_text or "").encode("utf-8")
+        etag = '"' + hashlib.sha256(raw).hexdigest() + '"'
+        gz_data = None
+        raw_size = len(raw)
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f'inline; filename="task-{task.id}.patch"',
+        "Vary": "Accept-Encoding",
+    }
+    media_type = "text/x-diff; charset=utf-8"
+
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    accepts_gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+
+    if gz_data is not None and accepts_gzip and not range_header:
+        headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(gz_data))
+        return StreamingResponse(_iter_chunks(gz_data), media_type=media_type, headers=headers)
+
+    raw = gzip.decompress(gz_data) if gz_data is not None else (task.diff_text or "").encode("utf-8")
+
+    if range_header:
+        m = _RANGE_RE.match(range_header.strip())
+        if not m or (not m.group(1) and not m.group(2)):
+            raise HTTPException(status_code=416, detail="Invalid Range", headers={"Content-Range": f"bytes */{raw_size}"})
+        if m.group(1):
+            start = int(m.group(1))
+            end = int(m.group(2)) if m.group(2) else raw_size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(raw_size - int(m.group(2)), 0)
+            end = raw_size - 1
+        end = min(end, raw_size - 1)
+        if start > end:
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{raw_size}"})
+
+        headers["Content-Range"] = f"bytes {start}-{end}/{raw_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_iter_chunks(raw[start:end + 1]), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(raw_size)
+    return StreamingResponse(_iter_chunks(raw), media_type=media_type, headers=headers)
 
 
 @router.post("/{task_id}/publish")
@@ -294,118 +686,80 @@ async def publish_task(task_id: int, payload: PublishIn | None = None, db: Sessi
 
 
 
-@router.post("/{task_id}/plan", response_model=PlanOut)
-async def generate_plan(task_id: int, payload: PlanIn | None = None, db: Session = Depends(get_db)):
-    """Generate a plan using an LLM. If `payload.force` is True, re-generate the plan even if not in a planning-ready state."""
-    import os
-    import openai
+@router.post("/{task_id}/plan", status_code=202, response_model=PlanJobOut)
+async def generate_plan(task_id: int, payload: PlanIn | None = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    Start LLM plan generation in the background and return the job right away (202).
 
+    The task sits in PLANNING until the job finishes (PLAN_READY on success, the
+    previous status on failure). Follow it with GET /plan/jobs/{job_id} or the
+    /events stream. Repeated requests for the same task, prompt and target file
+    while a job is running join that job instead of calling the LLM again.
+    """
     user_id = 1
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
+    task = (await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user_id))).scalar_one_or_none()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    allow = task.status in ("QUEUED", "PLAN_READY") or (payload and payload.force)
-    if not allow:
-        raise HTTPException(status_code=400, detail=f"Cannot plan task in status {task.status}")
-
     # Ensure we have a target file (we can still allow auto-detect in the future)
-    if not task.target_file:
+    if not task.targets:
         raise HTTPException(status_code=400, detail="Target file not set")
 
-    # Fetch target file contents from GitHub (if possible)
-    file_content = None
-    try:
-        owner, repo = task.repo_full_name.split("/", 1)
-        token = get_token_for_user(user_id)
-        if token:
-            gh = GitHubClient(token)
-            try:
-                file_content = await gh.get_file(owner, repo, task.target_file, ref=task.branch)
-            except Exception:
-                file_content = None
-    except Exception:
-        file_content = None
+    running = inflight_job(task.id, task.prompt, ", ".join(task.targets))
+    if running is not None:
+        return {**running.to_dict(), "coalesced": True}
+
+    # PLANNING without a running job means the previous job died with the process
+    allow = task.status in ("QUEUED", "PLAN_READY", "PLANNING") or (payload and payload.force)
+    if not allow:
+        raise HTTPException(status_code=400, detail=f"Cannot plan task in status {task.status}")
 
-    # Call OpenAI to generate a structured plan
     openai_key = os.getenv("OPENAI_API_KEY")
     if not openai_key:
         raise HTTPException(status_code=500, detail="OpenAI API key not configured (OPENAI_API_KEY)")
-    openai.api_key = openai_key
 
-    system_prompt = (
-        "You are an assistant that writes concise, step-by-step implementation plans to modify a file in a repository. "
-        "Produce a clear numbered plan (1., 2., 3., ...). If file contents are provided, inspect them and highlight risky changes. "
-        "Keep the plan actionable and small — 5-12 steps."
+    previous_status = task.status if task.status != "PLANNING" else "QUEUED"
+    prompt, target_file = task.prompt, ", ".join(task.targets)
+    task.status = "PLANNING"
+    await db.commit()
+
+    job, coalesced = start_plan_job(
+        task_id, prompt, target_file, previous_status, user_id, openai_key, force=bool(payload and payload.force)
     )
+    return {**job.to_dict(), "coalesced": coalesced}
 
-    user_lines = [
-        f"Repo: {task.repo_full_name}",
-        f"Base branch: {task.branch}",
-        f"Target file: {task.target_file}",
-        "",
-        f"User prompt: {task.prompt}",
-    ]
-    if file_content:
-        # Truncate if very large
-        txt = file_content if len(file_content) < 10000 else file_content[:10000] + "\n... [truncated]"
-        user_lines += ["", "File content:", txt]
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": "\n".join(user_lines)},
-    ]
-
-    model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-
-    # Support both new (>1.0.0) OpenAI python client and the older interface
-    plan_text = None
-    last_err = None
-    try:
-        # New client: `from openai import OpenAI; client = OpenAI()`
-        from openai import OpenAI as OpenAIClient
-        client = OpenAIClient(api_key=openai_key)
-        resp = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=600,
-            temperature=0.2,
-        )
-        # Try a few ways to extract the assistant content
-        try:
-            plan_text = resp.choices[0].message.content
-        except Exception:
-            try:
-                plan_text = resp.choices[0]["message"]["content"]
-            except Exception:
-                plan_text = None
-    except Exception as e:
-        last_err = e
 
-    if not plan_text:
-        try:
-            # Fallback to older openai lib usage
-            import openai as old_openai
-            old_openai.api_key = openai_key
-            resp = old_openai.ChatCompletion.create(
-                model=model,
-                messages=messages,
-                max_tokens=600,
-                temperature=0.2,
-            )
-            plan_text = resp["choices"][0]["message"]["content"].strip()
-        except Exception as e:
-            # Prefer the newer exception if present, otherwise the fallback's
-            detail = f"LLM request failed: {last_err or e}"
-            raise HTTPException(status_code=500, detail=detail) from (last_err or e)
-
-    # Save plan and mark ready for approval
-    task.plan_text = plan_text
-    task.plan_generated_by = f"openai:{model}"
-    task.status = "PLAN_READY"
-    db.commit()
+def _plan_job_or_404(task_id: int, job_id: str):
+    job = get_plan_job(job_id)
+    if not job or job.task_id != task_id:
+        raise HTTPException(status_code=404, detail="Plan job not found")
+    return job
+
+
+@router.get("/{task_id}/plan/jobs/{job_id}", response_model=PlanJobOut)
+def get_plan_job_state(task_id: int, job_id: str):
+    return _plan_job_or_404(task_id, job_id).to_dict()
+
 
-    return {"plan": plan_text}
+@router.get("/{task_id}/plan/jobs/{job_id}/events")
+async def plan_job_events(task_id: int, job_id: str):
+    """Server-sent events: the job state now, a keepalive every 15s, and the final state."""
+    job = _plan_job_or_404(task_id, job_id)
+
+    async def events():
+        yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+        while not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+        yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("/{task_id}/plan/approve")
 def approve_plan(task_id: int, db: Session = Depends(get_db)):
@@ -423,9 +777,17 @@ def approve_plan(task_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{task_id}/push")
-def push_task_branch(task_id: int, db: Session = Depends(get_db)):
+async def push_task_branch(task_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Publish the task's diff on its work branch.
+
+    Normally done right here through the GitHub Git Data API (blob, tree,
+    commit, ref), which takes a few API calls and no container. Diffs the
+    backend can't apply (binary, renames, context that no longer matches...)
+    or API errors fall back to a queued push container.
+    """
     user_id = 1
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
+    task = (await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user_id))).scalar_one_or_none()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -435,16 +797,47 @@ def push_task_branch(task_id: int, db: Session = Depends(get_db)):
     if not task.work_branch:
         raise HTTPException(status_code=400, detail="work_branch not set yet (agent didn’t create it)")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    token = get_token_for_user(user_id)
+    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    token = await get_token_for_user_async(user_id, db)
     if not user or not token:
         raise HTTPException(status_code=401, detail="GitHub token missing")
 
-    # Mark status first
-    task.status = "PUSHING"
-    db.commit()
+    if settings.GITHUB_API_PUSH and task.base_commit_sha:
+        task.status = "PUSHING"
+        await db.commit()
+        try:
+            diff_text = await load_diff_text_async(db, task)
+            result = await push_diff(
+                GitHubClient(token),
+                task.repo_full_name,
+                task.base_commit_sha,
+                task.work_branch,
+                diff_text,
+                f"Jules: Task {task.id} (apply diff)",
+            )
+        except GitHubRateLimited:
+            task.status = "READY_FOR_REVIEW"
+            await db.commit()
+            raise
+        except Exception as e:
+            # Anything else (unapplicable diff, API errors, timeouts, surprises in
+            # a response) falls back to the container rather than leaving the task PUSHING
+            await db.rollback()  # in case it was the DB that failed
+            await db.refresh(task)
+            reason = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else (str(e) or type(e).__name__)
+            await append_log_line_async(db, task.id, f"[PUSH] API push not possible ({reason}); using the push container", level="WARN")
+            task.status = "READY_FOR_REVIEW"
+            await db.commit()
+        else:
+            task.status = "PUSHED"
+            await db.commit()
+            await append_log_line_async(
+                db, task.id,
+                f"[PUSH] {task.work_branch} -> {result['commit_sha'][:12]} via GitHub API ({len(result['files'])} file(s))",
+            )
+            return {"ok": True, "task_id": task.id, "status": task.status, "work_branch": task.work_branch, "commit_sha": result["commit_sha"]}
 
-    # Spawn container in PUSH mode
-    start_task_container(task, user, mode="push")
+    # Push jobs have their own queue class, so they aren't stuck behind executes
+    await db.run_sync(enqueue, task, "push")
 
     return {"ok": True, "task_id": task.id, "status": task.status, "work_branch": task.work_branch}
@@ -0,0 +1,54 @@
+# backend/api/workers.py
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+
+from backend.core.config import settings
+from backend.services.worker_pool import worker_pool
+
+router = APIRouter(prefix="/workers", tags=["workers"])
+
+
+def worker_token_ok(token: str | None) -> bool:
+    """Agents (warm workers and task containers) send AGENT_WORKER_TOKEN as X-Worker-Token."""
+    return bool(token) and hmac.compare_digest(token, settings.AGENT_WORKER_TOKEN)
+
+
+def check_worker_token(token: str | None):
+    if not worker_token_ok(token):
+        raise HTTPException(status_code=401, detail="Invalid worker token")
+
+
+@router.get("")
+def pool_state():
+    """Warm agent pool: workers, queued assignments and counters."""
+    return worker_pool.stats()
+
+
+@router.post("/{worker_id}/claim")
+async def claim_work(
+    worker_id: str,
+    wait: float = Query(default=25, ge=0, le=60),
+    last: str | None = Query(default=None),
+    x_worker_token: str | None = Header(default=None),
+):
+    """
+    Long-poll used by resident agent workers.
+
+    200 {"type": "task", ...assignment} -> run it, then claim again with last=<assignment_id>
+    200 {"type": "exit"}                -> the pool is scaling down; shut down
+    204                                 -> nothing within `wait` seconds; claim again
+    """
+    check_worker_token(x_worker_token)
+    result = await worker_pool.claim(worker_id, wait, last)
+    if result is None:
+        return Response(status_code=204)
+    return result
+
+
+@router.post("/{worker_id}/leave")
+def leave_pool(worker_id: str, x_worker_token: str | None = Header(default=None)):
+    """Worker is shutting down on its own (SIGTERM etc.)."""
+    check_worker_token(x_worker_token)
+    worker_pool.leave(worker_id)
+    return {"ok": True}
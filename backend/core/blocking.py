@@ -0,0 +1,20 @@
+# backend/core/blocking.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.core.config import settings
+
+# Bounded pool for blocking calls made from async routes (e.g. the sync OpenAI
+# SDK). Keeps them off the event loop, and caps how many run at once so a burst
+# of slow calls can't starve everything else.
+_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_POOL_SIZE, thread_name_prefix="jules-blocking")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_blocking_pool():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,20 @@
 # backend/core/config.py
 import os
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _async_database_url(url: str) -> str:
+    """Same database, async psycopg (v3) driver: postgresql+psycopg2:// -> postgresql+psycopg://"""
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+psycopg://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+psycopg://" + url[len("postgresql://"):]
+    return url
+
+
 class Settings:
     GITHUB_CLIENT_ID: str = os.getenv("GITHUB_CLIENT_ID", "")
     GITHUB_CLIENT_SECRET: str = os.getenv("GITHUB_CLIENT_SECRET", "")
@@ -11,5 +22,98 @@ class Settings:
     GITHUB_OAUTH_SCOPES: str = os.getenv("GITHUB_OAUTH_SCOPES", "repo read:user")
 
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Used by async routes (backend/core/db.py:get_async_db); derived from DATABASE_URL by default
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "") or _async_database_url(DATABASE_URL)
+
+    # Thread pool for blocking calls made from async routes (LLM SDK etc.)
+    BLOCKING_POOL_SIZE: int = int(os.getenv("BLOCKING_POOL_SIZE", "8"))
+
+    # Shared GitHub HTTP connection pool (backend/github_client.py)
+    GITHUB_HTTP2: bool = os.getenv("GITHUB_HTTP2", "true").lower() in ("1", "true", "yes")
+    GITHUB_MAX_CONNECTIONS: int = int(os.getenv("GITHUB_MAX_CONNECTIONS", "100"))
+    GITHUB_MAX_KEEPALIVE: int = int(os.getenv("GITHUB_MAX_KEEPALIVE", "20"))
+    GITHUB_KEEPALIVE_EXPIRY: float = float(os.getenv("GITHUB_KEEPALIVE_EXPIRY", "30"))
+    GITHUB_TIMEOUT: float = float(os.getenv("GITHUB_TIMEOUT", "15"))
+
+    # Conditional-request cache for GitHub GET calls
+    GITHUB_CACHE_MAX_ENTRIES: int = int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", "2000"))
+    GITHUB_CACHE_FRESH_SECONDS: float = float(os.getenv("GITHUB_CACHE_FRESH_SECONDS", "10"))
+    GITHUB_CACHE_TTL_SECONDS: float = float(os.getenv("GITHUB_CACHE_TTL_SECONDS", "900"))
+
+    # Repo/branch listing: concurrent page fetches and the per-user search index
+    GITHUB_PAGE_CONCURRENCY: int = int(os.getenv("GITHUB_PAGE_CONCURRENCY", "8"))
+    GITHUB_MAX_PAGES: int = int(os.getenv("GITHUB_MAX_PAGES", "100"))
+    # Push work branches with the Git Data API (no container); unapplicable diffs still use the push container
+    GITHUB_API_PUSH: bool = os.getenv("GITHUB_API_PUSH", "true").lower() in ("1", "true", "yes")
+    GITHUB_LIST_INDEX_TTL_SECONDS: float = float(os.getenv("GITHUB_LIST_INDEX_TTL_SECONDS", "60"))
+    GITHUB_LIST_INDEX_MAX_ENTRIES: int = int(os.getenv("GITHUB_LIST_INDEX_MAX_ENTRIES", "256"))
+
+    # In-process cache for get_token_for_user()
+    GITHUB_TOKEN_CACHE_TTL_SECONDS: float = float(os.getenv("GITHUB_TOKEN_CACHE_TTL_SECONDS", "300"))
+
+    # Per-token rate-limit scheduler (backend/github_ratelimit.py)
+    GITHUB_RATELIMIT_BURST: int = int(os.getenv("GITHUB_RATELIMIT_BURST", "20"))
+    GITHUB_RATELIMIT_RESERVE_FRACTION: float = float(os.getenv("GITHUB_RATELIMIT_RESERVE_FRACTION", "0.1"))
+    GITHUB_RATELIMIT_MAX_WAIT_SECONDS: float = float(os.getenv("GITHUB_RATELIMIT_MAX_WAIT_SECONDS", "30"))
+    GITHUB_RATELIMIT_RETRIES: int = int(os.getenv("GITHUB_RATELIMIT_RETRIES", "2"))
+
+    # Content-addressed LLM response cache (backend/services/llm_cache.py)
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_MAX_BYTES: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Agent control channel (backend/api/agent_ws.py)
+    AGENT_TASK_TIMEOUT_SECONDS: int = int(os.getenv("AGENT_TASK_TIMEOUT_SECONDS", "1800"))
+    AGENT_HEARTBEAT_TIMEOUT_SECONDS: int = int(os.getenv("AGENT_HEARTBEAT_TIMEOUT_SECONDS", "60"))
+
+    # Agent job queue (backend/services/task_queue.py)
+    TASK_QUEUE_MAX_RUNNING: int = int(os.getenv("TASK_QUEUE_MAX_RUNNING", "4"))
+    TASK_QUEUE_MAX_EXECUTE: int = int(os.getenv("TASK_QUEUE_MAX_EXECUTE", "3"))
+    TASK_QUEUE_MAX_PUSH: int = int(os.getenv("TASK_QUEUE_MAX_PUSH", "2"))
+    # 0 = no per-user cap (the default while every route still runs as user_id = 1)
+    TASK_QUEUE_MAX_PER_USER: int = int(os.getenv("TASK_QUEUE_MAX_PER_USER", "0"))
+    TASK_QUEUE_MAX_PER_REPO: int = int(os.getenv("TASK_QUEUE_MAX_PER_REPO", "2"))
+    TASK_QUEUE_POLL_SECONDS: float = float(os.getenv("TASK_QUEUE_POLL_SECONDS", "2"))
+
+    # Agent containers (backend/services/orchestrator.py, worker_pool.py)
+    AGENT_IMAGE: str = os.getenv("AGENT_IMAGE", "jules-agent:dev")
+    AGENT_BACKEND_URL: str = os.getenv("AGENT_BACKEND_URL", "http://host.docker.internal:8000")
+    # Docker Engine API supervisor (backend/services/docker_supervisor.py).
+    # "auto" uses it when the socket exists, otherwise the docker CLI is used.
+    DOCKER_SUPERVISOR: str = os.getenv("DOCKER_SUPERVISOR", "auto").lower()
+    DOCKER_SOCKET: str = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+    DOCKER_API_VERSION: str = os.getenv("DOCKER_API_VERSION", "v1.41")
+    DOCKER_STATS_INTERVAL_SECONDS: float = float(os.getenv("DOCKER_STATS_INTERVAL_SECONDS", "10"))
+    # Per job class resource limits
+    AGENT_EXECUTE_CPUS: float = float(os.getenv("AGENT_EXECUTE_CPUS", "2"))
+    AGENT_EXECUTE_MEMORY: str = os.getenv("AGENT_EXECUTE_MEMORY", "2g")
+    AGENT_PUSH_CPUS: float = float(os.getenv("AGENT_PUSH_CPUS", "0.5"))
+    AGENT_PUSH_MEMORY: str = os.getenv("AGENT_PUSH_MEMORY", "512m")
+    # Shared bare-mirror git cache volume for agents ("" disables it)
+    AGENT_GIT_CACHE_VOLUME: str = os.getenv("AGENT_GIT_CACHE_VOLUME", "jules-git-mirrors")
+    AGENT_GIT_CACHE_BUDGET: str = os.getenv("AGENT_GIT_CACHE_BUDGET", "20g")
+    # Shared pip/npm cache + installed-environment snapshots volume ("" disables it)
+    AGENT_DEP_CACHE_VOLUME: str = os.getenv("AGENT_DEP_CACHE_VOLUME", "jules-dep-cache")
+    AGENT_DEP_CACHE_BUDGET: str = os.getenv("AGENT_DEP_CACHE_BUDGET", "10g")
+    # "full" (default) or "sparse": shallow, blobless clone of the branch with only the
+    # target file and root manifests checked out (execute runs; push always clones fully)
+    AGENT_CHECKOUT_MODE: str = os.getenv("AGENT_CHECKOUT_MODE", "full")
+    # "affected" (default): only tests that depend on the edited file; "full": the whole suite
+    AGENT_TEST_SCOPE: str = os.getenv("AGENT_TEST_SCOPE", "affected")
+    # Most pytest processes per agent; fewer if the container's CPU limit allows fewer
+    AGENT_TEST_WORKERS: int = int(os.getenv("AGENT_TEST_WORKERS", "4"))
+    # Multi-file tasks: files per task, and concurrent LLM rewrites inside one agent
+    TASK_MAX_TARGET_FILES: int = int(os.getenv("TASK_MAX_TARGET_FILES", "20"))
+    AGENT_LLM_CONCURRENCY: int = int(os.getenv("AGENT_LLM_CONCURRENCY", "4"))
+    # Warm worker pool; 0 keeps the old cold `docker run` per task
+    AGENT_POOL_MIN_IDLE: int = int(os.getenv("AGENT_POOL_MIN_IDLE", "0"))
+    AGENT_POOL_MAX: int = int(os.getenv("AGENT_POOL_MAX", "4"))
+    AGENT_POOL_IDLE_SECONDS: float = float(os.getenv("AGENT_POOL_IDLE_SECONDS", "300"))
+    AGENT_POOL_SCALE_INTERVAL_SECONDS: float = float(os.getenv("AGENT_POOL_SCALE_INTERVAL_SECONDS", "2"))
+    AGENT_POOL_CLAIM_WAIT_SECONDS: float = float(os.getenv("AGENT_POOL_CLAIM_WAIT_SECONDS", "25"))
+    # Shared secret agents send on /workers calls and LLM cache writes. Random per
+    # process if unset, which only works for a single backend process: required
+    # whenever the warm pool is on (AGENT_POOL_MIN_IDLE > 0)
+    AGENT_WORKER_TOKEN: str = os.getenv("AGENT_WORKER_TOKEN", "") or secrets.token_hex(16)
 
 settings = Settings()
@@ -1,5 +1,6 @@
 # backend/core/db.py
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from backend.core.config import settings
 
@@ -16,6 +17,17 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
+# Async engine (async psycopg) for `async def` routes, so DB waits don't block
+# the event loop. Sync routes keep using SessionLocal/get_db (FastAPI runs those
+# in its threadpool).
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
 # Dependency for FastAPI routes (when we start using it there)
 def get_db():
     db = SessionLocal()
@@ -23,3 +35,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency for async routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,49 +1,270 @@
 # backend/github_client.py
+import asyncio
+import hashlib
+import re
+import time
 import httpx
+from collections import OrderedDict
 from typing import Union
+from urllib.parse import urlparse, parse_qs
+
+from backend.core.config import settings
+from backend.github_ratelimit import github_scheduler
+
+# ----------------------------
+# Process-wide connection pool
+# ----------------------------
+# One AsyncClient for the whole app, so calls to api.github.com reuse warm
+# TCP+TLS connections (multiplexed over HTTP/2 when `h2` is installed) instead
+# of paying a new handshake per call. Auth headers are applied per request,
+# so the pool is shared across users/tokens.
+_http_client: httpx.AsyncClient | None = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.GITHUB_HTTP2 and _http2_available(),
+        timeout=settings.GITHUB_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.GITHUB_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GITHUB_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GITHUB_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def startup_http_client():
+    """Create the shared pool (called from the app startup hook)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+
+
+async def shutdown_http_client():
+    """Close the shared pool (called from the app shutdown hook)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pool, creating it lazily outside the app (scripts, tests)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+# ----------------------------
+# Conditional-request (ETag) cache
+# ----------------------------
+# Headers that describe the wire encoding of the original response; cached
+# bodies are stored already decoded, so these must not be replayed.
+_UNCACHED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+
+class _CacheEntry:
+    def __init__(self, resp: httpx.Response):
+        self.etag = resp.headers.get("etag")
+        self.last_modified = resp.headers.get("last-modified")
+        self.content = resp.content
+        self.headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _UNCACHED_HEADERS]
+        self.stored_at = time.monotonic()
+
+    def to_response(self, url: str) -> httpx.Response:
+        return httpx.Response(200, headers=self.headers, content=self.content, request=httpx.Request("GET", url))
+
+
+class GitHubResponseCache:
+    """
+    Bounded LRU + TTL cache for GitHub GET responses, keyed per token and URL.
+
+    - Within `fresh_seconds` a stored response is returned without any request.
+    - After that it is revalidated with If-None-Match / If-Modified-Since; a 304
+      is served from the cache and does not count against the rate limit.
+    - Entries older than `ttl_seconds` are dropped; the least recently used
+      entry is evicted when `max_entries` is reached.
+    - Identical requests already in flight are coalesced into one.
+    """
+
+    def __init__(self, max_entries: int, fresh_seconds: float, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], _CacheEntry] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries), "inflight": len(self._inflight)}
+
+    def clear(self):
+        self._entries.clear()
+
+    def _lookup(self, key) -> _CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, resp: httpx.Response):
+        self._entries[key] = _CacheEntry(resp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get(self, token_key: str, url: str, fetch) -> httpx.Response:
+        """GET `url` through the cache. `fetch(method, url, headers=...)` does the real request."""
+        key = (token_key, url)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        entry = self._lookup(key)
+        if entry is not None and time.monotonic() - entry.stored_at < self.fresh_seconds:
+            self.counters["hits"] += 1
+            return entry.to_response(url)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            resp = await self._fetch(key, url, entry, fetch)
+            fut.set_result(resp)
+            return resp
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark as retrieved even if nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, key, url: str, entry: _CacheEntry | None, fetch) -> httpx.Response:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        resp = await fetch("GET", url, headers=headers)
+
+        if resp.status_code == 304 and entry is not None:
+            self.counters["revalidated"] += 1
+            entry.stored_at = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry.to_response(url)
+
+        self.counters["misses"] += 1
+        if resp.status_code == 200 and (resp.headers.get("etag") or resp.headers.get("last-modified")):
+            self._store(key, resp)
+        return resp
+
+
+github_cache = GitHubResponseCache(
+    max_entries=settings.GITHUB_CACHE_MAX_ENTRIES,
+    fresh_seconds=settings.GITHUB_CACHE_FRESH_SECONDS,
+    ttl_seconds=settings.GITHUB_CACHE_TTL_SECONDS,
+)
+
+
+_LINK_LAST_RE = re.compile(r'<([^>]+)>;\s*rel="last"')
+
+
+def _last_page(link_header: str | None) -> int:
+    """Page number of rel="last" in a GitHub Link header (1 if there is none)."""
+    if not link_header:
+        return 1
+    m = _LINK_LAST_RE.search(link_header)
+    if not m:
+        return 1
+    pages = parse_qs(urlparse(m.group(1)).query).get("page")
+    return int(pages[0]) if pages else 1
+
 
 class GitHubClient:
-    def __init__(self, client_or_token: Union[httpx.AsyncClient, str]):
+    def __init__(self, client_or_token: Union[httpx.AsyncClient, str], priority: str = "high"):
         # Standard base URL for GitHub API
         self.base_url = "https://api.github.com"
+        # "low" for background/listing reads that may be slowed down when the
+        # token's quota runs low; "high" for calls a user action depends on.
+        self.priority = priority
 
         # If caller passed an AsyncClient, reuse it (e.g., publish_task does this).
         if isinstance(client_or_token, httpx.AsyncClient):
             self.client = client_or_token
             self.headers = getattr(self.client, "headers", None)
         else:
-            # If caller passed a token string, build headers and use ad-hoc clients.
+            # If caller passed a token string, build headers and use the shared pool.
             self.client = None
             access_token = str(client_or_token)
             self.headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Accept": "application/vnd.github+json",
             }
+            # Cache key per token, without keeping the token itself in the cache
+            self.token_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:32]
 
     async def get_repos(self):
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            resp = await client.get("https://api.github.com/user/repos?per_page=100")
-            resp.raise_for_status()
-            return resp.json()
+        return await self._get_all_pages(f"{self.base_url}/user/repos")
 
     async def get_branches(self, owner: str, repo: str):
-        url = f"https://api.github.com/repos/{owner}/{repo}/branches?per_page=100"
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            return resp.json()
+        return await self._get_all_pages(f"{self.base_url}/repos/{owner}/{repo}/branches")
+
+    async def _get_all_pages(self, url: str, per_page: int = 100) -> list:
+        """Fetch every page of a list endpoint.
+
+        The first response's Link header tells us the last page number; pages
+        2..N are then fetched concurrently (bounded by GITHUB_PAGE_CONCURRENCY)
+        and merged in page order.
+        """
+        sep = "&" if "?" in url else "?"
+        first = await self._request("GET", f"{url}{sep}per_page={per_page}&page=1")
+        items = list(first.json())
+
+        last = min(_last_page(first.headers.get("link")), settings.GITHUB_MAX_PAGES)
+        if last <= 1:
+            return items
+
+        sem = asyncio.Semaphore(settings.GITHUB_PAGE_CONCURRENCY)
+
+        async def fetch_page(page: int):
+            async with sem:
+                resp = await self._request("GET", f"{url}{sep}per_page={per_page}&page={page}")
+                return resp.json()
+
+        for page_items in await asyncio.gather(*(fetch_page(p) for p in range(2, last + 1))):
+            items.extend(page_items)
+        return items
+
+    async def get_branch(self, owner: str, repo: str, branch: str, fresh: bool = False):
+        # gets one branch with commit SHA. `fresh` bypasses the response cache
+        # (e.g. when the SHA is recorded as a task's base commit)
+        url = f"{self.base_url}/repos/{owner}/{repo}/branches/{branch}"
+        if fresh:
+            resp = await self._request("GET", url, headers={"Cache-Control": "no-cache"})
+        else:
+            resp = await self._request("GET", url)
+        return resp.json()
 
-    async def get_branch(self, owner: str, repo: str, branch: str):
-        # gets one branch with commit SHA
-        url = f"https://api.github.com/repos/{owner}/{repo}/branches/{branch}"
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            return resp.json()
-    
     async def get_file(self, owner: str, repo: str, path: str, ref: str | None = None):
         """Fetch file content from a repo. Returns decoded text (if base64 encoded)."""
-        url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
+        url = f"{self.base_url}/repos/{owner}/{repo}/contents/{path}"
         if ref:
             url += f"?ref={ref}"
         resp = await self._request("GET", url)
@@ -56,15 +277,29 @@ class GitHubClient:
         return data.get("content") or ""
 
     async def _request(self, method: str, url: str, **kwargs):
-        """Internal helper that uses either the provided client or a temporary one."""
+        """Internal helper that uses either the provided client or the shared pool.
+
+        Plain GETs on the shared pool go through `github_cache` (ETag revalidation
+        + in-flight coalescing).
+        """
         if self.client:
             resp = await self.client.request(method, url, **kwargs)
+        elif method == "GET" and not kwargs:
+            resp = await github_cache.get(self.token_key, url, self._send)
         else:
-            async with httpx.AsyncClient(headers=self.headers) as client:
-                resp = await client.request(method, url, **kwargs)
+            resp = await self._send(method, url, **kwargs)
         resp.raise_for_status()
         return resp
 
+    async def _send(self, method: str, url: str, **kwargs):
+        headers = {**self.headers, **(kwargs.pop("headers", None) or {})}
+
+        async def send():
+            return await get_http_client().request(method, url, headers=headers, **kwargs)
+
+        # Every request on the shared pool is paced against the token's quota
+        return await github_scheduler.run(self.token_key, send, priority=self.priority)
+
     async def compare_commits(self, owner: str, repo: str, base: str, head: str):
         """Compare two refs using GitHub's compare API.
 
@@ -95,4 +330,62 @@ class GitHubClient:
                 err = resp.json()
             except Exception:
                 err = resp.text
-            raise RuntimeError(f"GitHub API error creating PR: {resp.status_code} - {err}") from e
\ No newline at end of file
+            raise RuntimeError(f"GitHub API error creating PR: {resp.status_code} - {err}") from e
+
+    # ----------------------------
+    # Git Data API (blobs / trees / commits / refs)
+    # ----------------------------
+    async def get_git_commit(self, owner: str, repo: str, sha: str):
+        resp = await self._request("GET", f"{self.base_url}/repos/{owner}/{repo}/git/commits/{sha}")
+        return resp.json()
+
+    async def get_git_tree(self, owner: str, repo: str, sha: str):
+        """One level of a tree (trees are immutable, so the response cache is safe here)."""
+        resp = await self._request("GET", f"{self.base_url}/repos/{owner}/{repo}/git/trees/{sha}")
+        return resp.json()
+
+    async def get_git_blob(self, owner: str, repo: str, sha: str) -> bytes:
+        import base64
+        resp = await self._request("GET", f"{self.base_url}/repos/{owner}/{repo}/git/blobs/{sha}")
+        data = resp.json()
+        if data.get("encoding") == "base64":
+            return base64.b64decode(data.get("content") or "")
+        return (data.get("content") or "").encode("utf-8")
+
+    async def create_git_blob(self, owner: str, repo: str, content: bytes) -> str:
+        import base64
+        payload = {"content": base64.b64encode(content).decode("ascii"), "encoding": "base64"}
+        resp = await self._request("POST", f"{self.base_url}/repos/{owner}/{repo}/git/blobs", json=payload)
+        return resp.json()["sha"]
+
+    async def create_git_tree(self, owner: str, repo: str, base_tree: str, entries: list[dict]) -> str:
+        payload = {"base_tree": base_tree, "tree": entries}
+        resp = await self._request("POST", f"{self.base_url}/repos/{owner}/{repo}/git/trees", json=payload)
+        return resp.json()["sha"]
+
+    async def create_git_commit(self, owner: str, repo: str, message: str, tree: str, parents: list[str]) -> str:
+        payload = {"message": message, "tree": tree, "parents": parents}
+        resp = await self._request("POST", f"{self.base_url}/repos/{owner}/{repo}/git/commits", json=payload)
+        return resp.json()["sha"]
+
+    async def get_branch_head(self, owner: str, repo: str, branch: str) -> str | None:
+        """Commit SHA of refs/heads/<branch>, or None if the branch doesn't exist."""
+        url = f"{self.base_url}/repos/{owner}/{repo}/git/ref/heads/{branch}"
+        try:
+            # Bypass the response cache: a stale ref would make the update non-fast-forward
+            resp = await self._request("GET", url, headers={"Cache-Control": "no-cache"})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+        return resp.json()["object"]["sha"]
+
+    async def set_branch_head(self, owner: str, repo: str, branch: str, sha: str, exists: bool):
+        """Create refs/heads/<branch> at `sha`, or fast-forward it there."""
+        if exists:
+            url = f"{self.base_url}/repos/{owner}/{repo}/git/refs/heads/{branch}"
+            resp = await self._request("PATCH", url, json={"sha": sha, "force": False})
+        else:
+            url = f"{self.base_url}/repos/{owner}/{repo}/git/refs"
+            resp = await self._request("POST", url, json={"ref": f"refs/heads/{branch}", "sha": sha})
+        return resp.json()
@@ -0,0 +1,180 @@
+# backend/github_ratelimit.py
+import asyncio
+import random
+import time
+
+import httpx
+
+from backend.core.config import settings
+
+
+class GitHubRateLimited(Exception):
+    """Raised when a call would have to wait longer than GITHUB_RATELIMIT_MAX_WAIT_SECONDS."""
+
+    def __init__(self, retry_at: float):
+        self.retry_at = retry_at
+        super().__init__(f"GitHub rate limit reached; retry after {max(0, int(retry_at - time.time()))}s")
+
+
+class TokenBudget:
+    """What we know about one token's quota, plus a token bucket for pacing low-priority calls."""
+
+    def __init__(self):
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset_at: float | None = None      # unix ts from X-RateLimit-Reset
+        self.blocked_until: float = 0.0         # unix ts from Retry-After / exhausted quota
+        self.tokens = float(settings.GITHUB_RATELIMIT_BURST)
+        self.refilled_at = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.counters = {"sent": 0, "throttled": 0, "retried": 0, "limited": 0}
+
+    def reserve(self) -> int:
+        """Requests kept back for high-priority calls."""
+        if self.limit is None:
+            return 0
+        return max(1, int(self.limit * settings.GITHUB_RATELIMIT_RESERVE_FRACTION))
+
+    def refill_rate(self) -> float:
+        """Low-priority requests/second we can afford until the quota resets."""
+        if self.remaining is None or self.reset_at is None:
+            return float("inf")  # nothing known yet
+        spendable = self.remaining - self.reserve()
+        if spendable <= 0:
+            return 0.0
+        window = max(self.reset_at - time.time(), 1.0)
+        return spendable / window
+
+    def update(self, resp: httpx.Response):
+        h = resp.headers
+        try:
+            if "x-ratelimit-limit" in h:
+                self.limit = int(h["x-ratelimit-limit"])
+            if "x-ratelimit-remaining" in h:
+                self.remaining = int(h["x-ratelimit-remaining"])
+            if "x-ratelimit-reset" in h:
+                self.reset_at = float(h["x-ratelimit-reset"])
+        except ValueError:
+            pass
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_at": self.reset_at,
+            "reset_in_seconds": max(0, int(self.reset_at - now)) if self.reset_at else None,
+            "blocked_for_seconds": max(0, round(self.blocked_until - now, 1)),
+            "low_priority_rate_per_sec": None if self.refill_rate() == float("inf") else round(self.refill_rate(), 3),
+            **self.counters,
+        }
+
+
+def _retry_after(resp: httpx.Response, budget: TokenBudget) -> float | None:
+    """Seconds to back off for a rate-limited response, or None if it isn't one."""
+    if resp.status_code not in (403, 429):
+        return None
+    if "retry-after" in resp.headers:
+        try:
+            return float(resp.headers["retry-after"])
+        except ValueError:
+            return 60.0
+    if resp.headers.get("x-ratelimit-remaining") == "0" and budget.reset_at:
+        return max(budget.reset_at - time.time(), 1.0)
+    if resp.status_code == 429 or "rate limit" in resp.text.lower():
+        # Secondary rate limit without Retry-After: GitHub asks for at least a minute
+        return 60.0
+    return None  # a normal 403 (permissions etc.)
+
+
+class GitHubScheduler:
+    """
+    Per-token scheduler that every GitHubClient request goes through.
+
+    - Tracks the remaining budget from X-RateLimit-* response headers.
+    - "low" priority calls (listing/refresh reads) take from a token bucket that
+      refills at remaining/seconds-until-reset, so they slow down as the budget
+      runs out and stop entirely once only the reserve is left.
+    - "high" priority calls (task creation, pushes) skip the bucket but still
+      respect an exhausted quota.
+    - 403/429 rate-limit responses honour Retry-After with jittered backoff.
+    """
+
+    def __init__(self):
+        self._budgets: dict[str, TokenBudget] = {}
+
+    def budget(self, token_key: str) -> TokenBudget:
+        b = self._budgets.get(token_key)
+        if b is None:
+            b = self._budgets[token_key] = TokenBudget()
+        return b
+
+    def state(self, token_key: str) -> dict:
+        return self.budget(token_key).snapshot()
+
+    async def _wait(self, seconds: float, budget: TokenBudget):
+        if seconds <= 0:
+            return
+        if seconds > settings.GITHUB_RATELIMIT_MAX_WAIT_SECONDS:
+            budget.counters["limited"] += 1
+            raise GitHubRateLimited(time.time() + seconds)
+        budget.counters["throttled"] += 1
+        await asyncio.sleep(seconds)
+
+    async def _admit(self, budget: TokenBudget, priority: str):
+        # Hard block (Retry-After or quota exhausted) applies to everyone
+        await self._wait(budget.blocked_until - time.time(), budget)
+        if budget.remaining == 0 and budget.reset_at and budget.reset_at > time.time():
+            await self._wait(budget.reset_at - time.time(), budget)
+
+        if priority != "low":
+            return
+
+        async with budget.lock:
+            rate = budget.refill_rate()
+            now = time.monotonic()
+            if rate != float("inf"):
+                budget.tokens = min(
+                    float(settings.GITHUB_RATELIMIT_BURST),
+                    budget.tokens + (now - budget.refilled_at) * rate,
+                )
+            budget.refilled_at = now
+
+            if rate == float("inf") or budget.tokens >= 1:
+                budget.tokens = max(budget.tokens - 1, 0.0)
+                return
+
+            # Queue behind the bucket (the lock keeps low-priority calls in order)
+            if rate == 0:
+                wait = (budget.reset_at or time.time()) - time.time()
+            else:
+                wait = (1 - budget.tokens) / rate
+            await self._wait(wait, budget)
+            budget.tokens = 0.0
+            budget.refilled_at = time.monotonic()
+
+    async def run(self, token_key: str, send, priority: str = "high") -> httpx.Response:
+        """Send one request via `await send()` under the token's budget."""
+        budget = self.budget(token_key)
+        attempts = settings.GITHUB_RATELIMIT_RETRIES
+
+        for attempt in range(attempts + 1):
+            await self._admit(budget, priority)
+            resp = await send()
+            budget.counters["sent"] += 1
+            budget.update(resp)
+
+            backoff = _retry_after(resp, budget)
+            if backoff is None:
+                return resp
+
+            budget.blocked_until = max(budget.blocked_until, time.time() + backoff)
+            if attempt == attempts:
+                return resp
+            budget.counters["retried"] += 1
+            # Jitter so parallel waiters don't all come back at the same instant
+            await self._wait(backoff * (1 + random.random() * 0.25) + (2 ** attempt) * random.random(), budget)
+        return resp
+
+
+github_scheduler = GitHubScheduler()
@@ -1,11 +1,20 @@
 # backend/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from backend.api.auth_github import router as github_auth_router
 from backend.api.github_routes import router as github_routes_router
-from backend.core.db import Base, engine
+from backend.core.db import Base, engine, async_engine
+from backend.core.blocking import shutdown_blocking_pool
 from backend.api.tasks import router as tasks_router
+from backend.api.agent_ws import router as agent_ws_router
+from backend.api.llm_cache import router as llm_cache_router
+from backend.api.workers import router as workers_router
+from backend.github_client import startup_http_client, shutdown_http_client
+from backend.services.docker_supervisor import docker_supervisor
+from backend.services.worker_pool import worker_pool
+from backend.services.task_queue import start_dispatcher, stop_dispatcher
+from backend.github_ratelimit import GitHubRateLimited
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from pathlib import Path
 
 import backend.models
@@ -16,6 +25,9 @@ app = FastAPI(title="Jules Backend")
 app.include_router(github_auth_router)
 app.include_router(github_routes_router)
 app.include_router(tasks_router)
+app.include_router(agent_ws_router)
+app.include_router(llm_cache_router)
+app.include_router(workers_router)
 
 @app.on_event("startup")
 def on_startup():
@@ -42,6 +54,54 @@ def on_startup():
         except Exception:
             pass
 
+    if "diff_sha" not in cols:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE tasks ADD COLUMN diff_sha VARCHAR(64) REFERENCES diff_blobs(sha256)"))
+        except Exception:
+            pass
+
+    if "target_files" not in cols:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE tasks ADD COLUMN target_files JSON"))
+        except Exception:
+            pass
+
+    # create_all() doesn't add new indexes to an existing table, so add any missing ones
+    from backend.models import Task
+    for index in Task.__table__.indexes:
+        try:
+            index.create(bind=engine, checkfirst=True)
+        except Exception:
+            pass
+
+@app.exception_handler(GitHubRateLimited)
+async def github_rate_limited(request: Request, exc: GitHubRateLimited):
+    import time
+    retry_after = max(1, int(exc.retry_at - time.time()))
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(retry_after)})
+
+@app.on_event("startup")
+async def on_startup_http():
+    # One pooled GitHub HTTP client for the whole app lifetime
+    await startup_http_client()
+    # Docker Engine API supervisor (falls back to the docker CLI without the socket)
+    await docker_supervisor.start()
+    # Warm agent workers (no-op unless AGENT_POOL_MIN_IDLE > 0)
+    await worker_pool.start()
+    # Starts queued agent jobs as concurrency slots free up
+    await start_dispatcher()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_dispatcher()
+    await worker_pool.stop()
+    await docker_supervisor.stop()
+    await shutdown_http_client()
+    await async_engine.dispose()
+    shutdown_blocking_pool()
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -2,3 +2,7 @@
 from .user import User  # noqa
 from .github_token import GitHubToken  # noqa
 from .task import Task  # noqa
+from .task_log import TaskLogLine  # noqa
+from .diff_blob import DiffBlob  # noqa
+from .task_queue import TaskQueueEntry  # noqa
+from .agent_run import AgentRun  # noqa
@@ -0,0 +1,32 @@
+# backend/models/agent_run.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, BigInteger, Boolean
+from backend.core.db import Base
+
+
+class AgentRun(Base):
+    """One agent container run for a task, recorded by the Docker supervisor.
+
+    Exit code and resource usage are kept for debugging and capacity planning.
+    """
+    __tablename__ = "agent_runs"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    mode = Column(String, nullable=False)                 # execute, push
+    container_id = Column(String(64), nullable=False, index=True)
+
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    exit_code = Column(Integer, nullable=True)
+    oom_killed = Column(Boolean, nullable=False, default=False)
+
+    # Limits the container ran with
+    cpu_limit = Column(Float, nullable=True)              # CPUs
+    memory_limit_bytes = Column(BigInteger, nullable=True)
+
+    # Sampled from the Docker stats API while the container ran
+    samples = Column(Integer, nullable=False, default=0)
+    cpu_avg_pct = Column(Float, nullable=True)            # 100 = one full CPU
+    cpu_peak_pct = Column(Float, nullable=True)
+    memory_peak_bytes = Column(BigInteger, nullable=True)
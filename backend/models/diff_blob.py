@@ -0,0 +1,14 @@
+# backend/models/diff_blob.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from backend.core.db import Base
+
+
+class DiffBlob(Base):
+    """A gzip-compressed diff, stored once per distinct content (keyed by sha256)."""
+    __tablename__ = "diff_blobs"
+
+    sha256 = Column(String(64), primary_key=True)     # hex sha256 of the raw (uncompressed) diff
+    size = Column(Integer, nullable=False)            # raw size in bytes
+    gzip_data = Column(LargeBinary, nullable=False)   # gzip stream, served as-is to gzip clients
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,11 +1,20 @@
 # backend/models/task.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, JSON
+from sqlalchemy.orm import deferred
 from backend.core.db import Base
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # GET /tasks keyset pagination: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_tasks_user_created_id", "user_id", "created_at", "id"),
+        # Same listing filtered by status
+        Index("ix_tasks_user_status_created", "user_id", "status", "created_at"),
+        # Per-repo dashboards ("what is running on owner/repo")
+        Index("ix_tasks_repo_status", "repo_full_name", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -18,7 +27,13 @@ class Task(Base):
 
     prompt = Column(String, nullable=False)                  # what user asked: "Upgrade Next.js..."
     target_file = Column(String, nullable=True)               # optional: "package.json", "app/page.tsx", etc.
-    diff_text = Column(Text, nullable=True, default="")                     # generated diff text
+    # Multi-file tasks: every path to edit (target_file is kept as the first one)
+    target_files = Column(JSON, nullable=True)
+    # Large Text columns are deferred: plain task loads (status checks, polling)
+    # don't read them unless a route asks for them explicitly.
+    diff_text = deferred(Column(Text, nullable=True, default=""))           # legacy inline diff (old rows only)
+    # Current diff lives compressed in diff_blobs (see services/diff_store.py)
+    diff_sha = Column(String(64), ForeignKey("diff_blobs.sha256"), nullable=True)
 
 
     work_branch = Column(String, nullable=True)        # git branch created for this task
@@ -30,8 +45,17 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
-    log_text = Column(Text, nullable=True, default="")                     # logs or error messages
-    plan_text = Column(Text, nullable=True, default="")
+    # Legacy log blob. New lines go to task_log_lines (see services/task_log_service.py);
+    # this column is only read back as the prefix of the combined log view.
+    log_text = deferred(Column(Text, nullable=True, default=""))
+    plan_text = deferred(Column(Text, nullable=True, default=""))
 
     # source of plan (e.g. 'openai:gpt-3.5-turbo', 'human', etc.)
     plan_generated_by = Column(String, nullable=True)
+
+    @property
+    def targets(self) -> list[str]:
+        """Paths the agent edits (old single-file rows only have target_file)."""
+        if self.target_files:
+            return list(self.target_files)
+        return [self.target_file] if self.target_file else []
@@ -0,0 +1,30 @@
+# backend/models/task_log.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+from backend.core.db import Base
+
+
+class TaskLogLine(Base):
+    """One appended log line for a task.
+
+    Lines are insert-only, so appending never rewrites earlier output.
+    `seq` is a per-task counter (1, 2, 3, ...) used as a cursor for tail reads.
+    """
+    __tablename__ = "task_log_lines"
+    __table_args__ = (
+        # Also serves as the index for "WHERE task_id = ? AND seq > ? ORDER BY seq"
+        UniqueConstraint("task_id", "seq", name="uq_task_log_lines_task_seq"),
+        # Batched writers (the agent reporter) number their own lines per stream,
+        # so a retried batch can be recognised and skipped.
+        UniqueConstraint("task_id", "stream", "stream_seq", name="uq_task_log_lines_stream_seq"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    ts = Column(DateTime, default=datetime.utcnow, nullable=False)
+    level = Column(String, nullable=False, default="INFO")     # INFO, WARN, ERROR
+    message = Column(Text, nullable=False, default="")
+
+    stream = Column(String, nullable=True)        # writer id, e.g. one per agent run
+    stream_seq = Column(Integer, nullable=True)   # writer-assigned sequence number
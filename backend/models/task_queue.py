@@ -0,0 +1,33 @@
+# backend/models/task_queue.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from backend.core.db import Base
+
+
+class TaskQueueEntry(Base):
+    """One pending or running agent job (see services/task_queue.py).
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    dispatchers can work the same table without handing out a job twice.
+    """
+    __tablename__ = "task_queue"
+    __table_args__ = (
+        # Dispatch: WHERE state = 'QUEUED' AND job_class = ? ORDER BY priority DESC, id
+        Index("ix_task_queue_dispatch", "state", "job_class", "priority", "id"),
+        # Cap checks: running jobs per user / per repo
+        Index("ix_task_queue_state_user", "state", "user_id"),
+        Index("ix_task_queue_state_repo", "state", "repo_full_name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    repo_full_name = Column(String, nullable=False)
+
+    job_class = Column(String, nullable=False)                  # execute, push
+    priority = Column(Integer, nullable=False, default=0)       # higher runs first
+    state = Column(String, nullable=False, default="QUEUED")    # QUEUED, RUNNING, DONE
+
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
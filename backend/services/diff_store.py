@@ -0,0 +1,56 @@
+# backend/services/diff_store.py
+import gzip
+import hashlib
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.models import DiffBlob, Task
+
+
+def store_diff(db: Session, diff_text: str) -> str | None:
+    """Store a diff (compressed, deduplicated) and return its sha256, or None if empty.
+
+    Commits the blob on its own, so callers can then update the task row safely.
+    """
+    if not diff_text:
+        return None
+
+    raw = diff_text.encode("utf-8")
+    sha = hashlib.sha256(raw).hexdigest()
+
+    if db.query(DiffBlob.sha256).filter(DiffBlob.sha256 == sha).first():
+        return sha
+
+    # mtime=0 keeps the gzip bytes stable for identical input
+    db.add(DiffBlob(sha256=sha, size=len(raw), gzip_data=gzip.compress(raw, compresslevel=6, mtime=0)))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Same diff stored concurrently by another request: that's fine
+        db.rollback()
+    return sha
+
+
+def get_diff_blob(db: Session, task: Task) -> DiffBlob | None:
+    if not task.diff_sha:
+        return None
+    return db.query(DiffBlob).filter(DiffBlob.sha256 == task.diff_sha).first()
+
+
+def load_diff_text(db: Session, task: Task) -> str:
+    """Diff text for a task: from the blob table, or the legacy inline column for old rows."""
+    blob = get_diff_blob(db, task)
+    if blob:
+        return gzip.decompress(blob.gzip_data).decode("utf-8")
+    return task.diff_text or ""
+
+
+async def load_diff_text_async(db: AsyncSession, task: Task) -> str:
+    if task.diff_sha:
+        blob = (await db.execute(select(DiffBlob).where(DiffBlob.sha256 == task.diff_sha))).scalar_one_or_none()
+        if blob:
+            return gzip.decompress(blob.gzip_data).decode("utf-8")
+    # diff_text is deferred and can't lazy-load on an AsyncSession
+    legacy = (await db.execute(select(Task.diff_text).where(Task.id == task.id))).scalar_one_or_none()
+    return legacy or ""
@@ -0,0 +1,474 @@
+# backend/services/docker_supervisor.py
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import httpx
+
+from backend.core.blocking import run_blocking
+from backend.core.config import settings
+from backend.core.db import SessionLocal
+from backend.models import AgentRun, Task
+from backend.services.task_log_service import append_log_line
+
+# Every container we start carries these labels, so events, listing and
+# reconciliation after a backend restart only ever see our own containers.
+LABEL_MANAGED = "jules.managed"
+LABEL_TASK = "jules.task_id"
+LABEL_MODE = "jules.mode"
+LABEL_WORKER = "jules.worker_id"
+
+class DockerError(Exception):
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(f"docker API {status_code}: {message}")
+
+
+def parse_memory(value: str) -> int:
+    """'512m' / '2g' / '1073741824' -> bytes (same suffixes as `docker run --memory`)."""
+    value = value.strip().lower()
+    units = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def limits_for(job_class: str) -> tuple[float, int]:
+    """(cpus, memory bytes) for a job class."""
+    if job_class == "push":
+        return settings.AGENT_PUSH_CPUS, parse_memory(settings.AGENT_PUSH_MEMORY)
+    return settings.AGENT_EXECUTE_CPUS, parse_memory(settings.AGENT_EXECUTE_MEMORY)
+
+
+def agent_mounts() -> list[str]:
+    """Named volumes shared by all agent containers ("volume:/path")."""
+    mounts = []
+    if settings.AGENT_GIT_CACHE_VOLUME:
+        mounts.append(f"{settings.AGENT_GIT_CACHE_VOLUME}:/cache/git")
+    if settings.AGENT_DEP_CACHE_VOLUME:
+        mounts.append(f"{settings.AGENT_DEP_CACHE_VOLUME}:/cache/deps")
+    return mounts
+
+
+def agent_cache_env() -> dict:
+    """Env telling the agent where the shared caches are mounted."""
+    env = {}
+    if settings.AGENT_GIT_CACHE_VOLUME:
+        env["GIT_MIRROR_DIR"] = "/cache/git"
+        env["GIT_MIRROR_BUDGET"] = settings.AGENT_GIT_CACHE_BUDGET
+    if settings.AGENT_DEP_CACHE_VOLUME:
+        # pip / npm download caches plus installed-environment snapshots
+        env["DEP_CACHE_DIR"] = "/cache/deps"
+        env["DEP_CACHE_BUDGET"] = settings.AGENT_DEP_CACHE_BUDGET
+        env["PIP_CACHE_DIR"] = "/cache/deps/pip"
+        env["npm_config_cache"] = "/cache/deps/npm"
+    return env
+
+
+# ----------------------------
+# Minimal Docker Engine API client (unix socket)
+# ----------------------------
+class DockerAPI:
+    def __init__(self, socket_path: str, version: str, transport: httpx.AsyncBaseTransport | None = None):
+        # `transport` is for tests (httpx.MockTransport standing in for dockerd)
+        self._client = httpx.AsyncClient(
+            transport=transport or httpx.AsyncHTTPTransport(uds=socket_path),
+            base_url=f"http://docker/{version}",
+            timeout=httpx.Timeout(30.0),
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _call(self, method: str, path: str, **kwargs) -> httpx.Response:
+        resp = await self._client.request(method, path, **kwargs)
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("message", resp.text)
+            except ValueError:
+                message = resp.text
+            raise DockerError(resp.status_code, message)
+        return resp
+
+    async def create(self, name: str, config: dict) -> str:
+        resp = await self._call("POST", "/containers/create", params={"name": name}, json=config)
+        return resp.json()["Id"]
+
+    async def start(self, container_id: str):
+        await self._call("POST", f"/containers/{container_id}/start")
+
+    async def inspect(self, container_id: str) -> dict:
+        return (await self._call("GET", f"/containers/{container_id}/json")).json()
+
+    async def remove(self, container_id: str):
+        await self._call("DELETE", f"/containers/{container_id}", params={"force": "true"})
+
+    async def list(self, label: str) -> list[dict]:
+        filters = json.dumps({"label": [label]})
+        return (await self._call("GET", "/containers/json", params={"all": "true", "filters": filters})).json()
+
+    async def stats(self, container_id: str) -> dict:
+        return (await self._call("GET", f"/containers/{container_id}/stats", params={"stream": "false"})).json()
+
+    async def events(self, filters: dict):
+        """Yield event dicts from the (endless) /events stream."""
+        params = {"filters": json.dumps(filters)}
+        async with self._client.stream("GET", "/events", params=params, timeout=None) as resp:
+            if resp.status_code >= 400:
+                raise DockerError(resp.status_code, (await resp.aread()).decode("utf-8", "replace"))
+            async for line in resp.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+# ----------------------------
+# Supervisor
+# ----------------------------
+class ContainerRecord:
+    """What we know about one running container we started."""
+
+    def __init__(self, container_id: str, labels: dict):
+        self.container_id = container_id
+        self.task_id = int(labels[LABEL_TASK]) if labels.get(LABEL_TASK) else None
+        self.mode = labels.get(LABEL_MODE) or "execute"
+        self.worker_id = labels.get(LABEL_WORKER)
+        self.run_id: int | None = None
+        self.oom_killed = False
+        self.samples = 0
+        self.cpu_sum = 0.0
+        self.cpu_peak = 0.0
+        self.memory_peak = 0
+        self.last: dict | None = None
+
+    def add_sample(self, cpu_pct: float, memory: int):
+        self.samples += 1
+        self.cpu_sum += cpu_pct
+        self.cpu_peak = max(self.cpu_peak, cpu_pct)
+        self.memory_peak = max(self.memory_peak, memory)
+        self.last = {"cpu_pct": round(cpu_pct, 1), "memory_bytes": memory}
+
+    def to_dict(self) -> dict:
+        return {
+            "container_id": self.container_id[:12],
+            "task_id": self.task_id,
+            "mode": self.mode,
+            "worker_id": self.worker_id,
+            "samples": self.samples,
+            "cpu_avg_pct": round(self.cpu_sum / self.samples, 1) if self.samples else None,
+            "cpu_peak_pct": round(self.cpu_peak, 1),
+            "memory_peak_bytes": self.memory_peak,
+            "last": self.last,
+        }
+
+
+def _cpu_percent(stats: dict) -> float:
+    cpu, pre = stats.get("cpu_stats") or {}, stats.get("precpu_stats") or {}
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - pre.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - pre.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100.0
+
+
+def _memory_bytes(stats: dict) -> int:
+    mem = stats.get("memory_stats") or {}
+    usage = mem.get("usage", 0)
+    # Same as `docker stats`: page cache doesn't count (cgroup v2: inactive_file, v1: cache)
+    detail = mem.get("stats") or {}
+    return max(0, usage - detail.get("inactive_file", detail.get("cache", 0)))
+
+
+class DockerSupervisor:
+    """
+    Starts agent containers through the Docker Engine API and watches them.
+
+    - CPU / memory limits per job class (AGENT_EXECUTE_* / AGENT_PUSH_*)
+    - subscribes to the container events stream; on `die` it records the exit
+      code, removes the container (no zombies, no --rm races) and fails the
+      task if the agent exited without reporting a result
+    - samples CPU / memory every DOCKER_STATS_INTERVAL_SECONDS; the summary is
+      stored on the task's AgentRun row for capacity planning
+    - on startup (and after losing the events stream) reconciles with the
+      containers that exist, so exits during a backend restart aren't missed
+    """
+
+    def __init__(self):
+        self.api: DockerAPI | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._containers: dict[str, ContainerRecord] = {}
+        self._launching: set[str] = set()  # container names between create and start
+        self._background: list[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.api is not None
+
+    # ----------------------------
+    # Lifecycle (app startup / shutdown)
+    # ----------------------------
+    async def start(self):
+        mode = settings.DOCKER_SUPERVISOR
+        if mode in ("0", "false", "off", "no"):
+            return
+        if mode == "auto" and not os.path.exists(settings.DOCKER_SOCKET):
+            print(f"[docker] {settings.DOCKER_SOCKET} not found; using the docker CLI")
+            return
+        self.api = DockerAPI(settings.DOCKER_SOCKET, settings.DOCKER_API_VERSION)
+        self._loop = asyncio.get_running_loop()
+        try:
+            await self._reconcile()
+        except Exception as e:
+            print(f"[docker] initial reconcile failed: {e}")
+        self._background = [
+            asyncio.create_task(self._watch_events()),
+            asyncio.create_task(self._sample_stats()),
+        ]
+
+    async def stop(self):
+        for t in self._background:
+            t.cancel()
+        self._background = []
+        if self.api:
+            await self.api.close()
+            self.api = None
+        self._loop = None
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "containers": [r.to_dict() for r in self._containers.values()]}
+
+    def live_usage(self, task_id: int) -> dict | None:
+        for rec in self._containers.values():
+            if rec.task_id == task_id:
+                return rec.to_dict()
+        return None
+
+    # ----------------------------
+    # Launch
+    # ----------------------------
+    def launch_threadsafe(self, name: str, image: str, env: dict, labels: dict, job_class: str) -> str:
+        """launch() for sync callers (the queue dispatcher thread)."""
+        fut = asyncio.run_coroutine_threadsafe(self.launch(name, image, env, labels, job_class), self._loop)
+        try:
+            return fut.result(timeout=60)
+        except BaseException:
+            # The caller fails the task; make sure no container starts for it
+            fut.cancel()
+            raise
+
+    async def launch(self, name: str, image: str, env: dict, labels: dict, job_class: str) -> str:
+        cpus, memory = limits_for(job_class)
+        labels = {LABEL_MANAGED: "1", LABEL_MODE: job_class, **{k: str(v) for k, v in labels.items()}}
+        env = {**agent_cache_env(), **env}
+        config = {
+            "Image": image,
+            "Env": [f"{k}={v}" for k, v in env.items()],
+            "Labels": labels,
+            "HostConfig": {
+                "NanoCpus": int(cpus * 1e9),
+                "Memory": memory,
+                "MemorySwap": memory,  # no swap on top of the limit
+                "ExtraHosts": ["host.docker.internal:host-gateway"],
+                "Binds": agent_mounts(),
+            },
+        }
+        self._launching.add(name)
+        container_id = None
+        try:
+            container_id = await self.api.create(name, config)
+            rec = ContainerRecord(container_id, labels)
+            self._containers[container_id] = rec
+            if rec.task_id is not None:
+                # Not run_blocking: the dispatcher thread waiting on us may hold a slot of that pool
+                rec.run_id = await asyncio.to_thread(_insert_run, rec.task_id, job_class, container_id, cpus, memory)
+            await self.api.start(container_id)
+        except BaseException:
+            # Failed or cancelled (launch_threadsafe timed out): don't leave it behind
+            if container_id is not None:
+                self._containers.pop(container_id, None)
+                try:
+                    await self.api.remove(container_id)
+                except Exception:
+                    pass
+            raise
+        finally:
+            self._launching.discard(name)
+        return container_id
+
+    async def remove(self, container_id: str):
+        self._containers.pop(container_id, None)
+        try:
+            await self.api.remove(container_id)
+        except DockerError:
+            pass
+
+    # ----------------------------
+    # Events / exits
+    # ----------------------------
+    async def _watch_events(self):
+        backoff = 1.0
+        filters = {"type": ["container"], "label": [f"{LABEL_MANAGED}=1"]}
+        while True:
+            try:
+                async for event in self.api.events(filters):
+                    backoff = 1.0
+                    await self._on_event(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[docker] events stream lost: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+            try:
+                # Pick up anything that exited while we weren't listening
+                await self._reconcile()
+            except Exception as e:
+                print(f"[docker] reconcile failed: {e}")
+
+    async def _on_event(self, event: dict):
+        action = event.get("Action") or event.get("status") or ""
+        actor = event.get("Actor") or {}
+        container_id = actor.get("ID") or event.get("id")
+        attrs = actor.get("Attributes") or {}
+        if not container_id:
+            return
+        if action == "oom":
+            rec = self._containers.get(container_id)
+            if rec:
+                rec.oom_killed = True
+        elif action == "die":
+            try:
+                exit_code = int(attrs.get("exitCode"))
+            except (TypeError, ValueError):
+                exit_code = None
+            await self._finish(container_id, exit_code, attrs)
+
+    async def _finish(self, container_id: str, exit_code: int | None, labels: dict):
+        rec = self._containers.pop(container_id, None) or ContainerRecord(container_id, labels)
+        try:
+            state = (await self.api.inspect(container_id)).get("State") or {}
+            rec.oom_killed = rec.oom_killed or bool(state.get("OOMKilled"))
+            if exit_code is None:
+                exit_code = state.get("ExitCode")
+        except DockerError:
+            pass
+        try:
+            await self.api.remove(container_id)
+        except DockerError:
+            pass
+
+        task_id, mode = rec.task_id, rec.mode
+        if rec.worker_id:
+            # A warm worker died; fail whatever it was running (avoid import cycle)
+            from backend.services.worker_pool import worker_pool
+            busy = worker_pool.container_exited(rec.worker_id)
+            task_id, mode = busy if busy else (None, mode)
+        await run_blocking(_record_exit, rec, task_id, mode, exit_code)
+
+    async def _reconcile(self):
+        seen = set()
+        for c in await self.api.list(f"{LABEL_MANAGED}=1"):
+            container_id, labels = c["Id"], c.get("Labels") or {}
+            seen.add(container_id)
+            if any(n.lstrip("/") in self._launching for n in c.get("Names") or []):
+                continue  # launch() is still between create and start
+            if c.get("State") == "running":
+                # Adopt containers started before a backend restart
+                self._containers.setdefault(container_id, ContainerRecord(container_id, labels))
+            else:
+                await self._finish(container_id, None, labels)
+        for container_id in [cid for cid in self._containers if cid not in seen]:
+            # Removed behind our back
+            await self._finish(container_id, None, {})
+
+    # ----------------------------
+    # Stats
+    # ----------------------------
+    async def _sample_stats(self):
+        while True:
+            await asyncio.sleep(settings.DOCKER_STATS_INTERVAL_SECONDS)
+            records = list(self._containers.values())
+            await asyncio.gather(*(self._sample(rec) for rec in records), return_exceptions=True)
+
+    async def _sample(self, rec: ContainerRecord):
+        stats = await self.api.stats(rec.container_id)
+        if stats.get("read", "").startswith("0001-"):
+            return  # container already gone
+        rec.add_sample(_cpu_percent(stats), _memory_bytes(stats))
+
+
+# ----------------------------
+# DB side (runs in the blocking pool)
+# ----------------------------
+def _insert_run(task_id: int, mode: str, container_id: str, cpus: float, memory: int) -> int:
+    db = SessionLocal()
+    try:
+        run = AgentRun(
+            task_id=task_id,
+            mode=mode,
+            container_id=container_id,
+            cpu_limit=cpus,
+            memory_limit_bytes=memory,
+        )
+        db.add(run)
+        db.commit()
+        return run.id
+    finally:
+        db.close()
+
+
+def _record_exit(rec: ContainerRecord, task_id: int | None, mode: str, exit_code: int | None):
+    db = SessionLocal()
+    try:
+        run = None
+        if rec.run_id is not None:
+            run = db.query(AgentRun).filter(AgentRun.id == rec.run_id).first()
+        elif rec.task_id is not None:
+            # Adopted after a restart: find the open row by container id
+            run = (
+                db.query(AgentRun)
+                .filter(AgentRun.container_id == rec.container_id, AgentRun.finished_at.is_(None))
+                .first()
+            )
+        if run:
+            run.finished_at = datetime.utcnow()
+            run.exit_code = exit_code
+            run.oom_killed = rec.oom_killed
+            run.samples = rec.samples
+            if rec.samples:
+                run.cpu_avg_pct = rec.cpu_sum / rec.samples
+                run.cpu_peak_pct = rec.cpu_peak
+                run.memory_peak_bytes = rec.memory_peak
+            db.commit()
+
+        if task_id is None:
+            return
+
+        from backend.services.task_queue import RUN_STATUS  # task_queue -> orchestrator imports us
+
+        task = db.query(Task).filter(Task.id == task_id).first()
+        # Still in its run status after the container is gone: orphaned
+        if task and task.status == RUN_STATUS.get(mode):
+            # The agent is gone but never reported a result
+            reason = f"Agent container exited with code {exit_code}"
+            if rec.oom_killed:
+                reason += " (killed: out of memory)"
+            task.status = "FAILED"
+            db.commit()
+            append_log_line(db, task_id, f"[SUPERVISOR] {reason} before reporting a result", level="ERROR")
+        elif rec.samples:
+            append_log_line(
+                db,
+                task_id,
+                f"[SUPERVISOR] agent exited ({exit_code}); peak memory {rec.memory_peak // (1024 * 1024)} MiB, "
+                f"avg CPU {rec.cpu_sum / rec.samples:.0f}%",
+            )
+    finally:
+        db.close()
+
+    from backend.services.task_queue import kick  # avoid import cycle
+    kick()
+
+
+docker_supervisor = DockerSupervisor()
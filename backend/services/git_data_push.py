@@ -0,0 +1,210 @@
+# backend/services/git_data_push.py
+import re
+
+from backend.github_client import GitHubClient
+
+
+class PatchError(Exception):
+    """The backend can't apply this diff itself (the push container is used instead)."""
+
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# Things `git apply` handles that we deliberately don't
+_UNSUPPORTED = ("GIT binary patch", "Binary files ", "rename from ", "copy from ", "old mode ", "new mode ")
+
+
+class Hunk:
+    def __init__(self, old_start: int, old_count: int):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.lines: list[tuple[str, str]] = []  # (" " / "-" / "+", text incl. newline)
+
+    def old_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op in (" ", "-")]
+
+    def new_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op in (" ", "+")]
+
+
+class FilePatch:
+    def __init__(self, path: str):
+        self.path = path
+        self.new_file = False
+        self.deleted = False
+        self.mode: str | None = None  # only known for new files
+        self.hunks: list[Hunk] = []
+
+
+def _split_lines(text: str) -> list[str]:
+    """Split on "\\n" only, keeping the newline (str.splitlines also splits on \\r, \\x0c, ...)."""
+    return re.findall(r"[^\n]*\n|[^\n]+$", text)
+
+
+def _strip_prefix(path: str) -> str:
+    if path.startswith('"'):
+        raise PatchError(f"quoted path not supported: {path}")
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def parse_diff(diff_text: str) -> list[FilePatch]:
+    """Parse `git diff` output into per-file hunks."""
+    files: list[FilePatch] = []
+    current: FilePatch | None = None
+    hunk: Hunk | None = None
+
+    for line in _split_lines(diff_text):
+        body = line.rstrip("\n")
+        if body.startswith("diff --git "):
+            current, hunk = None, None
+            m = re.match(r"^diff --git (\S+) (\S+)$", body)
+            if not m:
+                raise PatchError(f"can't parse header: {body}")
+            current = FilePatch(_strip_prefix(m.group(2)))
+            files.append(current)
+            continue
+        if current is None:
+            continue
+        if hunk is None or not body or body[0] not in " -+\\":
+            if body.startswith(_UNSUPPORTED):
+                raise PatchError(f"{current.path}: {body}")
+            if body.startswith("new file mode "):
+                current.new_file = True
+                current.mode = body[len("new file mode "):].strip()
+            elif body.startswith("deleted file mode "):
+                current.deleted = True
+            elif body.startswith("+++ ") and body[4:] != "/dev/null":
+                current.path = _strip_prefix(body[4:].split("\t")[0])
+            m = _HUNK_RE.match(body)
+            if m:
+                old_count = int(m.group(2)) if m.group(2) is not None else 1
+                hunk = Hunk(int(m.group(1)), old_count)
+                current.hunks.append(hunk)
+            continue
+        if body.startswith("\\"):
+            # "\ No newline at end of file" belongs to the previous line
+            if hunk.lines:
+                op, text = hunk.lines[-1]
+                hunk.lines[-1] = (op, text[:-1] if text.endswith("\n") else text)
+            continue
+        hunk.lines.append((body[0], line[1:]))
+    return files
+
+
+def apply_hunks(original: str, hunks: list[Hunk]) -> str:
+    """
+    Apply hunks to `original`. Like `git apply`, a hunk whose context moved is
+    searched for at the nearest offset; anything that doesn't match exactly
+    raises PatchError.
+    """
+    lines = _split_lines(original)
+    out: list[str] = []
+    pos = 0  # next unconsumed line of `lines`
+    for hunk in hunks:
+        old = hunk.old_lines()
+        # -N,0 means "insert after line N"
+        want = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+        at = _find(lines, old, max(want, pos), pos)
+        if at is None:
+            raise PatchError(f"hunk @@ -{hunk.old_start},{hunk.old_count} @@ does not apply")
+        out.extend(lines[pos:at])
+        out.extend(hunk.new_lines())
+        pos = at + len(old)
+    out.extend(lines[pos:])
+    return "".join(out)
+
+
+def _find(lines: list[str], block: list[str], want: int, lowest: int) -> int | None:
+    last = len(lines) - len(block)
+    for delta in range(len(lines) + 1):
+        for at in (want + delta, want - delta) if delta else (want,):
+            if lowest <= at <= last and lines[at:at + len(block)] == block:
+                return at
+    return None
+
+
+# ----------------------------
+# Publishing through the Git Data API
+# ----------------------------
+async def _tree_entry(client: GitHubClient, owner: str, repo: str, root_tree: str, path: str, trees: dict) -> dict | None:
+    """Tree entry (mode, sha) for `path`, walking one directory level per request."""
+    tree_sha = root_tree
+    parts = path.split("/")
+    for i, name in enumerate(parts):
+        if tree_sha not in trees:
+            data = await client.get_git_tree(owner, repo, tree_sha)
+            trees[tree_sha] = {e["path"]: e for e in data.get("tree", [])}
+        entry = trees[tree_sha].get(name)
+        if entry is None:
+            return None
+        if i == len(parts) - 1:
+            return entry
+        if entry["type"] != "tree":
+            return None
+        tree_sha = entry["sha"]
+    return None
+
+
+async def push_diff(
+    client: GitHubClient,
+    repo_full_name: str,
+    base_commit_sha: str,
+    branch: str,
+    diff_text: str,
+    message: str,
+) -> dict:
+    """
+    Publish `diff_text` as one commit on `branch` without a checkout.
+
+    The diff is applied on the branch's current head when it already exists on
+    GitHub (like the push container, which checks out origin/<branch>), or on
+    base_commit_sha otherwise. Raises PatchError for diffs we can't apply here.
+    """
+    owner, repo = repo_full_name.split("/", 1)
+    files = parse_diff(diff_text)
+
+    head = await client.get_branch_head(owner, repo, branch)
+    parent = head or base_commit_sha
+    if not files:
+        if head is None:
+            await client.set_branch_head(owner, repo, branch, parent, exists=False)
+        return {"commit_sha": parent, "parent_sha": parent, "files": [], "created": head is None}
+
+    parent_tree = (await client.get_git_commit(owner, repo, parent))["tree"]["sha"]
+    trees: dict = {}
+    entries = []
+    for fp in files:
+        entry = await _tree_entry(client, owner, repo, parent_tree, fp.path, trees)
+        if fp.new_file:
+            if entry is not None:
+                raise PatchError(f"{fp.path}: new file already exists")
+            original = ""
+            mode = fp.mode or "100644"
+        else:
+            if entry is None or entry["type"] != "blob":
+                raise PatchError(f"{fp.path}: not found at {parent[:12]}")
+            if entry["mode"] == "120000":
+                raise PatchError(f"{fp.path}: symlinks not supported")
+            try:
+                original = (await client.get_git_blob(owner, repo, entry["sha"])).decode("utf-8")
+            except UnicodeDecodeError:
+                raise PatchError(f"{fp.path}: not UTF-8 text")
+            mode = entry["mode"]
+
+        updated = apply_hunks(original, fp.hunks)
+        if fp.deleted:
+            if updated:
+                raise PatchError(f"{fp.path}: deletion leaves content behind")
+            entries.append({"path": fp.path, "mode": mode, "type": "blob", "sha": None})
+            continue
+        blob_sha = await client.create_git_blob(owner, repo, updated.encode("utf-8"))
+        entries.append({"path": fp.path, "mode": mode, "type": "blob", "sha": blob_sha})
+
+    tree_sha = await client.create_git_tree(owner, repo, parent_tree, entries)
+    commit_sha = await client.create_git_commit(owner, repo, message, tree_sha, [parent])
+    await client.set_branch_head(owner, repo, branch, commit_sha, exists=head is not None)
+    return {
+        "commit_sha": commit_sha,
+        "parent_sha": parent,
+        "files": [fp.path for fp in files],
+        "created": head is None,
+    }
@@ -0,0 +1,96 @@
+# backend/services/github_list_index.py
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+
+from backend.core.config import settings
+
+
+class NameIndex:
+    """
+    Searchable in-memory copy of a repo or branch list.
+
+    Names are kept lower-cased and sorted, so prefix lookups are a bisect
+    instead of a scan. Each item can have several search keys (e.g. a repo is
+    found by "owner/repo" and by "repo").
+    """
+
+    def __init__(self, items: list, keys_for):
+        self.items = items
+        self.built_at = time.monotonic()
+        # (lower-cased key, item position), sorted by key
+        pairs = sorted((k.lower(), i) for i, item in enumerate(items) for k in keys_for(item))
+        self._keys = [k for k, _ in pairs]
+        self._pos = [i for _, i in pairs]
+
+    def search(self, q: str | None, limit: int | None = None) -> list:
+        """Prefix matches first (in name order), then substring matches."""
+        if not q:
+            return self.items[:limit] if limit else list(self.items)
+
+        q = q.lower()
+        seen: set[int] = set()
+        out = []
+
+        start = bisect.bisect_left(self._keys, q)
+        for j in range(start, len(self._keys)):
+            if not self._keys[j].startswith(q):
+                break
+            if self._pos[j] not in seen:
+                seen.add(self._pos[j])
+                out.append(self.items[self._pos[j]])
+                if limit and len(out) >= limit:
+                    return out
+
+        for key, pos in zip(self._keys, self._pos):
+            if pos not in seen and q in key:
+                seen.add(pos)
+                out.append(self.items[pos])
+                if limit and len(out) >= limit:
+                    break
+        return out
+
+
+# (user_id, kind, scope) -> NameIndex, least recently used first
+_INDEXES: OrderedDict[tuple, NameIndex] = OrderedDict()
+_LOCKS: dict[tuple, asyncio.Lock] = {}
+
+
+def _prune():
+    """Drop expired indexes, then the least recently used beyond GITHUB_LIST_INDEX_MAX_ENTRIES."""
+    now = time.monotonic()
+    for key in [k for k, idx in _INDEXES.items() if now - idx.built_at >= settings.GITHUB_LIST_INDEX_TTL_SECONDS]:
+        del _INDEXES[key]
+    while len(_INDEXES) > settings.GITHUB_LIST_INDEX_MAX_ENTRIES:
+        _INDEXES.popitem(last=False)
+    for key in [k for k, lock in _LOCKS.items() if k not in _INDEXES and not lock.locked()]:
+        del _LOCKS[key]
+
+
+async def get_index(key: tuple, load, keys_for) -> NameIndex:
+    """
+    Return the index for `key`, rebuilding it with `await load()` when it is
+    older than GITHUB_LIST_INDEX_TTL_SECONDS. Concurrent callers share one rebuild.
+    """
+    index = _INDEXES.get(key)
+    if index and time.monotonic() - index.built_at < settings.GITHUB_LIST_INDEX_TTL_SECONDS:
+        _INDEXES.move_to_end(key)
+        return index
+
+    lock = _LOCKS.setdefault(key, asyncio.Lock())
+    async with lock:
+        index = _INDEXES.get(key)
+        if index and time.monotonic() - index.built_at < settings.GITHUB_LIST_INDEX_TTL_SECONDS:
+            return index
+        index = NameIndex(await load(), keys_for)
+        _INDEXES[key] = index
+        _INDEXES.move_to_end(key)
+    _prune()
+    return index
+
+
+def invalidate_user(user_id: int):
+    """Drop every cached list for a user (e.g. after they log in with a new token)."""
+    for key in [k for k in _INDEXES if k[0] == user_id]:
+        del _INDEXES[key]
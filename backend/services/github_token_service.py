@@ -1,11 +1,76 @@
 # backend/services/github_token_service.py
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
 from backend.core.db import SessionLocal
 from backend.models import GitHubToken
 
-def get_token_for_user(user_id: int) -> str | None:
-    db = SessionLocal()
+# user_id -> (access_token, cached_at monotonic). "No token" is never cached, so a
+# user who logs in right after a miss is seen at once.
+# Per process: store_github_token() writes through to this cache, and the TTL
+# bounds how stale another worker process can be after a re-login.
+_TOKEN_CACHE: dict[int, tuple[str, float]] = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def cache_token(user_id: int, access_token: str | None):
+    """Write-through: called right after a token is stored in the DB."""
+    if not access_token:
+        invalidate_token(user_id)
+        return
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[user_id] = (access_token, time.monotonic())
+
+
+def invalidate_token(user_id: int):
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE.pop(user_id, None)
+
+
+def _cached(user_id: int) -> tuple[bool, str | None]:
+    with _TOKEN_CACHE_LOCK:
+        hit = _TOKEN_CACHE.get(user_id)
+    if hit and time.monotonic() - hit[1] < settings.GITHUB_TOKEN_CACHE_TTL_SECONDS:
+        return True, hit[0]
+    return False, None
+
+
+def get_token_for_user(user_id: int, db: Session | None = None) -> str | None:
+    """Return the user's GitHub token, from the in-process cache when fresh.
+
+    Pass the request's `db` session to avoid checking out a second pooled
+    connection on a cache miss.
+    """
+    found, token = _cached(user_id)
+    if found:
+        return token
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
     try:
-        token_obj = db.query(GitHubToken).filter(GitHubToken.user_id == user_id).first()
-        return token_obj.access_token if token_obj else None
+        row = db.query(GitHubToken.access_token).filter(GitHubToken.user_id == user_id).first()
+        token = row[0] if row else None
     finally:
-        db.close()
+        if own_session:
+            db.close()
+
+    cache_token(user_id, token)
+    return token
+
+
+async def get_token_for_user_async(user_id: int, db: AsyncSession) -> str | None:
+    """Same as get_token_for_user, for async routes (uses the request's AsyncSession)."""
+    found, token = _cached(user_id)
+    if found:
+        return token
+
+    row = (await db.execute(select(GitHubToken.access_token).where(GitHubToken.user_id == user_id))).first()
+    token = row[0] if row else None
+    cache_token(user_id, token)
+    return token
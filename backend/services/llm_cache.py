@@ -0,0 +1,105 @@
+# backend/services/llm_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from backend.core.config import settings
+
+
+def git_blob_sha(text: str | None) -> str:
+    """SHA-1 of `text` as a git blob (same as `git hash-object`)."""
+    data = (text or "").encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def llm_cache_key(model: str, instructions: str, prompt: str, blob_sha: str) -> str:
+    """
+    Cache key for one LLM call. The agent computes the same key in
+    agent/llm_cache.py, so keep the two in sync.
+    """
+    h = hashlib.sha256()
+    for part in (model, instructions, prompt, blob_sha):
+        data = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        h.update(b"%d:" % len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+class _Entry:
+    def __init__(self, model: str, output: str):
+        self.model = model
+        self.output = output
+        self.size = len(output.encode("utf-8"))
+        self.stored_at = time.monotonic()
+
+
+class LLMResponseCache:
+    """
+    Bounded LRU + TTL cache of LLM outputs, keyed by llm_cache_key().
+
+    Used by plan generation and, over HTTP (/llm-cache), by the agent's file
+    rewrite. Bounded by entry count and total output bytes; entries older
+    than `ttl_seconds` are dropped on lookup.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        # Sync routes run in the threadpool, so guard the dict
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl_seconds:
+                self._drop(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry.output
+
+    def put(self, key: str, model: str, output: str):
+        entry = _Entry(model, output)
+        if entry.size > self.max_bytes:
+            return  # would evict everything else
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def _drop(self, key: str):
+        # Caller holds self._lock
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+llm_cache = LLMResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+)
@@ -1,39 +1,91 @@
 # backend/services/orchestrator.py
+import json
 import os
 import subprocess
+import threading
+import uuid
 import base64
+from backend.core.config import settings
+from backend.services.docker_supervisor import docker_supervisor, limits_for, agent_mounts, agent_cache_env, LABEL_TASK
 from backend.models import Task
 from backend.services.github_token_service import get_token_for_user
+from backend.services.worker_pool import worker_pool
 
 def build_repo_url(repo_full_name: str) -> str:
     return f"https://github.com/{repo_full_name}.git"
 
-def start_task_container(task: Task, user, mode:str = "execute"):
-    token = get_token_for_user(user.id)
+def build_assignment(task: Task, token: str, mode: str) -> dict:
+    """Everything the agent needs for one run (env vars for a cold container, JSON for a warm worker)."""
+    return {
+        "task_id": task.id,
+        "mode": mode,
+        "repo_url": build_repo_url(task.repo_full_name),
+        "repo_full_name": task.repo_full_name,
+        "branch": task.branch,
+        "prompt": task.prompt or "",
+        "target_file": task.target_file or "",
+        "target_files": task.targets,
+        "work_branch": task.work_branch or "",
+        "github_token": token,
+        "checkout_mode": settings.AGENT_CHECKOUT_MODE,
+        "test_scope": settings.AGENT_TEST_SCOPE,
+    }
+
+def start_task_container(task: Task, user, mode:str = "execute", db=None):
+    token = get_token_for_user(user.id, db)
     if not token:
         raise RuntimeError(f"No GitHub access token found for user_id={user.id}. Please login again.")
 
-    repo_url = build_repo_url(task.repo_full_name)
-
-    prompt_b64 = base64.b64encode((task.prompt or "").encode("utf-8")).decode("ascii")
-    target_b64 = base64.b64encode((task.target_file or "").encode("utf-8")).decode("ascii")
-
-    cmd = [
-        "docker", "run", "--rm",
-        "-e", f"TASK_ID={task.id}",
-        "-e", f"REPO_URL={repo_url}",
-        "-e", f"BRANCH={task.branch}",
-        "-e", f"TASK_PROMPT_B64={prompt_b64}",
-        "-e", f"TARGET_FILE_B64={target_b64}",
-        "-e", "BACKEND_URL=http://host.docker.internal:8000",
-        "-e", f"GITHUB_TOKEN={token}",
-        "-e", f"MODE={mode}",
-        "-e", f"REPO_FULL_NAME={task.repo_full_name}",
-        "-e", f"OPENAI_API_KEY={os.getenv('OPENAI_API_KEY','')}",
+    assignment = build_assignment(task, token, mode)
+
+    if worker_pool.enabled:
+        # A warm worker picks this up from its long-poll; no container start
+        print(f"Queued task {task.id} mode={mode} for the warm agent pool")
+        worker_pool.submit(assignment)
+        return
+
+    prompt_b64 = base64.b64encode(assignment["prompt"].encode("utf-8")).decode("ascii")
+    target_b64 = base64.b64encode(assignment["target_file"].encode("utf-8")).decode("ascii")
+    targets_b64 = base64.b64encode(json.dumps(assignment["target_files"]).encode("utf-8")).decode("ascii")
+
+    env = {
+        "TASK_ID": task.id,
+        "REPO_URL": assignment["repo_url"],
+        "BRANCH": task.branch,
+        "TASK_PROMPT_B64": prompt_b64,
+        "TARGET_FILE_B64": target_b64,
+        "TARGET_FILES_B64": targets_b64,
+        "LLM_CONCURRENCY": settings.AGENT_LLM_CONCURRENCY,
+        "TEST_WORKERS": settings.AGENT_TEST_WORKERS,
+        "BACKEND_URL": settings.AGENT_BACKEND_URL,
+        # Authenticates writes to the LLM cache
+        "WORKER_TOKEN": settings.AGENT_WORKER_TOKEN,
+        "GITHUB_TOKEN": token,
+        "MODE": mode,
+        "REPO_FULL_NAME": task.repo_full_name,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
         # Pass work branch when available (used by push mode)
-        "-e", f"WORK_BRANCH={task.work_branch or ''}",
-        "jules-agent:dev",
-    ]
+        "WORK_BRANCH": task.work_branch or "",
+        "CHECKOUT_MODE": assignment["checkout_mode"],
+        "TEST_SCOPE": assignment["test_scope"],
+    }
 
     print(f"Starting Docker container for task: {task.id} mode={mode} work_branch={task.work_branch}")
-    subprocess.Popen(cmd)
+
+    if docker_supervisor.enabled:
+        # Engine API: per-class cpu/memory limits, exit tracking and stats
+        name = f"jules-task-{task.id}-{mode}-{uuid.uuid4().hex[:6]}"
+        docker_supervisor.launch_threadsafe(name, settings.AGENT_IMAGE, env, {LABEL_TASK: task.id}, mode)
+        return
+
+    cpus, memory = limits_for(mode)
+    cmd = ["docker", "run", "--rm", "--cpus", str(cpus), "--memory", str(memory)]
+    for mount in agent_mounts():
+        cmd += ["-v", mount]
+    for k, v in {**agent_cache_env(), **env}.items():
+        cmd += ["-e", f"{k}={v}"]
+    cmd.append(settings.AGENT_IMAGE)
+
+    proc = subprocess.Popen(cmd)
+    # Reap the CLI process when it exits so it doesn't linger as a zombie
+    threading.Thread(target=proc.wait, name=f"reap-task-{task.id}", daemon=True).start()
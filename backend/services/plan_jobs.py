@@ -0,0 +1,171 @@
+# backend/services/plan_jobs.py
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from backend.core.db import AsyncSessionLocal
+from backend.github_client import GitHubClient
+from backend.models import Task
+from backend.services.github_token_service import get_token_for_user_async
+from backend.services.llm_cache import llm_cache
+from backend.services.planner import build_plan_messages, generate_plan_text, plan_cache_key, plan_model
+from backend.services.task_log_service import append_log_line_async
+
+# How many finished jobs to remember for status lookups
+_MAX_FINISHED_JOBS = 500
+
+
+class PlanJob:
+    """One background plan generation (PENDING -> RUNNING -> SUCCEEDED / FAILED / CANCELLED)."""
+
+    def __init__(self, task_id: int, key: str, previous_status: str):
+        self.id = uuid.uuid4().hex
+        self.task_id = task_id
+        self.key = key
+        self.previous_status = previous_status
+        self.status = "PENDING"
+        self.error: str | None = None
+        self.cached = False  # plan came from the LLM response cache
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "task_id": self.task_id,
+            "status": self.status,
+            "error": self.error,
+            "cached": self.cached,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# job id -> job (bounded; oldest finished jobs are dropped)
+_JOBS: OrderedDict[str, PlanJob] = OrderedDict()
+# single-flight key -> running job
+_INFLIGHT: dict[str, PlanJob] = {}
+# strong refs so running asyncio tasks aren't garbage collected
+_RUNNERS: set[asyncio.Task] = set()
+
+
+def plan_key(task_id: int, prompt: str, target_file: str) -> str:
+    raw = f"{task_id}\0{prompt}\0{target_file}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_job(job_id: str) -> PlanJob | None:
+    return _JOBS.get(job_id)
+
+
+def inflight_job(task_id: int, prompt: str, target_file: str) -> PlanJob | None:
+    job = _INFLIGHT.get(plan_key(task_id, prompt, target_file))
+    if job is not None and not job.done.is_set():
+        return job
+    return None
+
+
+def start_plan_job(
+    task_id: int, prompt: str, target_file: str, previous_status: str, user_id: int, openai_key: str, force: bool = False
+) -> tuple[PlanJob, bool]:
+    """
+    Start generating a plan for the task in the background.
+
+    Returns (job, coalesced). If a job for the same task, prompt and target file
+    is already running, that job is returned instead of starting a second LLM call.
+    `force` (an explicit re-plan) skips the LLM response cache.
+    """
+    running = inflight_job(task_id, prompt, target_file)
+    if running is not None:
+        return running, True
+
+    key = plan_key(task_id, prompt, target_file)
+    job = PlanJob(task_id, key, previous_status=previous_status)
+    _INFLIGHT[key] = job
+    _JOBS[job.id] = job
+    while len(_JOBS) > _MAX_FINISHED_JOBS:
+        oldest_id, oldest = next(iter(_JOBS.items()))
+        if not oldest.done.is_set():
+            break
+        del _JOBS[oldest_id]
+
+    runner = asyncio.create_task(_run(job, user_id, openai_key, force))
+    _RUNNERS.add(runner)
+    runner.add_done_callback(_RUNNERS.discard)
+    return job, False
+
+
+async def _run(job: PlanJob, user_id: int, openai_key: str, force: bool = False):
+    job.status = "RUNNING"
+    try:
+        async with AsyncSessionLocal() as db:
+            task = (await db.execute(select(Task).where(Task.id == job.task_id))).scalar_one_or_none()
+            if not task:
+                raise RuntimeError("Task not found")
+            repo_full_name, branch = task.repo_full_name, task.branch
+            targets, prompt = task.targets, task.prompt
+            token = await get_token_for_user_async(user_id, db)
+            # Release the connection while waiting on GitHub and the LLM
+            await db.commit()
+
+        # Fetch target file contents from GitHub (if possible), all files at once
+        target_file = ", ".join(targets)
+        file_content = None
+        if token:
+            owner, repo = repo_full_name.split("/", 1)
+            gh = GitHubClient(token, priority="low")
+            contents = await asyncio.gather(
+                *(gh.get_file(owner, repo, path, ref=branch) for path in targets),
+                return_exceptions=True,
+            )
+            contents = [None if isinstance(c, BaseException) else c for c in contents]
+            if len(targets) == 1:
+                file_content = contents[0]
+            elif any(contents):
+                file_content = "\n\n".join(f"--- {path} ---\n{c or '(could not fetch)'}" for path, c in zip(targets, contents))
+
+        model = plan_model()
+        cache_key = plan_cache_key(model, repo_full_name, branch, target_file, prompt, file_content)
+        # A forced re-plan asks for a fresh answer; it still refreshes the cache
+        plan_text = None if force else llm_cache.get(cache_key)
+        job.cached = plan_text is not None
+        if plan_text is None:
+            messages = build_plan_messages(repo_full_name, branch, target_file, prompt, file_content)
+            plan_text = await generate_plan_text(openai_key, model, messages)
+            llm_cache.put(cache_key, model, plan_text)
+
+        async with AsyncSessionLocal() as db:
+            task = (await db.execute(select(Task).where(Task.id == job.task_id))).scalar_one_or_none()
+            if not task or task.status != "PLANNING":
+                # Cancelled (or deleted) while the plan was generated: don't bring it back
+                job.status = "CANCELLED"
+                return
+            # Save plan and mark ready for approval
+            task.plan_text = plan_text
+            task.plan_generated_by = f"openai:{model}"
+            task.status = "PLAN_READY"
+            await db.commit()
+        job.status = "SUCCEEDED"
+    except Exception as e:
+        job.status = "FAILED"
+        job.error = str(e)
+        try:
+            async with AsyncSessionLocal() as db:
+                task = (await db.execute(select(Task).where(Task.id == job.task_id))).scalar_one_or_none()
+                if task and task.status == "PLANNING":
+                    # Put the task back where it was so the user can retry
+                    task.status = job.previous_status
+                    await db.commit()
+                await append_log_line_async(db, job.task_id, f"[PLAN] Plan generation failed: {e}", level="ERROR")
+        except Exception:
+            pass
+    finally:
+        job.finished_at = time.time()
+        if _INFLIGHT.get(job.key) is job:
+            del _INFLIGHT[job.key]
+        job.done.set()
@@ -0,0 +1,99 @@
+# backend/services/planner.py
+import os
+
+from backend.core.blocking import run_blocking
+from backend.services.llm_cache import git_blob_sha, llm_cache_key
+
+
+class PlanError(Exception):
+    """The LLM could not produce a plan."""
+
+
+SYSTEM_PROMPT = (
+    "You are an assistant that writes concise, step-by-step implementation plans to modify a file in a repository. "
+    "Produce a clear numbered plan (1., 2., 3., ...). If file contents are provided, inspect them and highlight risky changes. "
+    "Keep the plan actionable and small — 5-12 steps."
+)
+
+
+def plan_model() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+
+def _plan_header(repo_full_name: str, branch: str, target_file: str, prompt: str) -> list[str]:
+    return [
+        f"Repo: {repo_full_name}",
+        f"Base branch: {branch}",
+        f"Target file: {target_file}",
+        "",
+        f"User prompt: {prompt}",
+    ]
+
+
+def plan_cache_key(model: str, repo_full_name: str, branch: str, target_file: str, prompt: str, file_content: str | None) -> str:
+    """LLM cache key for a plan: the request header plus the file's blob SHA."""
+    header = "\n".join(_plan_header(repo_full_name, branch, target_file, prompt))
+    return llm_cache_key(model, SYSTEM_PROMPT, header, git_blob_sha(file_content))
+
+
+def build_plan_messages(repo_full_name: str, branch: str, target_file: str, prompt: str, file_content: str | None) -> list[dict]:
+    user_lines = _plan_header(repo_full_name, branch, target_file, prompt)
+    if file_content:
+        # Truncate if very large
+        txt = file_content if len(file_content) < 10000 else file_content[:10000] + "\n... [truncated]"
+        user_lines += ["", "File content:", txt]
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": "\n".join(user_lines)},
+    ]
+
+
+def request_plan_from_llm(openai_key: str, model: str, messages: list[dict]) -> str:
+    """Blocking OpenAI call; use generate_plan_text() from async code."""
+    # Support both new (>1.0.0) OpenAI python client and the older interface
+    plan_text = None
+    last_err = None
+    try:
+        # New client: `from openai import OpenAI; client = OpenAI()`
+        from openai import OpenAI as OpenAIClient
+        client = OpenAIClient(api_key=openai_key)
+        resp = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=600,
+            temperature=0.2,
+        )
+        # Try a few ways to extract the assistant content
+        try:
+            plan_text = resp.choices[0].message.content
+        except Exception:
+            try:
+                plan_text = resp.choices[0]["message"]["content"]
+            except Exception:
+                plan_text = None
+    except Exception as e:
+        last_err = e
+
+    if not plan_text:
+        try:
+            # Fallback to older openai lib usage
+            import openai as old_openai
+            old_openai.api_key = openai_key
+            resp = old_openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                max_tokens=600,
+                temperature=0.2,
+            )
+            plan_text = resp["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            # Prefer the newer exception if present, otherwise the fallback's
+            raise PlanError(f"LLM request failed: {last_err or e}") from (last_err or e)
+
+    return plan_text
+
+
+async def generate_plan_text(openai_key: str, model: str, messages: list[dict]) -> str:
+    # The OpenAI SDK call blocks; keep it off the event loop
+    return await run_blocking(request_plan_from_llm, openai_key, model, messages)
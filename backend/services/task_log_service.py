@@ -0,0 +1,142 @@
+# backend/services/task_log_service.py
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.models import Task, TaskLogLine
+
+# How many times to retry when two writers race for the same seq number
+_APPEND_RETRIES = 5
+
+
+def append_log_line(db: Session, task_id: int, message: str, level: str = "INFO") -> int:
+    """Insert one log line and return its seq.
+
+    This is a single INSERT (plus an indexed MAX lookup), so the cost does not
+    grow with the size of the existing log.
+    """
+    last_err = None
+    for _ in range(_APPEND_RETRIES):
+        next_seq = (
+            db.query(func.coalesce(func.max(TaskLogLine.seq), 0))
+            .filter(TaskLogLine.task_id == task_id)
+            .scalar()
+        ) + 1
+        db.add(TaskLogLine(task_id=task_id, seq=next_seq, level=level, message=message))
+        try:
+            db.commit()
+            return next_seq
+        except IntegrityError as e:
+            # Someone else took this seq; read MAX again and retry
+            db.rollback()
+            last_err = e
+    raise RuntimeError(f"Could not append log line for task {task_id}") from last_err
+
+
+async def append_log_line_async(db: AsyncSession, task_id: int, message: str, level: str = "INFO") -> int:
+    """append_log_line for async routes."""
+    last_err = None
+    for _ in range(_APPEND_RETRIES):
+        last = (await db.execute(
+            select(func.coalesce(func.max(TaskLogLine.seq), 0)).where(TaskLogLine.task_id == task_id)
+        )).scalar()
+        next_seq = last + 1
+        db.add(TaskLogLine(task_id=task_id, seq=next_seq, level=level, message=message))
+        try:
+            await db.commit()
+            return next_seq
+        except IntegrityError as e:
+            await db.rollback()
+            last_err = e
+    raise RuntimeError(f"Could not append log line for task {task_id}") from last_err
+
+
+def append_log_batch(db: Session, task_id: int, stream: str, lines: list[dict]) -> dict:
+    """Insert a batch of writer-numbered lines in one transaction.
+
+    Each item in `lines` has `seq`, `message` and optionally `level`. Lines whose
+    (stream, seq) was already stored are skipped, so a writer can safely resend
+    a batch after a timeout.
+    """
+    last_err = None
+    for _ in range(_APPEND_RETRIES):
+        wanted = {item["seq"]: item for item in lines}
+        if wanted:
+            seen = {
+                s for (s,) in db.query(TaskLogLine.stream_seq).filter(
+                    TaskLogLine.task_id == task_id,
+                    TaskLogLine.stream == stream,
+                    TaskLogLine.stream_seq.in_(list(wanted)),
+                )
+            }
+        else:
+            seen = set()
+        fresh = [wanted[s] for s in sorted(wanted) if s not in seen]
+
+        if not fresh:
+            return {"accepted": 0, "duplicates": len(wanted), "last_seq": last_log_seq(db, task_id)}
+
+        next_seq = last_log_seq(db, task_id) + 1
+        for i, item in enumerate(fresh):
+            db.add(TaskLogLine(
+                task_id=task_id,
+                seq=next_seq + i,
+                level=item.get("level") or "INFO",
+                message=item["message"],
+                stream=stream,
+                stream_seq=item["seq"],
+            ))
+        try:
+            db.commit()
+            return {
+                "accepted": len(fresh),
+                "duplicates": len(wanted) - len(fresh),
+                "last_seq": next_seq + len(fresh) - 1,
+            }
+        except IntegrityError as e:
+            # Either a concurrent writer took our seq range or the same batch
+            # landed twice at once; re-read and try again
+            db.rollback()
+            last_err = e
+    raise RuntimeError(f"Could not append log batch for task {task_id}") from last_err
+
+
+def read_log_lines(db: Session, task_id: int, after_seq: int = 0, limit: int = 500) -> list[TaskLogLine]:
+    """Return up to `limit` lines with seq > after_seq, oldest first."""
+    return (
+        db.query(TaskLogLine)
+        .filter(TaskLogLine.task_id == task_id, TaskLogLine.seq > after_seq)
+        .order_by(TaskLogLine.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def last_log_seq(db: Session, task_id: int) -> int:
+    return (
+        db.query(func.coalesce(func.max(TaskLogLine.seq), 0))
+        .filter(TaskLogLine.task_id == task_id)
+        .scalar()
+    )
+
+
+def full_log_text(db: Session, task: Task) -> str:
+    """Compatibility view of the old `log_text` column.
+
+    Old rows may still have text in tasks.log_text; new lines live in
+    task_log_lines. Both are joined into one newline-terminated string.
+    """
+    return full_log_text_with_seq(db, task)[0]
+
+
+def full_log_text_with_seq(db: Session, task: Task) -> tuple[str, int]:
+    """full_log_text() plus the seq of its last line, read in one query so a
+    client tailing from that seq can't miss a line inserted in between."""
+    lines = (
+        db.query(TaskLogLine.seq, TaskLogLine.message)
+        .filter(TaskLogLine.task_id == task.id)
+        .order_by(TaskLogLine.seq)
+        .all()
+    )
+    text = (task.log_text or "") + "".join(m + "\n" for (_, m) in lines)
+    return text, lines[-1][0] if lines else 0
@@ -0,0 +1,243 @@
+# backend/services/task_queue.py
+import asyncio
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend.core.blocking import run_blocking
+from backend.core.config import settings
+from backend.core.db import SessionLocal
+from backend.models import Task, TaskQueueEntry, User
+from backend.services.orchestrator import start_task_container
+from backend.services.task_log_service import append_log_line
+
+# job class -> task status while its job waits for a slot, and while its agent runs
+# (the one place these live; docker_supervisor reads RUN_STATUS too)
+QUEUED_STATUS = {"execute": "QUEUED_FOR_EXECUTION", "push": "QUEUED_FOR_PUSH"}
+RUN_STATUS = {"execute": "RUNNING", "push": "PUSHING"}
+
+
+def _class_caps() -> dict[str, int]:
+    return {"execute": settings.TASK_QUEUE_MAX_EXECUTE, "push": settings.TASK_QUEUE_MAX_PUSH}
+
+
+def enqueue(db: Session, task: Task, job_class: str, priority: int = 0) -> TaskQueueEntry:
+    """Queue an agent run for `task` and park it in its class's queued status. Commits."""
+    entry = TaskQueueEntry(
+        task_id=task.id,
+        user_id=task.user_id,
+        repo_full_name=task.repo_full_name,
+        job_class=job_class,
+        priority=priority,
+    )
+    db.add(entry)
+    task.status = QUEUED_STATUS[job_class]
+    db.commit()
+    kick()
+    return entry
+
+
+def queue_position(db: Session, task_id: int) -> dict | None:
+    """Where the task's newest queue entry stands (position is 1-based among QUEUED jobs of its class)."""
+    entry = (
+        db.query(TaskQueueEntry)
+        .filter(TaskQueueEntry.task_id == task_id)
+        .order_by(TaskQueueEntry.id.desc())
+        .first()
+    )
+    if not entry:
+        return None
+    out = {
+        "job_class": entry.job_class,
+        "state": entry.state,
+        "priority": entry.priority,
+        "enqueued_at": entry.enqueued_at,
+        "started_at": entry.started_at,
+        "position": None,
+    }
+    if entry.state == "QUEUED":
+        ahead = (
+            db.query(func.count(TaskQueueEntry.id))
+            .filter(
+                TaskQueueEntry.state == "QUEUED",
+                TaskQueueEntry.job_class == entry.job_class,
+                or_(
+                    TaskQueueEntry.priority > entry.priority,
+                    and_(TaskQueueEntry.priority == entry.priority, TaskQueueEntry.id < entry.id),
+                ),
+            )
+            .scalar()
+        )
+        out["position"] = ahead + 1
+    return out
+
+
+# ----------------------------
+# Dispatch
+# ----------------------------
+def _reap(db: Session):
+    """Free the slots of jobs whose task has moved on (finished, failed, cancelled)."""
+    now = datetime.utcnow()
+    moved_on = or_(
+        *[
+            and_(
+                TaskQueueEntry.job_class == job_class,
+                TaskQueueEntry.task_id.in_(select(Task.id).where(Task.status != status)),
+            )
+            for job_class, status in RUN_STATUS.items()
+        ]
+    )
+    db.execute(
+        update(TaskQueueEntry)
+        .where(TaskQueueEntry.state == "RUNNING", moved_on)
+        .values(state="DONE", finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    # Queued jobs of tasks that were cancelled while waiting
+    left_queue = or_(
+        *[
+            and_(
+                TaskQueueEntry.job_class == job_class,
+                TaskQueueEntry.task_id.in_(select(Task.id).where(Task.status != status)),
+            )
+            for job_class, status in QUEUED_STATUS.items()
+        ]
+    )
+    db.execute(
+        update(TaskQueueEntry)
+        .where(TaskQueueEntry.state == "QUEUED", left_queue)
+        .values(state="DONE", finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def dispatch_once() -> int:
+    """
+    Start as many queued jobs as the caps allow. Returns how many were started.
+
+    Caps: TASK_QUEUE_MAX_RUNNING overall, TASK_QUEUE_MAX_EXECUTE / _PUSH per
+    job class, TASK_QUEUE_MAX_PER_USER (0 = none) and TASK_QUEUE_MAX_PER_REPO. Within a
+    class, higher priority first, then FIFO. A job whose user or repo is at its
+    cap is skipped (not blocking the ones behind it) and stays queued.
+    """
+    db = SessionLocal()
+    try:
+        _reap(db)
+
+        running = db.query(
+            TaskQueueEntry.job_class, TaskQueueEntry.user_id, TaskQueueEntry.repo_full_name
+        ).filter(TaskQueueEntry.state == "RUNNING").all()
+        by_class = Counter(r.job_class for r in running)
+        by_user = Counter(r.user_id for r in running)
+        by_repo = Counter(r.repo_full_name for r in running)
+        total = len(running)
+
+        started = []
+        for job_class, cap in _class_caps().items():
+            free = min(cap - by_class[job_class], settings.TASK_QUEUE_MAX_RUNNING - total)
+            if free <= 0:
+                continue
+
+            # Look past the free slots so a capped user/repo doesn't starve the rest.
+            # SKIP LOCKED: rows another dispatcher is handing out are simply passed over.
+            candidates = (
+                db.query(TaskQueueEntry)
+                .filter(TaskQueueEntry.state == "QUEUED", TaskQueueEntry.job_class == job_class)
+                .order_by(TaskQueueEntry.priority.desc(), TaskQueueEntry.id)
+                .limit(free * 4 + 10)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            now = datetime.utcnow()
+            for entry in candidates:
+                if free <= 0:
+                    break
+                if settings.TASK_QUEUE_MAX_PER_USER and by_user[entry.user_id] >= settings.TASK_QUEUE_MAX_PER_USER:
+                    continue
+                if by_repo[entry.repo_full_name] >= settings.TASK_QUEUE_MAX_PER_REPO:
+                    continue
+
+                task = db.query(Task).filter(Task.id == entry.task_id).first()
+                if not task or task.status != QUEUED_STATUS[job_class]:
+                    entry.state, entry.finished_at = "DONE", now
+                    continue
+
+                entry.state, entry.started_at = "RUNNING", now
+                task.status = RUN_STATUS[job_class]
+                by_class[job_class] += 1
+                by_user[entry.user_id] += 1
+                by_repo[entry.repo_full_name] += 1
+                total += 1
+                free -= 1
+                started.append(entry)
+            # Commit releases the row locks before any container starts
+            db.commit()
+
+        for entry in started:
+            _start(db, entry)
+        return len(started)
+    finally:
+        db.close()
+
+
+def _start(db: Session, entry: TaskQueueEntry):
+    task = db.query(Task).filter(Task.id == entry.task_id).first()
+    user = db.query(User).filter(User.id == entry.user_id).first()
+    try:
+        if not task or not user:
+            raise RuntimeError("task or user no longer exists")
+        start_task_container(task, user, mode=entry.job_class, db=db)
+    except Exception as e:
+        entry.state, entry.finished_at = "DONE", datetime.utcnow()
+        if task:
+            task.status = "FAILED"
+        db.commit()
+        if task:
+            append_log_line(db, task.id, f"[QUEUE] Failed to start agent: {e}", level="ERROR")
+
+
+# ----------------------------
+# Background dispatcher (app startup / shutdown)
+# ----------------------------
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_dispatcher: asyncio.Task | None = None
+
+
+def kick():
+    """Run the dispatcher now instead of at the next poll (e.g. a job was queued or a slot freed)."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def _run_dispatcher():
+    while True:
+        try:
+            await run_blocking(dispatch_once)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[task-queue] dispatch error: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.TASK_QUEUE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def start_dispatcher():
+    global _loop, _wakeup, _dispatcher
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _dispatcher = asyncio.create_task(_run_dispatcher())
+
+
+async def stop_dispatcher():
+    global _loop, _dispatcher
+    if _dispatcher:
+        _dispatcher.cancel()
+        _dispatcher = None
+    _loop = None
@@ -0,0 +1,264 @@
+# backend/services/worker_pool.py
+import asyncio
+import os
+import subprocess
+import time
+import uuid
+
+from backend.core.blocking import run_blocking
+from backend.core.config import settings
+from backend.services.docker_supervisor import docker_supervisor, agent_mounts, agent_cache_env, LABEL_WORKER
+
+
+class WorkerInfo:
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.state = "idle"          # idle / busy
+        self.task_id: int | None = None
+        self.mode: str | None = None
+        self.assignment: dict | None = None  # handed out, until the worker confirms it got it
+        self.last_seen = time.monotonic()
+        self.idle_since = time.monotonic()
+        self.tasks_done = 0
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        return {
+            "worker_id": self.worker_id,
+            "state": self.state,
+            "task_id": self.task_id,
+            "mode": self.mode,
+            "seconds_since_seen": round(now - self.last_seen, 1),
+            "tasks_done": self.tasks_done,
+        }
+
+
+class WorkerPool:
+    """
+    Warm pool of resident agent containers (agent/main.py in worker mode).
+
+    Instead of a cold `docker run` per task, start_task_container() puts the
+    assignment on a queue and an idle worker picks it up from its long-poll
+    (POST /workers/{id}/claim), so a task starts within milliseconds.
+
+    A background loop keeps AGENT_POOL_MIN_IDLE workers idle (plus one per
+    queued assignment), never more than AGENT_POOL_MAX in total, and retires
+    workers that stay idle longer than AGENT_POOL_IDLE_SECONDS beyond the
+    minimum. A worker is retired by answering its next claim with "exit".
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: dict[str, WorkerInfo] = {}
+        self._starting: dict[str, float] = {}    # spawned, not registered yet
+        self._retiring: set[str] = set()
+        self._scaler: asyncio.Task | None = None
+        self.counters = {"dispatched": 0, "spawned": 0, "retired": 0, "lost": 0, "requeued": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.AGENT_POOL_MIN_IDLE > 0 and self._loop is not None
+
+    # ----------------------------
+    # Lifecycle (app startup / shutdown)
+    # ----------------------------
+    async def start(self):
+        if settings.AGENT_POOL_MIN_IDLE <= 0:
+            return
+        if not os.getenv("AGENT_WORKER_TOKEN"):
+            # A per-process random token breaks with several uvicorn workers, and
+            # after a restart the running workers would all be rejected
+            raise RuntimeError("AGENT_WORKER_TOKEN must be set when AGENT_POOL_MIN_IDLE > 0")
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._scaler = asyncio.create_task(self._autoscale())
+
+    async def stop(self):
+        if self._scaler:
+            self._scaler.cancel()
+            self._scaler = None
+        # Idle workers exit on their next claim; stop the containers now so they
+        # don't outlive the backend. Busy ones are left to finish their task (they
+        # report to whichever backend is up and claim from it afterwards).
+        busy = [w.worker_id for w in self._workers.values() if w.state == "busy"]
+        if busy:
+            print(f"[worker-pool] leaving {len(busy)} busy worker(s) running: {', '.join(busy)}")
+        names = [_container_name(w) for w in [*self._workers, *self._starting] if w not in busy]
+        if names and docker_supervisor.enabled:
+            for name in names:
+                await docker_supervisor.remove(name)
+        elif names:
+            await run_blocking(subprocess.run, ["docker", "rm", "-f", *names], capture_output=True)
+        self._loop = None
+
+    # ----------------------------
+    # Dispatch
+    # ----------------------------
+    def submit(self, assignment: dict):
+        """Queue an assignment for the next idle worker. Safe to call from any thread."""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, assignment)
+
+    async def claim(self, worker_id: str, wait: float, last: str | None = None) -> dict | None:
+        """
+        Long-poll for work. Returns an assignment, {"type": "exit"} when the
+        worker should shut down, or None if nothing arrived within `wait` seconds.
+
+        `last` is the assignment_id of the last assignment the worker actually
+        received; if it isn't the one we handed out, that response was lost on
+        the way and the assignment goes back on the queue.
+        """
+        self._starting.pop(worker_id, None)
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            worker = self._workers[worker_id] = WorkerInfo(worker_id)
+        elif worker.state == "busy":
+            if worker.assignment and worker.assignment["assignment_id"] != last:
+                print(f"[worker-pool] worker {worker_id} never got task {worker.task_id}; requeueing it")
+                self._queue.put_nowait(worker.assignment)
+                self.counters["requeued"] += 1
+            else:
+                # Claiming again means the previous task is finished
+                worker.tasks_done += 1
+            worker.state, worker.task_id, worker.mode, worker.assignment = "idle", None, None, None
+            worker.idle_since = time.monotonic()
+        worker.last_seen = time.monotonic()
+
+        if worker_id in self._retiring or self._queue is None:
+            return self._forget(worker_id, retired=True)
+
+        try:
+            assignment = await asyncio.wait_for(self._queue.get(), timeout=wait)
+        except asyncio.TimeoutError:
+            worker.last_seen = time.monotonic()
+            return None
+
+        if self._workers.get(worker_id) is not worker:
+            # Dropped as lost while waiting; hand the work to someone else
+            self._queue.put_nowait(assignment)
+            return {"type": "exit"}
+
+        assignment = {**assignment, "assignment_id": uuid.uuid4().hex}
+        worker.state = "busy"
+        worker.task_id = assignment.get("task_id")
+        worker.mode = assignment.get("mode")
+        worker.assignment = assignment
+        worker.last_seen = time.monotonic()
+        self.counters["dispatched"] += 1
+        return {"type": "task", **assignment}
+
+    def container_exited(self, worker_id: str) -> tuple[int, str] | None:
+        """The worker's container is gone. Returns (task_id, mode) if it died mid-task."""
+        self._starting.pop(worker_id, None)
+        self._retiring.discard(worker_id)
+        worker = self._workers.pop(worker_id, None)
+        if worker and worker.state == "busy" and worker.task_id is not None:
+            self.counters["lost"] += 1
+            return worker.task_id, worker.mode or "execute"
+        return None
+
+    def leave(self, worker_id: str):
+        self._forget(worker_id, retired=False)
+
+    def _forget(self, worker_id: str, retired: bool) -> dict:
+        self._workers.pop(worker_id, None)
+        self._retiring.discard(worker_id)
+        if retired:
+            self.counters["retired"] += 1
+        return {"type": "exit"}
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "starting": len(self._starting),
+            "workers": [w.to_dict() for w in self._workers.values()],
+            **self.counters,
+        }
+
+    # ----------------------------
+    # Scaling
+    # ----------------------------
+    async def _autoscale(self):
+        while True:
+            try:
+                await self._scale_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[worker-pool] autoscale error: {e}")
+            await asyncio.sleep(settings.AGENT_POOL_SCALE_INTERVAL_SECONDS)
+
+    async def _scale_once(self):
+        now = time.monotonic()
+        stale_after = settings.AGENT_POOL_CLAIM_WAIT_SECONDS * 3
+
+        # Idle workers that stopped polling are gone. Busy ones are watched per task
+        # by agent_ws; here they only count as lost once past the task timeout.
+        for w in list(self._workers.values()):
+            limit = stale_after if w.state == "idle" else settings.AGENT_TASK_TIMEOUT_SECONDS + stale_after
+            if now - w.last_seen > limit:
+                self._workers.pop(w.worker_id, None)
+                self.counters["lost"] += 1
+        for wid, spawned_at in list(self._starting.items()):
+            if now - spawned_at > 120:
+                self._starting.pop(wid, None)
+                self.counters["lost"] += 1
+
+        idle = [w for w in self._workers.values() if w.state == "idle" and w.worker_id not in self._retiring]
+        total = len(self._workers) + len(self._starting)
+        want_idle = settings.AGENT_POOL_MIN_IDLE + self._queue.qsize()
+
+        missing = want_idle - len(idle) - len(self._starting)
+        for _ in range(max(0, min(missing, settings.AGENT_POOL_MAX - total))):
+            await self._spawn()
+
+        if self._queue.qsize() == 0 and len(idle) > settings.AGENT_POOL_MIN_IDLE:
+            # Retire the longest-idle workers beyond the minimum
+            idle.sort(key=lambda w: w.idle_since)
+            for w in idle[: len(idle) - settings.AGENT_POOL_MIN_IDLE]:
+                if now - w.idle_since > settings.AGENT_POOL_IDLE_SECONDS:
+                    self._retiring.add(w.worker_id)
+
+    async def _spawn(self):
+        worker_id = uuid.uuid4().hex[:12]
+        env = {
+            "AGENT_MODE": "worker",
+            "WORKER_ID": worker_id,
+            "WORKER_TOKEN": settings.AGENT_WORKER_TOKEN,
+            "BACKEND_URL": settings.AGENT_BACKEND_URL,
+            "CLAIM_WAIT_SECONDS": settings.AGENT_POOL_CLAIM_WAIT_SECONDS,
+            "LLM_CONCURRENCY": settings.AGENT_LLM_CONCURRENCY,
+            "TEST_WORKERS": settings.AGENT_TEST_WORKERS,
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
+        }
+        self._starting[worker_id] = time.monotonic()
+        try:
+            if docker_supervisor.enabled:
+                # Workers run any job class, so they get the (larger) execute limits
+                await docker_supervisor.launch(
+                    _container_name(worker_id), settings.AGENT_IMAGE, env, {LABEL_WORKER: worker_id}, "execute"
+                )
+            else:
+                cmd = ["docker", "run", "-d", "--rm", "--name", _container_name(worker_id)]
+                for mount in agent_mounts():
+                    cmd += ["-v", mount]
+                for k, v in {**agent_cache_env(), **env}.items():
+                    cmd += ["-e", f"{k}={v}"]
+                cmd.append(settings.AGENT_IMAGE)
+                proc = await run_blocking(subprocess.run, cmd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    raise RuntimeError(proc.stderr.strip())
+        except Exception as e:
+            self._starting.pop(worker_id, None)
+            print(f"[worker-pool] failed to start worker: {e}")
+            return
+        self.counters["spawned"] += 1
+        print(f"Started warm agent worker {worker_id}")
+
+
+def _container_name(worker_id: str) -> str:
+    return f"jules-worker-{worker_id}"
+
+
+worker_pool = WorkerPool()
@@ -0,0 +1,12 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+
+# backend.core.db builds its engines at import time; point them somewhere
+# harmless (tests swap in their own sqlite sessions where they need a DB).
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ASYNC_DATABASE_URL", "postgresql+psycopg://tests@localhost/unused")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,39 @@
+# tests/test_agent_ws.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.api import agent_ws
+from backend.core.config import settings
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(agent_ws.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Worker-Token": "wrong"}])
+def test_channel_rejects_missing_or_bad_token(client, headers):
+    live = object()
+    agent_ws.CONNECTIONS[42] = live
+    try:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/agents/ws/42", headers=headers):
+                pass
+        assert exc.value.code == 4401
+        # The live agent's connection is left alone
+        assert agent_ws.CONNECTIONS[42] is live
+    finally:
+        agent_ws.CONNECTIONS.pop(42, None)
+
+
+def test_channel_accepts_the_worker_token(client, monkeypatch):
+    monkeypatch.setattr(agent_ws, "_task_status", lambda task_id: None)
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/agents/ws/7", headers={"X-Worker-Token": settings.AGENT_WORKER_TOKEN}) as ws:
+            ws.receive_json()
+    # Past auth: an unknown task is the next thing to stop it
+    assert exc.value.code == 4404
@@ -0,0 +1,96 @@
+# tests/test_diff_download.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.api import tasks as tasks_api
+from backend.core.db import Base, get_db
+from backend.models import Task, User
+from backend.services.diff_store import store_diff
+
+PATCH = "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n@@ -1 +1 @@\n-old\n+new\n"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("GZIP;Q=0.5", True),
+    ("x-gzip", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000, deflate", False),
+    ("*;q=0", False),
+    ("*, gzip;q=0", False),   # an explicit gzip entry wins over the wildcard
+    ("gzip;q=0, *", False),
+    ("identity", False),
+    ("gzip;q=bogus", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert tasks_api._accepts_gzip(header) is expected
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    db = factory()
+    db.add(User(id=1, github_id=1, github_login="octocat"))
+    db.commit()
+    sha = store_diff(db, PATCH)
+    db.add(Task(id=1, user_id=1, repo_full_name="octo/repo", branch="main", prompt="p", status="READY_FOR_REVIEW", diff_sha=sha))
+    db.commit()
+    db.close()
+
+    def get_test_db():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(tasks_api.router)
+    app.dependency_overrides[get_db] = get_test_db
+    return TestClient(app)
+
+
+def test_gzip_client_gets_the_stored_gzip(client):
+    resp = client.get("/tasks/1/diff.patch", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.text == PATCH
+
+
+@pytest.mark.parametrize("header", ["gzip;q=0", "*;q=0"])
+def test_refused_gzip_gets_the_plain_patch(client, header):
+    resp = client.get("/tasks/1/diff.patch", headers={"Accept-Encoding": header})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.content == PATCH.encode("utf-8")
+
+
+def test_range(client):
+    resp = client.get("/tasks/1/diff.patch", headers={"Range": "bytes=0-9", "Accept-Encoding": "gzip"})
+    assert resp.status_code == 206
+    assert resp.headers["content-range"] == f"bytes 0-9/{len(PATCH)}"
+    assert resp.content == PATCH.encode("utf-8")[:10]
+
+
+@pytest.mark.parametrize("header", [f"bytes={len(PATCH)}-", "bytes=-", "pages=1-2"])
+def test_unsatisfiable_range_is_416(client, header):
+    resp = client.get("/tasks/1/diff.patch", headers={"Range": header})
+    assert resp.status_code == 416
+    assert resp.headers["content-range"] == f"bytes */{len(PATCH)}"
+
+
+def test_if_none_match_is_304(client):
+    etag = client.get("/tasks/1/diff.patch").headers["etag"]
+    resp = client.get("/tasks/1/diff.patch", headers={"If-None-Match": f'"other", {etag}'})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
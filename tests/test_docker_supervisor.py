@@ -0,0 +1,265 @@
+# tests/test_docker_supervisor.py
+import asyncio
+import json
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.core.db import Base
+from backend.models import AgentRun, Task, TaskLogLine, User
+from backend.services import docker_supervisor as ds
+
+
+class FakeDockerd:
+    """Just enough of the Engine API for the supervisor, behind httpx.MockTransport."""
+
+    def __init__(self):
+        self.containers: dict[str, dict] = {}
+        self.events: list[dict] = []
+        self.calls: list[tuple[str, str]] = []
+
+    def add(self, cid: str, name: str, state: str, labels: dict, exit_code: int = 0, oom: bool = False):
+        self.containers[cid] = {
+            "Id": cid,
+            "Names": [f"/{name}"],
+            "State": state,
+            "Labels": labels,
+            "ExitCode": exit_code,
+            "OOMKilled": oom,
+        }
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/", 2)[2]  # drop the /v1.41 prefix
+        self.calls.append((request.method, path))
+        parts = path.split("/")
+        if path == "containers/json":
+            return httpx.Response(200, json=list(self.containers.values()))
+        if path == "containers/create":
+            cid = f"c{len(self.containers) + 1:063d}"
+            body = json.loads(request.content)
+            self.add(cid, request.url.params["name"], "created", body["Labels"])
+            return httpx.Response(201, json={"Id": cid})
+        if path == "events":
+            lines = "".join(json.dumps(e) + "\n" for e in self.events)
+            return httpx.Response(200, content=lines.encode("utf-8"))
+        if parts[0] == "containers" and len(parts) >= 2:
+            c = self.containers.get(parts[1])
+            if c is None:
+                return httpx.Response(404, json={"message": f"No such container: {parts[1]}"})
+            if request.method == "DELETE":
+                del self.containers[parts[1]]
+                return httpx.Response(204)
+            if parts[-1] == "start":
+                c["State"] = "running"
+                return httpx.Response(204)
+            if parts[-1] == "json":
+                return httpx.Response(200, json={"Id": c["Id"], "State": {"ExitCode": c["ExitCode"], "OOMKilled": c["OOMKilled"]}})
+        return httpx.Response(404, json={"message": f"unexpected {request.method} {path}"})
+
+
+@pytest.fixture
+def db_session(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    monkeypatch.setattr(ds, "SessionLocal", factory)
+    db = factory()
+    db.add(User(id=1, github_id=1, github_login="octocat"))
+    db.commit()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def dockerd():
+    return FakeDockerd()
+
+
+@pytest.fixture
+def supervisor(dockerd):
+    sup = ds.DockerSupervisor()
+    sup.api = ds.DockerAPI("unused.sock", "v1.41", transport=httpx.MockTransport(dockerd.handler))
+    return sup
+
+
+def _task(db, status: str) -> Task:
+    task = Task(user_id=1, repo_full_name="octo/repo", branch="main", prompt="p", status=status)
+    db.add(task)
+    db.commit()
+    return task
+
+
+def _labels(task_id: int, mode: str = "execute") -> dict:
+    return {ds.LABEL_MANAGED: "1", ds.LABEL_TASK: str(task_id), ds.LABEL_MODE: mode}
+
+
+def _log_messages(db, task_id: int) -> list[str]:
+    db.expire_all()
+    return [line.message for line in db.query(TaskLogLine).filter(TaskLogLine.task_id == task_id)]
+
+
+# ----------------------------
+# Stats parsing
+# ----------------------------
+def test_cpu_percent():
+    stats = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 400}, "system_cpu_usage": 2000, "online_cpus": 4},
+        "precpu_stats": {"cpu_usage": {"total_usage": 200}, "system_cpu_usage": 1000},
+    }
+    assert ds._cpu_percent(stats) == pytest.approx(80.0)
+
+
+def test_cpu_percent_first_sample_and_percpu_fallback():
+    # The first sample has no precpu numbers worth comparing against
+    assert ds._cpu_percent({"cpu_stats": {}, "precpu_stats": {}}) == 0.0
+    stats = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 300, "percpu_usage": [1, 2]}, "system_cpu_usage": 1100},
+        "precpu_stats": {"cpu_usage": {"total_usage": 100}, "system_cpu_usage": 100},
+    }
+    assert ds._cpu_percent(stats) == pytest.approx(40.0)
+
+
+def test_memory_bytes_excludes_page_cache():
+    assert ds._memory_bytes({"memory_stats": {"usage": 1000, "stats": {"inactive_file": 300}}}) == 700  # cgroup v2
+    assert ds._memory_bytes({"memory_stats": {"usage": 1000, "stats": {"cache": 400}}}) == 600  # cgroup v1
+    assert ds._memory_bytes({"memory_stats": {}}) == 0
+
+
+# ----------------------------
+# Events -> task state
+# ----------------------------
+def test_die_event_fails_a_task_that_never_reported(db_session, dockerd, supervisor):
+    task = _task(db_session, "RUNNING")
+    dockerd.add("abc", "jules-task-1", "exited", _labels(task.id), exit_code=3)
+    dockerd.events = [
+        {"Type": "container", "Action": "die", "Actor": {"ID": "abc", "Attributes": {**_labels(task.id), "exitCode": "3"}}},
+    ]
+
+    async def go():
+        async for event in supervisor.api.events({}):
+            await supervisor._on_event(event)
+
+    asyncio.run(go())
+
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == "FAILED"
+    assert "abc" not in dockerd.containers  # removed after the exit was recorded
+    assert any("exited with code 3" in m for m in _log_messages(db_session, task.id))
+
+
+def test_die_after_result_leaves_task_alone(db_session, dockerd, supervisor):
+    task = _task(db_session, "READY_FOR_REVIEW")
+    dockerd.add("abc", "jules-task-1", "exited", _labels(task.id), exit_code=0)
+    asyncio.run(supervisor._on_event({"Action": "die", "Actor": {"ID": "abc", "Attributes": {"exitCode": "0", **_labels(task.id)}}}))
+
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == "READY_FOR_REVIEW"
+
+
+def test_oom_is_recorded_on_the_run(db_session, dockerd, supervisor):
+    task = _task(db_session, "RUNNING")
+    run = AgentRun(task_id=task.id, mode="execute", container_id="abc")
+    db_session.add(run)
+    db_session.commit()
+    rec = ds.ContainerRecord("abc", _labels(task.id))
+    rec.run_id = run.id
+    rec.add_sample(150.0, 900 * 1024 * 1024)
+    supervisor._containers["abc"] = rec
+    dockerd.add("abc", "jules-task-1", "exited", _labels(task.id), exit_code=137, oom=True)
+
+    async def go():
+        await supervisor._on_event({"Action": "oom", "Actor": {"ID": "abc", "Attributes": {}}})
+        await supervisor._on_event({"Action": "die", "Actor": {"ID": "abc", "Attributes": {"exitCode": "137"}}})
+
+    asyncio.run(go())
+
+    db_session.expire_all()
+    run = db_session.get(AgentRun, run.id)
+    assert run.exit_code == 137
+    assert run.oom_killed is True
+    assert run.finished_at is not None
+    assert run.memory_peak_bytes == 900 * 1024 * 1024
+    assert db_session.get(Task, task.id).status == "FAILED"
+    assert any("out of memory" in m for m in _log_messages(db_session, task.id))
+
+
+# ----------------------------
+# Reconcile
+# ----------------------------
+def test_reconcile_adopts_running_and_finishes_exited(db_session, dockerd, supervisor):
+    running = _task(db_session, "RUNNING")
+    gone = _task(db_session, "PUSHING")
+    dockerd.add("live", "jules-task-a", "running", _labels(running.id))
+    dockerd.add("dead", "jules-task-b", "exited", _labels(gone.id, "push"), exit_code=1)
+
+    asyncio.run(supervisor._reconcile())
+
+    assert "live" in supervisor._containers
+    assert "live" in dockerd.containers
+    assert "dead" not in dockerd.containers
+    db_session.expire_all()
+    assert db_session.get(Task, running.id).status == "RUNNING"
+    assert db_session.get(Task, gone.id).status == "FAILED"
+
+
+def test_reconcile_finishes_containers_removed_behind_our_back(db_session, dockerd, supervisor):
+    task = _task(db_session, "RUNNING")
+    supervisor._containers["vanished"] = ds.ContainerRecord("vanished", _labels(task.id))
+
+    asyncio.run(supervisor._reconcile())
+
+    assert "vanished" not in supervisor._containers
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == "FAILED"
+
+
+def test_reconcile_skips_a_container_being_launched(db_session, dockerd, supervisor):
+    task = _task(db_session, "RUNNING")
+    dockerd.add("new", "jules-task-new", "created", _labels(task.id))
+    supervisor._launching.add("jules-task-new")
+
+    asyncio.run(supervisor._reconcile())
+
+    assert "new" in dockerd.containers
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == "RUNNING"
+
+
+def test_launch_creates_records_and_starts(db_session, dockerd, supervisor):
+    task = _task(db_session, "RUNNING")
+
+    container_id = asyncio.run(supervisor.launch("jules-task-x", "img", {"A": "1"}, {ds.LABEL_TASK: task.id}, "execute"))
+
+    assert dockerd.containers[container_id]["State"] == "running"
+    assert supervisor._launching == set()
+    db_session.expire_all()
+    run = db_session.query(AgentRun).filter(AgentRun.container_id == container_id).one()
+    assert run.task_id == task.id
+    assert supervisor._containers[container_id].run_id == run.id
+
+
+def test_launch_removes_the_container_when_cancelled(db_session, dockerd, supervisor, monkeypatch):
+    task = _task(db_session, "RUNNING")
+
+    async def stuck_start(container_id):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(supervisor.api, "start", stuck_start)
+
+    async def go():
+        launch = asyncio.create_task(supervisor.launch("jules-task-y", "img", {}, {ds.LABEL_TASK: task.id}, "execute"))
+        while not any(c["Names"] == ["/jules-task-y"] for c in dockerd.containers.values()):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        launch.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await launch
+
+    asyncio.run(go())
+
+    assert dockerd.containers == {}
+    assert supervisor._containers == {}
+    assert supervisor._launching == set()
@@ -0,0 +1,275 @@
+# tests/test_git_data_push.py
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.api import tasks as tasks_api
+from backend.core.db import Base, get_async_db
+from backend.models import Task, TaskLogLine, User
+from backend.services.git_data_push import PatchError, apply_hunks, parse_diff, push_diff
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 21))
+
+
+def _apply(original: str, diff: str) -> str:
+    [fp] = parse_diff(diff)
+    return apply_hunks(original, fp.hunks)
+
+
+# ----------------------------
+# parse_diff / apply_hunks
+# ----------------------------
+def test_hunk_applies_at_its_line():
+    diff = (
+        "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n"
+        "@@ -4,3 +4,3 @@\n line 4\n-line 5\n+line five\n line 6\n"
+    )
+    assert _apply(ORIGINAL, diff) == ORIGINAL.replace("line 5\n", "line five\n")
+
+
+def test_hunk_whose_context_moved_is_found_at_the_nearest_offset():
+    # Three lines were added at the top since the diff was made
+    moved = "new a\nnew b\nnew c\n" + ORIGINAL
+    diff = (
+        "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n"
+        "@@ -9,3 +9,4 @@\n line 9\n line 10\n+inserted\n line 11\n"
+    )
+    assert _apply(moved, diff) == moved.replace("line 10\n", "line 10\ninserted\n")
+
+
+def test_pure_insertion_after_a_line():
+    diff = "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n@@ -2,0 +3 @@\n+after two\n"
+    assert _apply("one\ntwo\nthree\n", diff) == "one\ntwo\nafter two\nthree\n"
+
+
+def test_new_file():
+    diff = (
+        "diff --git a/pkg/new.py b/pkg/new.py\nnew file mode 100755\n--- /dev/null\n+++ b/pkg/new.py\n"
+        "@@ -0,0 +1,2 @@\n+print('hi')\n+print('bye')\n"
+    )
+    [fp] = parse_diff(diff)
+    assert (fp.path, fp.new_file, fp.deleted, fp.mode) == ("pkg/new.py", True, False, "100755")
+    assert apply_hunks("", fp.hunks) == "print('hi')\nprint('bye')\n"
+
+
+def test_deleted_file():
+    diff = (
+        "diff --git a/old.txt b/old.txt\ndeleted file mode 100644\n--- a/old.txt\n+++ /dev/null\n"
+        "@@ -1,2 +0,0 @@\n-a\n-b\n"
+    )
+    [fp] = parse_diff(diff)
+    assert (fp.path, fp.deleted) == ("old.txt", True)
+    assert apply_hunks("a\nb\n", fp.hunks) == ""
+
+
+def test_no_newline_at_end_of_file_on_both_sides():
+    diff = (
+        "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n"
+        "@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n"
+    )
+    assert _apply("a\nb", diff) == "a\nc"
+
+
+def test_adding_a_final_newline():
+    diff = (
+        "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n"
+        "@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+b\n"
+    )
+    assert _apply("a\nb", diff) == "a\nb\n"
+
+
+def test_mismatched_hunk_raises():
+    diff = (
+        "diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n"
+        "@@ -4,3 +4,3 @@\n line 4\n-not what is there\n+x\n line 6\n"
+    )
+    with pytest.raises(PatchError, match="does not apply"):
+        _apply(ORIGINAL, diff)
+
+
+@pytest.mark.parametrize("header", ["GIT binary patch", "rename from a.txt", "old mode 100644"])
+def test_unsupported_diffs_raise(header):
+    with pytest.raises(PatchError):
+        parse_diff(f"diff --git a/a.txt b/b.txt\n{header}\n")
+
+
+# ----------------------------
+# push_diff against an in-memory GitHub
+# ----------------------------
+class FakeGitHub:
+    """The Git Data API calls push_diff makes, backed by dicts."""
+
+    def __init__(self, files: dict[str, str]):
+        self.blobs: dict[str, bytes] = {}
+        self.trees: dict[str, list[dict]] = {}
+        self.commits: dict[str, dict] = {}
+        self.refs: dict[str, str] = {}
+        root = self._tree_for(files)
+        self.base = self._commit(root, [])
+        self.writes = 0
+
+    def _sha(self, *parts) -> str:
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def _blob(self, content: bytes) -> str:
+        sha = self._sha("blob", content)
+        self.blobs[sha] = content
+        return sha
+
+    def _tree_for(self, files: dict[str, str]) -> str:
+        entries = [{"path": p, "mode": "100644", "type": "blob", "sha": self._blob(c.encode("utf-8"))} for p, c in files.items()]
+        sha = self._sha("tree", entries)
+        self.trees[sha] = entries
+        return sha
+
+    def _commit(self, tree: str, parents: list[str]) -> str:
+        sha = self._sha("commit", tree, parents)
+        self.commits[sha] = {"tree": {"sha": tree}, "parents": parents}
+        return sha
+
+    def files_at(self, commit: str) -> dict[str, str]:
+        tree = self.trees[self.commits[commit]["tree"]["sha"]]
+        return {e["path"]: self.blobs[e["sha"]].decode("utf-8") for e in tree}
+
+    async def get_branch_head(self, owner, repo, branch):
+        return self.refs.get(branch)
+
+    async def get_git_commit(self, owner, repo, sha):
+        return self.commits[sha]
+
+    async def get_git_tree(self, owner, repo, sha):
+        return {"tree": self.trees[sha]}
+
+    async def get_git_blob(self, owner, repo, sha):
+        return self.blobs[sha]
+
+    async def create_git_blob(self, owner, repo, content):
+        self.writes += 1
+        return self._blob(content)
+
+    async def create_git_tree(self, owner, repo, base_tree, entries):
+        self.writes += 1
+        by_path = {e["path"]: dict(e) for e in self.trees[base_tree]}
+        for e in entries:
+            if e["sha"] is None:
+                by_path.pop(e["path"], None)
+            else:
+                by_path[e["path"]] = e
+        sha = self._sha("tree", sorted(by_path.items()))
+        self.trees[sha] = list(by_path.values())
+        return sha
+
+    async def create_git_commit(self, owner, repo, message, tree, parents):
+        self.writes += 1
+        return self._commit(tree, parents)
+
+    async def set_branch_head(self, owner, repo, branch, sha, exists):
+        self.writes += 1
+        assert exists == (branch in self.refs)
+        self.refs[branch] = sha
+
+
+def test_push_diff_commits_edit_add_and_delete():
+    gh = FakeGitHub({"keep.txt": ORIGINAL, "gone.txt": "bye\n"})
+    diff = (
+        "diff --git a/keep.txt b/keep.txt\n--- a/keep.txt\n+++ b/keep.txt\n"
+        "@@ -1,2 +1,2 @@\n-line 1\n+line one\n line 2\n"
+        "diff --git a/added.txt b/added.txt\nnew file mode 100644\n--- /dev/null\n+++ b/added.txt\n"
+        "@@ -0,0 +1 @@\n+hello\n"
+        "diff --git a/gone.txt b/gone.txt\ndeleted file mode 100644\n--- a/gone.txt\n+++ /dev/null\n"
+        "@@ -1 +0,0 @@\n-bye\n"
+    )
+
+    result = asyncio.run(push_diff(gh, "octo/repo", gh.base, "jules/task-1", diff, "msg"))
+
+    assert result["created"] is True
+    assert gh.refs["jules/task-1"] == result["commit_sha"]
+    assert gh.commits[result["commit_sha"]]["parents"] == [gh.base]
+    assert gh.files_at(result["commit_sha"]) == {
+        "keep.txt": ORIGINAL.replace("line 1\n", "line one\n", 1),
+        "added.txt": "hello\n",
+    }
+
+
+def test_push_diff_with_a_stale_hunk_writes_nothing():
+    gh = FakeGitHub({"keep.txt": ORIGINAL})
+    diff = (
+        "diff --git a/keep.txt b/keep.txt\n--- a/keep.txt\n+++ b/keep.txt\n"
+        "@@ -1,2 +1,2 @@\n-something else\n+x\n line 2\n"
+    )
+    with pytest.raises(PatchError):
+        asyncio.run(push_diff(gh, "octo/repo", gh.base, "jules/task-1", diff, "msg"))
+    assert gh.writes == 0
+    assert gh.refs == {}
+
+
+# ----------------------------
+# /tasks/{id}/push falls back to the push container
+# ----------------------------
+@pytest.fixture
+def push_client(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            db.add(User(id=1, github_id=1, github_login="octocat"))
+            await db.commit()
+
+    asyncio.run(setup())
+
+    async def get_db():
+        async with factory() as db:
+            yield db
+
+    async def token(user_id, db):
+        return "gh-token"
+
+    app = FastAPI()
+    app.include_router(tasks_api.router)
+    app.dependency_overrides[get_async_db] = get_db
+    monkeypatch.setattr(tasks_api, "get_token_for_user_async", token)
+    monkeypatch.setattr(tasks_api.settings, "GITHUB_API_PUSH", True)
+    return TestClient(app), factory
+
+
+def test_unapplicable_diff_falls_back_to_the_push_container(push_client, monkeypatch):
+    client, factory = push_client
+    gh = FakeGitHub({"keep.txt": ORIGINAL})
+    monkeypatch.setattr(tasks_api, "GitHubClient", lambda token: gh)
+    queued = []
+    monkeypatch.setattr(tasks_api, "enqueue", lambda db, task, job_class: queued.append((task.id, job_class)))
+
+    async def add_task():
+        async with factory() as db:
+            task = Task(
+                user_id=1, repo_full_name="octo/repo", branch="main", prompt="p",
+                status="READY_FOR_REVIEW", work_branch="jules/task-1", base_commit_sha=gh.base,
+                diff_text="diff --git a/keep.txt b/keep.txt\n--- a/keep.txt\n+++ b/keep.txt\n"
+                          "@@ -1,2 +1,2 @@\n-not there\n+x\n line 2\n",
+            )
+            db.add(task)
+            await db.commit()
+            return task.id
+
+    task_id = asyncio.run(add_task())
+
+    resp = client.post(f"/tasks/{task_id}/push")
+
+    assert resp.status_code == 200
+    assert queued == [(task_id, "push")]
+    assert gh.writes == 0
+
+    async def logs():
+        async with factory() as db:
+            return (await db.execute(select(TaskLogLine.message).where(TaskLogLine.task_id == task_id))).scalars().all()
+
+    assert any("using the push container" in m for m in asyncio.run(logs()))
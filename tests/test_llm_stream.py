@@ -0,0 +1,52 @@
+# tests/test_llm_stream.py
+import pytest
+
+from agent.llm_stream import OutputGuard, RewriteAborted
+
+
+def _feed(original: str, output: str):
+    guard = OutputGuard(original)
+    guard.feed(output)
+
+
+@pytest.mark.parametrize("first_line", [
+    "Sure, here's the updated file:",
+    "Sure!",
+    "Okay.",
+    "OK",
+    "Certainly! Below is the code.",
+    "Below is the updated file:",
+    "Here is the updated file",
+    "I've updated the function.",
+    "The updated file follows",
+])
+def test_prose_opener_is_rejected(first_line):
+    with pytest.raises(RewriteAborted, match="prose"):
+        _feed("x = 1\n", first_line + "\nx = 2\n")
+
+
+@pytest.mark.parametrize("first_line", [
+    "ok = check()",
+    "ok, err = load()",
+    "sure = True",
+    "okay_list = []",
+    "ok.close()",
+    "ok: bool = True",
+    "below = threshold - 1",
+    "import os",
+])
+def test_code_first_line_is_accepted(first_line):
+    _feed("x = 1\n", first_line + "\nx = 2\n")
+
+
+def test_fence_is_rejected_unless_the_original_has_one():
+    with pytest.raises(RewriteAborted, match="fence"):
+        _feed("x = 1\n", "```python\nx = 2\n")
+    _feed("```\nexample\n```\n", "```\nexample 2\n```\n")
+
+
+def test_runaway_output_is_rejected():
+    guard = OutputGuard("x = 1\n", max_growth=1.0, min_slack=10)
+    guard.feed("y = 2\n")
+    with pytest.raises(RewriteAborted, match="grew past"):
+        guard.feed("z" * 100)
@@ -0,0 +1,59 @@
+# tests/test_task_queue.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.core.db import Base
+from backend.models import Task, TaskQueueEntry, User
+from backend.services import task_queue as tq
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    monkeypatch.setattr(tq, "SessionLocal", factory)
+    started = []
+    monkeypatch.setattr(tq, "_start", lambda db, entry: started.append((entry.task_id, entry.job_class)))
+    session = factory()
+    session.add(User(id=1, github_id=1, github_login="octocat"))
+    session.commit()
+    session.started = started
+    yield session
+    session.close()
+
+
+def _task(db, repo: str = "octo/repo") -> Task:
+    task = Task(user_id=1, repo_full_name=repo, branch="main", prompt="p", status="READY_FOR_REVIEW")
+    db.add(task)
+    db.commit()
+    return task
+
+
+@pytest.mark.parametrize("job_class", ["execute", "push"])
+def test_job_waits_in_its_queued_status_then_runs(db, job_class):
+    task = _task(db)
+    tq.enqueue(db, task, job_class)
+    assert task.status == tq.QUEUED_STATUS[job_class]
+
+    assert tq.dispatch_once() == 1
+
+    db.expire_all()
+    assert db.get(Task, task.id).status == tq.RUN_STATUS[job_class]
+    assert db.started == [(task.id, job_class)]
+
+
+def test_queued_push_cancelled_while_waiting_is_dropped(db):
+    task = _task(db)
+    tq.enqueue(db, task, "push")
+    task.status = "CANCELLED"
+    db.commit()
+
+    assert tq.dispatch_once() == 0
+
+    db.expire_all()
+    entry = db.query(TaskQueueEntry).filter(TaskQueueEntry.task_id == task.id).one()
+    assert entry.state == "DONE"
+    assert db.started == []